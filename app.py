@@ -6,32 +6,54 @@ LiveRecorder - 统一启动入口
 
 import argparse
 import asyncio
+import signal
 import sys
-import threading
-import time
-from typing import Dict, Tuple
 
 from loguru import logger
-from streamlink.stream import StreamIO
 
 from src.config import Config
+from src.executor import capacity
+from src.journal import journal
 from src.platforms import PLATFORMS
+from src.postprocess import postprocess
+from src.rate_limiter import rate_limiter
+from src.cluster import ClusterSupervisor
+from src.reconciler import ConfigReconciler
+from src.registry import recorders, recordings
+from src.storage import storage
 from src.utils import setup_logger
 
-# 全局录制状态字典
-recording: Dict[str, Tuple[StreamIO, any]] = {}
-
-
-async def run_cli_mode(config_file: str = 'config.json'):
+async def run_cli_mode(config_file: str = 'config.json', workers: int = 1):
     """命令行模式 - 从config.json读取配置"""
     logger.info('=' * 60)
     logger.info('LiveRecorder 命令行模式启动')
     logger.info('=' * 60)
     
+    # SIGTERM 与 Ctrl+C 一样取消主任务，关闭直播流（多进程模式下等待工作进程退出）后再退出
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        # Windows 不支持
+        pass
+    
+    if workers > 1:
+        logger.info(f'多进程模式：{workers} 个工作进程')
+        try:
+            await ClusterSupervisor(config_file, workers).run()
+        except asyncio.CancelledError:
+            logger.warning('用户中断录制')
+        return
+    
     # 加载配置
     config = Config(config_file)
     global_config = config.get_global_config()
     users = config.get_users()
+    rate_limiter.configure(global_config['rate_limit'])
+    capacity.configure(global_config)
+    postprocess.configure(global_config)
+    # 修复上次意外退出时未关闭的录制文件
+    journal.recover()
+    storage.configure(global_config, users)
     
     if not users:
         logger.error('配置文件中没有主播配置，请编辑 config.json')
@@ -47,7 +69,7 @@ async def run_cli_mode(config_file: str = 'config.json'):
             
             # 创建平台录制器实例
             platform_class = PLATFORMS[platform_name]
-            recorder = platform_class(global_config, user, recording)
+            recorder = platform_class(global_config, user, recordings)
             coro = recorder.start()
             tasks.append(asyncio.create_task(coro))
         
@@ -59,84 +81,58 @@ async def run_cli_mode(config_file: str = 'config.json'):
         await asyncio.wait(tasks)
     except (asyncio.CancelledError, KeyboardInterrupt, SystemExit):
         logger.warning('用户中断录制，正在关闭直播流')
-        for stream_fd, output in recording.copy().values():
-            stream_fd.close()
-            output.close()
-
-
-def run_web_server(host: str = "0.0.0.0", port: int = 8888):
-    """在单独线程中运行Web服务器"""
-    import uvicorn
-    from src import web_api
-    
-    # 将recording字典共享给web_api
-    web_api.set_shared_recording(recording)
-    
-    logger.info(f'Web服务器启动在 http://{host}:{port}')
-    uvicorn.run("src.web_api:app", host=host, port=port, log_level="info")
+        recordings.close_all()
 
 
-async def run_recorders_web(config_file: str = 'web_config.json'):
-    """运行录制器（Web模式 - 从web_config.json读取）"""
+async def run_recorders_web(config_file: str = 'web_config.json', workers: int = 1):
+    """运行录制器（Web模式 - 从web_config.json读取，配置修改后自动生效）"""
     logger.info('录制监控服务已启动')
     
     try:
-        while True:
-            # 动态加载配置
-            config = Config(config_file)
-            global_config = config.get_global_config()
-            users = config.get_users()
-            
-            if not users:
-                logger.info('当前没有配置主播，等待通过Web界面添加...')
-                await asyncio.sleep(30)
-                continue
-            
-            tasks = []
-            for user in users:
-                platform_name = user['platform']
-                if platform_name not in PLATFORMS:
-                    logger.warning(f'不支持的平台: {platform_name}')
-                    continue
-                
-                # 创建平台录制器实例
-                platform_class = PLATFORMS[platform_name]
-                recorder = platform_class(global_config, user, recording)
-                coro = recorder.start()
-                tasks.append(asyncio.create_task(coro))
-            
-            if tasks:
-                logger.info(f'启动了 {len(tasks)} 个录制任务')
-                await asyncio.wait(tasks)
-            else:
-                logger.warning('没有有效的录制任务，30秒后重试...')
-                await asyncio.sleep(30)
-                
+        if workers > 1:
+            from src import web_api
+            logger.info(f'多进程模式：{workers} 个工作进程')
+            supervisor = ClusterSupervisor(config_file, workers)
+            web_api.set_cluster(supervisor)
+            await supervisor.run()
+        else:
+            await ConfigReconciler(config_file, recordings, recorders).run()
     except (asyncio.CancelledError, KeyboardInterrupt, SystemExit):
         logger.warning('用户中断录制，正在关闭直播流')
-        for stream_fd, output in recording.copy().values():
-            stream_fd.close()
-            output.close()
+        recordings.close_all()
+
 
+async def run_web_mode(host: str = "0.0.0.0", port: int = 8888, workers: int = 1):
+    """
+    Web模式 - 启动Web界面和录制服务
 
-async def run_web_mode(host: str = "0.0.0.0", port: int = 8888):
-    """Web模式 - 启动Web界面和录制服务"""
+    Web服务（uvicorn.Server）与录制器运行在同一个事件循环中：接口直接读取录制器的状态，不需要跨线程和跨事件循环传递；
+    收到退出信号后Web服务先退出，再停止录制器并关闭直播流，录制器意外退出时也停止Web服务。
+    """
+    import uvicorn
+    from src import web_api
+    
     logger.info('=' * 60)
     logger.info('LiveRecorder Web模式启动')
     logger.info('=' * 60)
     
-    # 在单独线程中启动Web服务器
-    web_thread = threading.Thread(target=run_web_server, args=(host, port), daemon=True)
-    web_thread.start()
-    
-    # 等待Web服务器启动
-    time.sleep(2)
-    
+    server = web_api.EmbeddedServer(uvicorn.Config(web_api.app, host=host, port=port, log_level="info"))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, server.handle_exit, sig, None)
+        except NotImplementedError:
+            # Windows 不支持，Ctrl+C 直接中断事件循环
+            pass
     logger.info(f'请访问 http://localhost:{port} 查看Web管理界面')
     logger.info('录制服务正在启动...')
-    
-    # 在主线程中运行录制器
-    await run_recorders_web()
+    recorders = asyncio.ensure_future(run_recorders_web(workers=workers))
+    recorders.add_done_callback(lambda _: setattr(server, 'should_exit', True))
+    try:
+        await server.serve()
+    finally:
+        recorders.cancel()
+        await asyncio.gather(recorders, return_exceptions=True)
 
 
 def main():
@@ -153,6 +149,9 @@ def main():
   # Web界面模式（从 web_config.json 读取配置）
   python app.py --mode web
   python app.py --mode web --host 0.0.0.0 --port 8888
+  
+  # 多进程录制（4个工作进程）
+  python app.py --mode web --workers 4
         """
     )
     
@@ -182,6 +181,13 @@ def main():
         help='Web服务器端口 (仅Web模式, 默认: 8888)'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='录制工作进程数，大于1时按主播分配到多个进程录制 (默认: 1)'
+    )
+    
     args = parser.parse_args()
     
     # 设置日志
@@ -190,9 +196,9 @@ def main():
     # 根据模式运行
     try:
         if args.mode == 'cli':
-            asyncio.run(run_cli_mode(args.config))
+            asyncio.run(run_cli_mode(args.config, args.workers))
         else:  # web
-            asyncio.run(run_web_mode(args.host, args.port))
+            asyncio.run(run_web_mode(args.host, args.port, args.workers))
     except KeyboardInterrupt:
         logger.info('程序已退出')
     except Exception as e:
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+HTTP-FLV 录制吞吐基准测试
+
+本地HTTP服务（独立进程）以最快速度发送 FLV 数据，对比 streamlink 引擎（HTTPStream + StreamRunner + FileOutput）
+与 direct 引擎（HttpStreamReader + capture + DirectFileOutput）录制同样数据量时的吞吐和录制进程的CPU时间。
+多个录制同时进行时模拟单个进程录制多个高码率直播。
+
+用法: python scripts/benchmark_direct_engine.py [--streams 1 4] [--size-mb 512] [--chunked] [--dir 测试目录]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from streamlink import Streamlink  # noqa: E402
+from streamlink.stream.http import HTTPStream  # noqa: E402
+# streamlink_cli 导入时注册信号处理，需在主线程导入
+from streamlink_cli.main import open_stream  # noqa: E402
+from streamlink_cli.output import FileOutput  # noqa: E402
+from streamlink_cli.streamrunner import StreamRunner  # noqa: E402
+
+from src.direct_engine import HttpStreamReader, capture  # noqa: E402
+from src.writer import DirectFileOutput  # noqa: E402
+
+CHUNK = 64 * 1024
+
+
+def flv_payload(size: int) -> bytes:
+    """FLV文件头加上若干 64KB 视频标签"""
+    header = b'FLV\x01\x05\x00\x00\x00\x09' + bytes(4)
+    body = bytes(CHUNK - 15)
+    tag = b'\x09' + len(body).to_bytes(3, 'big') + bytes(7) + body + (len(body) + 11).to_bytes(4, 'big')
+    return header + tag * (size // len(tag))
+
+
+def serve(port_queue, size: int, chunked: bool):
+    """HTTP服务进程，每个请求发送 size 字节"""
+    payload = memoryview(flv_payload(CHUNK * 16))
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/x-flv')
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Content-Length', str(size))
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            sent = 0
+            while sent < size:
+                data = payload[:min(len(payload), size - sent)]
+                if chunked:
+                    self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+                else:
+                    self.wfile.write(data)
+                sent += len(data)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def record_streamlink(url: str, path: Path):
+    stream_fd, prebuffer = open_stream(HTTPStream(Streamlink(), url))
+    output = FileOutput(path)
+    output.open()
+    try:
+        StreamRunner(stream_fd, output).run(prebuffer)
+    finally:
+        output.close()
+
+
+def record_direct(url: str, path: Path):
+    reader = HttpStreamReader(url)
+    output = DirectFileOutput(path)
+    try:
+        reader.open()
+        output.open()
+        capture(reader, output)
+    finally:
+        reader.close()
+        output.close()
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench(record, url: str, streams: int, directory: Path, size: int) -> dict:
+    """同时运行 streams 个录制，返回吞吐、CPU时间和写入是否完整"""
+    paths = [directory / f'{i}.flv' for i in range(streams)]
+    threads = [threading.Thread(target=record, args=(url, path)) for path in paths]
+    cpu, start = cpu_seconds(), time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed, cpu = time.perf_counter() - start, cpu_seconds() - cpu
+    complete = all(path.stat().st_size == size for path in paths)
+    for path in paths:
+        path.unlink()
+    total = streams * size / 1024 ** 2
+    return {'throughput': total / elapsed, 'cpu_per_gb': cpu / total * 1024, 'complete': complete}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP-FLV 录制吞吐基准测试')
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 4], help='同时录制数')
+    parser.add_argument('--size-mb', type=int, default=512, help='每个录制的数据量（MB）')
+    parser.add_argument('--rounds', type=int, default=3, help='每项测试的轮数，取最好的一轮')
+    parser.add_argument('--chunked', action='store_true', help='服务端使用 chunked 传输编码')
+    parser.add_argument('--dir', default=None, help='测试目录，应位于待测磁盘上')
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(queue, size, args.chunked), daemon=True)
+    server.start()
+    url = f'http://127.0.0.1:{queue.get()}/live.flv'
+    directory = Path(tempfile.mkdtemp(prefix='direct-engine-', dir=args.dir))
+    engines = {'streamlink': record_streamlink, 'direct': record_direct}
+    print(f'{"录制数":>6} {"引擎":<12} {"吞吐(MB/s)":>11} {"CPU秒/GB":>10} {"完整":>6}')
+    try:
+        for streams in args.streams:
+            for name, record in engines.items():
+                results = [bench(record, url, streams, directory, size) for _ in range(args.rounds)]
+                best = max(results, key=lambda result: result['throughput'])
+                print(f'{streams:>6} {name:<12} {best["throughput"]:>11.1f} {best["cpu_per_gb"]:>10.2f} '
+                      f'{"是" if all(result["complete"] for result in results) else "否":>6}')
+    finally:
+        server.terminate()
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
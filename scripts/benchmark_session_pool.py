@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Streamlink会话池基准测试
+
+对比每次开播新建 streamlink 会话与从会话池获取会话的耗时（不含网络请求）：
+新建会话 + 设置选项 + 解析插件，与复用会话 + 解析插件。
+
+用法: python scripts/benchmark_session_pool.py [次数]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.session_pool import StreamlinkSessionPool  # noqa: E402
+
+URLS = [
+    'https://live.bilibili.com/15152878',
+    'https://www.huya.com/991111',
+    'https://www.twitch.tv/kanotic_',
+    'https://www.douyu.com/101',
+]
+HEADERS = {'User-Agent': 'Chrome'}
+
+
+def bench(rounds: int, pooled: bool) -> float:
+    """返回每次开播获取会话并解析插件的平均耗时（毫秒）"""
+    pool = StreamlinkSessionPool()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url in URLS:
+            if pooled:
+                session = pool.get('bench', None, HEADERS, None, True)
+            else:
+                session = StreamlinkSessionPool._create(None, HEADERS, None, True)
+            session.resolve_url(url)
+    return (time.perf_counter() - start) * 1000 / (rounds * len(URLS))
+
+
+def main():
+    from loguru import logger
+    logger.remove()
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    # 预热：导入插件模块
+    bench(1, False)
+    new = bench(rounds, False)
+    pooled = bench(rounds, True)
+    print(f'每次开播新建会话: {new:.2f} ms')
+    print(f'复用会话池会话:   {pooled:.2f} ms')
+    print(f'每次开播节省:     {new - pooled:.2f} ms ({(1 - pooled / new) * 100:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
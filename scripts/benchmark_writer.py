@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+录制文件写入基准测试
+
+模拟多个录制同时以 8KB 小块写入（streamlink 每次读取的大小），对比 streamlink_cli 的 FileOutput
+与 BufferedFileOutput（含/不含 fadvise）的总吞吐、write 和 close 的延迟，以及文件碎片数
+（filefrag 的区段数，需要 e2fsprogs）。
+
+用法: python scripts/benchmark_writer.py [--streams 10 50 100] [--size-mb 16] [--dir 测试目录]
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.writer import BufferedFileOutput  # noqa: E402
+
+CHUNK = 8192
+
+
+def stream_worker(output, size: int, latencies: list, closes: list, barrier: threading.Barrier):
+    """以小块写入 size 字节，记录每次 write 和 close 的耗时"""
+    data = bytes(CHUNK)
+    output.open()
+    barrier.wait()
+    local = []
+    for _ in range(size // CHUNK):
+        start = time.perf_counter()
+        output.write(data)
+        local.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    output.close()
+    closes.append(time.perf_counter() - start)
+    latencies.extend(local)
+
+
+def extents(path: Path) -> int:
+    """文件的区段数，filefrag 不可用时返回-1"""
+    try:
+        result = subprocess.run(['filefrag', str(path)], capture_output=True, text=True, check=True)
+        return int(result.stdout.rsplit(':', 1)[1].split()[0])
+    except (OSError, subprocess.CalledProcessError, ValueError, IndexError):
+        return -1
+
+
+def bench(name: str, factory, streams: int, size: int, directory: Path) -> dict:
+    """运行一轮测试"""
+    run_dir = Path(tempfile.mkdtemp(prefix=f'{name}-', dir=directory))
+    latencies: list = []
+    closes: list = []
+    barrier = threading.Barrier(streams + 1)
+    threads = [threading.Thread(target=stream_worker,
+                                args=(factory(run_dir / f'{i}.flv'), size, latencies, closes, barrier))
+               for i in range(streams)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    files = sorted(run_dir.iterdir())
+    fragments = [extents(path) for path in files]
+    shutil.rmtree(run_dir)
+    latencies.sort()
+    return {
+        'throughput': streams * size / elapsed / 1024 ** 2,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+        'max': latencies[-1] * 1000,
+        'close': max(closes) * 1000,
+        'extents': sum(fragments) / len(fragments) if min(fragments) >= 0 else float('nan'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='录制文件写入基准测试')
+    parser.add_argument('--streams', type=int, nargs='+', default=[10, 50, 100], help='同时录制数')
+    parser.add_argument('--size-mb', type=int, default=16, help='每个录制写入的数据量（MB）')
+    parser.add_argument('--dir', default=None, help='测试目录，应位于待测磁盘上')
+    args = parser.parse_args()
+
+    from streamlink_cli.output import FileOutput
+    writers = {
+        'FileOutput': lambda path: FileOutput(path),
+        'Buffered': lambda path: BufferedFileOutput(path, buffer_mb=8, preallocate_mb=64),
+        'Buffered-nofadv': lambda path: BufferedFileOutput(path, buffer_mb=8, preallocate_mb=64, fadvise=False),
+    }
+    directory = Path(args.dir or tempfile.gettempdir())
+    size = args.size_mb * 1024 * 1024
+    print(f'{"录制数":>6} {"写入方式":<16} {"吞吐(MB/s)":>11} {"write p99(ms)":>14} {"write最大(ms)":>14} '
+          f'{"close最大(ms)":>14} {"平均区段数":>10}')
+    for streams in args.streams:
+        for name, factory in writers.items():
+            result = bench(name, factory, streams, size, directory)
+            print(f'{streams:>6} {name:<16} {result["throughput"]:>11.1f} {result["p99"]:>14.3f} '
+                  f'{result["max"]:>14.1f} {result["close"]:>14.1f} {result["extents"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""基于asyncio的直播流下载引擎"""
+
+import asyncio
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+
+from loguru import logger
+from streamlink.stream.hls import HLSStream
+from streamlink.stream.http import HTTPStream
+
+from .http_pool import http_pool
+
+# 所有录制共享的文件写入线程，写入前先合并为大块数据，线程数无需随录制数增加
+_io_pool = ThreadPoolExecutor(4, thread_name_prefix='file-io')
+
+
+class UnsupportedStream(Exception):
+    """异步引擎不支持的直播流（如加密HLS）"""
+
+
+def supports(stream) -> bool:
+    """
+    异步引擎是否支持该直播流：HTTP直播流和标准HLS直播流
+
+    不包括插件定制的子类（如Twitch的HLS流需要streamlink过滤广告），加密HLS需开始录制前由 probe 检查
+    """
+    return type(stream) in (HTTPStream, HLSStream)
+
+
+async def probe(stream, timeout: float = 10, **request_kwargs) -> bool:
+    """
+    开始录制前检查HLS播放列表，加密或无法读取时返回False，由streamlink引擎录制
+
+    Args:
+        stream: supports 返回True的直播流
+        timeout: 请求超时（秒）
+        **request_kwargs: 传给共享客户端池的参数（proxy、verify、headers等）
+    """
+    if not isinstance(stream, HLSStream):
+        return True
+    request_kwargs = stream_request_kwargs(stream, request_kwargs)
+    url = stream.url
+    try:
+        # 主播放列表时检查码率最高的子列表（与 download_hls 的选择一致）
+        for _ in range(2):
+            response = await http_pool.request('GET', url, timeout=timeout, **request_kwargs)
+            response.raise_for_status()
+            playlist = parse_playlist(response.text, str(response.url))
+            if 'variants' not in playlist:
+                return True
+            url = max(playlist['variants'])[1]
+        return True
+    except Exception as error:
+        logger.info(f'异步引擎不支持该直播流，使用streamlink引擎：{stream.url}\n{error}')
+        return False
+
+
+def stream_request_kwargs(stream, request_kwargs: dict) -> dict:
+    """
+    合并插件为直播流设置的请求参数（stream.args 中的请求头和cookies）与调用方的参数
+
+    与streamlink引擎一致，直播流的请求头优先于配置的请求头，cookies追加到配置的cookies之后；
+    查询参数已包含在 stream.url 中。
+    """
+    headers = {**(request_kwargs.get('headers') or {}), **(stream.args.get('headers') or {})}
+    cookies = stream.args.get('cookies')
+    if cookies:
+        cookie = '; '.join(f'{k}={v}' for k, v in cookies.items())
+        headers['Cookie'] = f"{headers['Cookie']}; {cookie}" if headers.get('Cookie') else cookie
+    return {**request_kwargs, 'headers': headers}
+
+
+class AsyncFileWriter:
+    """
+    异步文件写入
+
+    数据先在内存中合并，达到 buffer_size 后交给文件写入线程池写入，事件循环不会被磁盘IO阻塞。
+    close 可在任意线程调用。
+    """
+
+    def __init__(self, path: Path, buffer_size: int = 1024 * 1024, meter=None, output=None):
+        """
+        Args:
+            path: 输出文件路径
+            buffer_size: 合并写入的缓冲区大小
+            meter: 写入统计（RecordingMeter），可选
+            output: 未打开的输出（open/write/close，如边录边封装、分段输出），为None时直接写入文件
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.meter = meter
+        self.output = output
+        self.buffer = bytearray()
+        self.file = None
+        self._lock = threading.Lock()
+
+    async def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = await asyncio.get_running_loop().run_in_executor(_io_pool, self._open)
+
+    def _open(self):
+        if self.output:
+            self.output.open()
+            return self.output
+        return open(self.path, 'wb')
+
+    async def write(self, data: bytes):
+        if self.meter:
+            self.meter.write(data)
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            await self.flush()
+
+    async def flush(self):
+        if self.buffer:
+            data, self.buffer = bytes(self.buffer), bytearray()
+            await asyncio.get_running_loop().run_in_executor(_io_pool, self._write, data)
+
+    def _write(self, data: bytes):
+        with self._lock:
+            if self.file:
+                self.file.write(data)
+
+    def close(self):
+        """写入剩余数据并关闭文件，会阻塞调用线程，事件循环中应使用 aclose"""
+        with self._lock:
+            if self.file:
+                if self.buffer:
+                    data, self.buffer = bytes(self.buffer), bytearray()
+                    self.file.write(data)
+                self.file.close()
+                self.file = None
+
+    async def aclose(self):
+        """写入剩余数据并关闭文件"""
+        try:
+            await self.flush()
+        finally:
+            await asyncio.get_running_loop().run_in_executor(_io_pool, self.close)
+
+
+class AsyncStreamHandle:
+    """正在运行的异步下载，close 可在任意线程调用以停止录制"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.task: Optional[asyncio.Task] = None
+        self.stopped = False
+
+    async def run(self, coro):
+        """运行下载协程，被 close 停止时正常返回"""
+        self.task = asyncio.ensure_future(coro)
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            if not self.stopped:
+                raise
+
+    def close(self):
+        self.stopped = True
+        if self.task:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+
+
+async def download(stream: HTTPStream, writer: AsyncFileWriter, **request_kwargs):
+    """
+    下载直播流直到结束
+
+    Args:
+        stream: HTTPStream（HTTP-FLV等）或 HLSStream
+        writer: 文件写入
+        **request_kwargs: 传给共享客户端池的参数（proxy、verify、headers等），与直播流自带的请求头和cookies合并
+    """
+    request_kwargs = stream_request_kwargs(stream, request_kwargs)
+    if isinstance(stream, HLSStream):
+        await download_hls(stream.url, writer, **request_kwargs)
+    else:
+        await download_http(stream.url, writer, **request_kwargs)
+
+
+async def download_http(url: str, writer: AsyncFileWriter, timeout: float = 60, **request_kwargs):
+    """持续下载HTTP直播流（HTTP-FLV等）"""
+    async with http_pool.stream('GET', url, timeout=timeout, **request_kwargs) as response:
+        response.raise_for_status()
+        received = False
+        async for chunk in response.aiter_bytes():
+            received = True
+            await writer.write(chunk)
+    if not received:
+        raise IOError('No data returned from stream')
+
+
+def parse_playlist(text: str, base_url: str) -> Dict:
+    """
+    解析m3u8播放列表
+
+    Returns:
+        主播放列表返回 {'variants': [(带宽, URL)]}，
+        媒体播放列表返回 {'sequence', 'target_duration', 'segments', 'map', 'ended'}
+    """
+    if not text.lstrip().startswith('#EXTM3U'):
+        raise IOError('Invalid HLS playlist')
+    variants = []
+    segments: List[str] = []
+    sequence = 0
+    target_duration = 6.0
+    init_map = None
+    ended = False
+    bandwidth = None
+    is_segment = False
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-STREAM-INF'):
+            match = re.search(r'BANDWIDTH=(\d+)', line)
+            bandwidth = int(match.group(1)) if match else 0
+        elif line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+            sequence = int(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-TARGETDURATION:'):
+            target_duration = float(line.split(':', 1)[1])
+        elif line.startswith('#EXT-X-KEY') and 'METHOD=NONE' not in line:
+            raise UnsupportedStream('Encrypted HLS stream')
+        elif line.startswith('#EXT-X-MAP'):
+            match = re.search(r'URI="(.*?)"', line)
+            init_map = urljoin(base_url, match.group(1)) if match else None
+        elif line.startswith('#EXT-X-ENDLIST'):
+            ended = True
+        elif line.startswith('#EXTINF'):
+            is_segment = True
+        elif not line.startswith('#'):
+            if bandwidth is not None:
+                variants.append((bandwidth, urljoin(base_url, line)))
+                bandwidth = None
+            elif is_segment:
+                segments.append(urljoin(base_url, line))
+                is_segment = False
+    if variants:
+        return {'variants': variants}
+    return {
+        'sequence': sequence,
+        'target_duration': target_duration,
+        'segments': segments,
+        'map': init_map,
+        'ended': ended
+    }
+
+
+async def download_hls(url: str, writer: AsyncFileWriter, timeout: float = 60, live_edge: int = 3,
+                       **request_kwargs):
+    """
+    持续下载HLS直播流：按目标时长刷新播放列表，按顺序下载新分片
+
+    Args:
+        url: 播放列表URL，主播放列表时选择码率最高的子列表
+        writer: 文件写入
+        timeout: 播放列表持续无新分片多少秒后结束
+        live_edge: 首次加载时从倒数第几个分片开始下载
+    """
+    loop = asyncio.get_running_loop()
+    last_sequence = None
+    init_written = None
+    last_progress = loop.time()
+    while True:
+        response = await http_pool.request('GET', url, timeout=timeout, **request_kwargs)
+        response.raise_for_status()
+        playlist = parse_playlist(response.text, str(response.url))
+        if 'variants' in playlist:
+            url = max(playlist['variants'])[1]
+            logger.info(f'HLS选择码率最高的播放列表：{url}')
+            continue
+        segments = list(enumerate(playlist['segments'], playlist['sequence']))
+        if last_sequence is None:
+            segments = segments[-live_edge:]
+        else:
+            segments = [(sequence, segment) for sequence, segment in segments if sequence > last_sequence]
+        if playlist['map'] and playlist['map'] != init_written:
+            await writer.write(await _fetch_segment(playlist['map'], timeout, request_kwargs))
+            init_written = playlist['map']
+        for sequence, segment in segments:
+            try:
+                await writer.write(await _fetch_segment(segment, timeout, request_kwargs))
+                if writer.meter:
+                    writer.meter.segment(True)
+            except Exception as error:
+                if writer.meter:
+                    writer.meter.segment(False)
+                logger.warning(f'HLS分片下载失败，已跳过：{segment}\n{error}')
+            last_sequence = sequence
+            last_progress = loop.time()
+        if playlist['ended']:
+            return
+        if loop.time() - last_progress > timeout:
+            raise IOError(f'HLS playlist timeout: no new segments in {timeout}s')
+        # 有新分片时按目标时长刷新，否则提前刷新
+        await asyncio.sleep(playlist['target_duration'] if segments else playlist['target_duration'] / 2)
+
+
+async def _fetch_segment(url: str, timeout: float, request_kwargs: dict, retries: int = 3) -> bytes:
+    """下载单个分片，失败时重试"""
+    for attempt in range(retries):
+        try:
+            response = await http_pool.request('GET', url, timeout=timeout, **request_kwargs)
+            response.raise_for_status()
+            return response.content
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            await asyncio.sleep(1)
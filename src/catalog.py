@@ -0,0 +1,290 @@
+"""录制文件索引"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from loguru import logger
+
+# 录制文件名：[时间][平台][主播]标题.格式，见 FileHandler.get_filename
+FILENAME_PATTERN = re.compile(r'^\[[^\]]*\]\[([^\]]*)\]\[([^\]]*)\]')
+
+
+class TrackedOutput:
+    """包装录制输出，文件打开和关闭时更新索引，write 直接使用被包装输出的方法"""
+
+    def __init__(self, output, path: Path, platform: str, streamer: str):
+        self.output = output
+        self.path = path
+        self.platform = platform
+        self.streamer = streamer
+        self.write = output.write
+
+    @property
+    def opened(self) -> bool:
+        return self.output.opened
+
+    def open(self):
+        self.output.open()
+        catalog.update(self.path, self.platform, self.streamer, recording=True)
+
+    def close(self):
+        try:
+            self.output.close()
+        finally:
+            catalog.update(self.path, self.platform, self.streamer, recording=False)
+
+
+class RecordingCatalog:
+    """
+    录制文件索引
+
+    文件信息保存在 SQLite 数据库中，/api/files 的分页、排序、筛选和汇总都由数据库查询完成，不再每次请求都遍历目录。
+    录制器在文件打开和关闭时更新索引；后台线程定期检查输出目录，只重新扫描修改时间变化的目录，
+    用于发现后处理生成的文件、手动删除或移动的文件，并刷新正在录制的文件大小。
+    """
+
+    SCAN_INTERVAL = 60  # 后台检查输出目录的间隔（秒）
+    STALE_SECONDS = 300  # 标记为正在录制的文件超过该时间未修改时视为已结束（如程序异常退出）
+    SORT_FIELDS = ('modified', 'created', 'size', 'name', 'platform', 'streamer')
+
+    def __init__(self, db_file: str = 'data/catalog.db'):
+        self.db_file = Path(db_file)
+        self.directories: Set[str] = set()
+        self.scanned: Dict[str, int] = {}  # {目录: 上次扫描时的修改时间}
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库，需持有锁"""
+        if self._db is None:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    dir TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    platform TEXT,
+                    streamer TEXT,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    created REAL,
+                    modified REAL,
+                    recording INTEGER NOT NULL DEFAULT 0
+                )''')
+            for column in ('dir', 'modified', 'size', 'platform', 'streamer'):
+                self._db.execute(f'CREATE INDEX IF NOT EXISTS files_{column} ON files ({column})')
+        return self._db
+
+    def add_directory(self, directory: str):
+        """登记需要索引的输出目录，首次登记时启动后台检查线程"""
+        directory = os.path.abspath(directory)
+        if directory in self.directories:
+            return
+        self.directories.add(directory)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='catalog', daemon=True)
+            self._thread.start()
+
+    def update(self, path: Path, platform: Optional[str] = None, streamer: Optional[str] = None,
+               recording: bool = False):
+        """添加或更新单个文件，文件不存在时从索引中删除"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._connect().execute('DELETE FROM files WHERE path = ?', (path,))
+            return
+        directory, name = os.path.split(path)
+        if platform is None:
+            platform, streamer = self._parse_name(name)
+        with self._lock:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO files (path, dir, name, platform, streamer, size, created, modified, recording) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, directory, name, platform, streamer, stat.st_size, stat.st_ctime, stat.st_mtime, int(recording)))
+
+    def track(self, output, path: Path, platform: str, streamer: str) -> TrackedOutput:
+        """包装录制输出，打开和关闭时更新索引"""
+        self.add_directory(str(path.parent))
+        return TrackedOutput(output, path, platform, streamer)
+
+    @staticmethod
+    def _parse_name(name: str):
+        """从文件名解析平台和主播"""
+        match = FILENAME_PATTERN.match(name)
+        return (match.group(1), match.group(2)) if match else (None, None)
+
+    def _run(self):
+        """后台检查线程"""
+        while True:
+            try:
+                self.scan()
+            except Exception as error:
+                logger.exception(f'录制文件索引检查失败：{error}')
+            time.sleep(self.SCAN_INTERVAL)
+
+    def scan(self, force: bool = False):
+        """检查所有输出目录，目录修改时间变化或 force 为真时重新扫描；刷新正在录制的文件大小"""
+        for directory in list(self.directories):
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if force or self.scanned.get(directory) != mtime:
+                self._scan_directory(directory, mtime is not None)
+                self.scanned[directory] = mtime
+        with self._lock:
+            rows = self._connect().execute('SELECT path FROM files WHERE recording = 1').fetchall()
+        for row in rows:
+            self._refresh(row['path'])
+
+    def _scan_directory(self, directory: str, exists: bool):
+        """重新扫描目录：添加新文件、删除已不存在的文件、更新大小和修改时间"""
+        found = []
+        if exists:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        platform, streamer = self._parse_name(entry.name)
+                        found.append((os.path.join(directory, entry.name), directory, entry.name, platform, streamer,
+                                      stat.st_size, stat.st_ctime, stat.st_mtime))
+        with self._lock:
+            db = self._connect()
+            db.execute('BEGIN')
+            try:
+                db.execute('CREATE TEMP TABLE IF NOT EXISTS scan (path TEXT PRIMARY KEY)')
+                db.execute('DELETE FROM scan')
+                db.executemany('INSERT INTO scan (path) VALUES (?)', ((item[0],) for item in found))
+                db.execute('DELETE FROM files WHERE dir = ? AND path NOT IN (SELECT path FROM scan)', (directory,))
+                db.executemany(
+                    'INSERT INTO files (path, dir, name, platform, streamer, size, created, modified) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET '
+                    'size = excluded.size, modified = excluded.modified', found)
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        logger.debug(f'录制文件索引已更新：{directory}（{len(found)} 个文件）')
+
+    def _refresh(self, path: str):
+        """刷新正在录制的文件的大小和修改时间"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._connect().execute('DELETE FROM files WHERE path = ?', (path,))
+            return
+        recording = time.time() - stat.st_mtime < self.STALE_SECONDS
+        with self._lock:
+            self._connect().execute('UPDATE files SET size = ?, modified = ?, recording = ? WHERE path = ?',
+                                    (stat.st_size, stat.st_mtime, int(recording), path))
+
+    def query(self, directory: Optional[str] = None, platform: Optional[str] = None,
+              streamer: Optional[str] = None, keyword: Optional[str] = None, sort: str = 'modified',
+              order: str = 'desc', page: int = 1, page_size: int = 100) -> dict:
+        """
+        分页查询录制文件
+
+        Args:
+            directory: 输出目录，为None时查询所有已登记的目录
+            platform: 平台
+            streamer: 主播名称
+            keyword: 文件名包含的关键词
+            sort: 排序字段，见 SORT_FIELDS
+            order: asc 或 desc
+            page: 页码，从1开始
+            page_size: 每页数量
+
+        Returns:
+            {'files': 当前页的文件, 'count': 符合条件的文件数, 'total_size': 符合条件的文件总大小}
+        """
+        if directory is not None:
+            directory = os.path.abspath(directory)
+            self.add_directory(directory)
+        # 目录尚未扫描时先同步扫描一次
+        pending = [d for d in ([directory] if directory else list(self.directories)) if d not in self.scanned]
+        if pending:
+            self.scan()
+        conditions, params = [], []
+        if directory:
+            conditions.append('dir = ?')
+            params.append(directory)
+        for column, value in (('platform', platform), ('streamer', streamer)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if keyword:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', keyword) + '%')
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        sort = sort if sort in self.SORT_FIELDS else 'modified'
+        order = 'ASC' if order.lower() == 'asc' else 'DESC'
+        page, page_size = max(page, 1), min(max(page_size, 1), 1000)
+        with self._lock:
+            db = self._connect()
+            count, total_size = db.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files {where}', params).fetchone()
+            rows = db.execute(f'SELECT * FROM files {where} ORDER BY {sort} {order}, path LIMIT ? OFFSET ?',
+                              [*params, page_size, (page - 1) * page_size]).fetchall()
+        files = [{
+            'name': row['name'],
+            'dir': row['dir'],
+            'platform': row['platform'],
+            'streamer': row['streamer'],
+            'size': row['size'],
+            'size_mb': round(row['size'] / 1024 / 1024, 2),
+            'created': datetime.fromtimestamp(row['created']).isoformat(),
+            'modified': datetime.fromtimestamp(row['modified']).isoformat(),
+            'recording': bool(row['recording'])
+        } for row in rows]
+        return {'files': files, 'count': count, 'total_size': total_size}
+
+    @staticmethod
+    def _filter(directories: Optional[List[str]], platform: Optional[str], streamer: Optional[str]):
+        conditions, params = [], []
+        if directories is not None:
+            directories = [os.path.abspath(directory) for directory in directories]
+            conditions.append(f'dir IN ({", ".join("?" * len(directories))})')
+            params.extend(directories)
+        for column, value in (('platform', platform), ('streamer', streamer)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        return conditions, params
+
+    def usage(self, directories: Optional[List[str]] = None, platform: Optional[str] = None,
+              streamer: Optional[str] = None) -> int:
+        """录制文件总大小，可按目录、平台和主播筛选"""
+        conditions, params = self._filter(directories, platform, streamer)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        with self._lock:
+            return self._connect().execute(f'SELECT COALESCE(SUM(size), 0) FROM files {where}', params).fetchone()[0]
+
+    def oldest(self, directories: Optional[List[str]] = None, platform: Optional[str] = None,
+               streamer: Optional[str] = None, before: Optional[float] = None, limit: int = 20) -> List[dict]:
+        """最旧的不在录制中的文件 [{'path', 'size', 'modified'}]，before 为修改时间上限"""
+        conditions, params = self._filter(directories, platform, streamer)
+        conditions.append('recording = 0')
+        if before is not None:
+            conditions.append('modified < ?')
+            params.append(before)
+        with self._lock:
+            rows = self._connect().execute(
+                f'SELECT path, size, modified FROM files WHERE {" AND ".join(conditions)} ORDER BY modified LIMIT ?',
+                [*params, limit]).fetchall()
+        return [dict(row) for row in rows]
+
+
+# 全局录制文件索引
+catalog = RecordingCatalog()
@@ -0,0 +1,343 @@
+"""多进程录制"""
+
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .events import bus
+from .executor import capacity
+from .metrics import metrics
+from .postprocess import postprocess
+from .rate_limiter import rate_limiter
+from .reconciler import ConfigReconciler
+from .registry import RoomKey, recorders, recordings
+from .storage import storage
+
+
+class HashRing:
+    """一致性哈希环，增删节点时只有该节点上的键会移动"""
+
+    def __init__(self, replicas: int = 100):
+        self.replicas = replicas
+        self.hashes: List[int] = []
+        self.nodes: Dict[int, int] = {}  # {哈希值: 节点}
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+    def add(self, node: int):
+        for i in range(self.replicas):
+            value = self._hash(f'{node}#{i}')
+            self.nodes[value] = node
+            bisect.insort(self.hashes, value)
+
+    def remove(self, node: int):
+        for i in range(self.replicas):
+            value = self._hash(f'{node}#{i}')
+            if self.nodes.pop(value, None) is not None:
+                self.hashes.remove(value)
+
+    def get(self, key: RoomKey) -> Optional[int]:
+        """获取键所属的节点"""
+        if not self.hashes:
+            return None
+        index = bisect.bisect(self.hashes, self._hash(f'{key[0]}/{key[1]}')) % len(self.hashes)
+        return self.nodes[self.hashes[index]]
+
+
+class ClusterSupervisor(ConfigReconciler):
+    """
+    多进程录制的控制进程
+
+    按 (平台, 房间ID) 的一致性哈希把主播分配给多个工作进程，每个工作进程独立运行录制器和事件循环。
+    工作进程退出时将其主播重新分配给其他进程并启动新的工作进程；正在录制的主播不会被迁移，
+    录制结束后再按哈希环归位。各工作进程定期上报录制状态、事件总线中的主播状态以及录制容量、限速和磁盘空间统计，由本进程汇总给Web接口。
+    """
+
+    REPORT_INTERVAL = 2  # 工作进程上报状态的间隔（秒）
+    STATE_TIMEOUT = 10  # 超过该时间未上报的状态视为过期（秒）
+    CRASH_WINDOW = 30  # 启动后多少秒内退出视为启动失败
+    SHUTDOWN_TIMEOUT = 60  # 退出时等待工作进程关闭录制的时间（秒），超时后强制结束
+
+    def __init__(self, config_file: str, workers: int):
+        super().__init__(config_file, {})
+        self.size = workers
+        self.context = multiprocessing.get_context('spawn')
+        self.state_queue = self.context.Queue()
+        self.workers: Dict[int, Tuple[multiprocessing.Process, multiprocessing.Queue]] = {}
+        self.ring = HashRing()
+        self.assignment: Dict[RoomKey, int] = {}
+        self.paused: Set[RoomKey] = set()  # 暂停的主播，随主播列表发送给工作进程
+        self.sent: Dict[int, list] = {}  # 已发送给各工作进程的主播列表
+        self.states: Dict[int, dict] = {}  # 各工作进程最近一次上报的状态
+        self._next_id = 0
+        self._started: Dict[int, float] = {}  # 各工作进程的启动时间
+        self._crashes = 0  # 连续启动后很快退出的次数
+        self._respawn_at = 0.0  # 下次允许启动工作进程的时间
+
+    async def run(self):
+        """启动工作进程，持续监视配置文件和工作进程"""
+        for _ in range(self.size):
+            self._spawn()
+        threading.Thread(target=self._read_states, daemon=True).start()
+        try:
+            while True:
+                self.check()
+                self._check_workers()
+                self._distribute()
+                await asyncio.sleep(self.CHECK_INTERVAL)
+        finally:
+            logger.info(f'正在通知 {len(self.workers)} 个工作进程关闭直播流并退出')
+            for process, commands in self.workers.values():
+                commands.put({'type': 'exit'})
+            await asyncio.get_running_loop().run_in_executor(None, self._join_workers)
+
+    def _join_workers(self):
+        """等待工作进程关闭录制后退出，超时仍未退出的进程强制结束"""
+        deadline = time.time() + self.SHUTDOWN_TIMEOUT
+        for worker_id, (process, _) in self.workers.items():
+            process.join(max(deadline - time.time(), 0))
+            if process.is_alive():
+                logger.warning(f'工作进程 {worker_id} 未能在 {self.SHUTDOWN_TIMEOUT} 秒内退出，强制结束')
+                process.terminate()
+                process.join(5)
+
+    def apply(self, global_config: dict, user_list: list):
+        """记录新配置，由 _distribute 分发给工作进程"""
+        self.users = self.index_users(user_list)
+        self.paused &= set(self.users)
+        self.global_config = global_config
+        logger.info(f'配置已加载：共 {len(self.users)} 个主播，{len(self.workers)} 个工作进程')
+
+    def _spawn(self):
+        """启动一个工作进程并加入哈希环"""
+        worker_id = self._next_id
+        self._next_id += 1
+        commands = self.context.Queue()
+        process = self.context.Process(
+            target=worker_main, args=(worker_id, commands, self.state_queue),
+            name=f'recorder-worker-{worker_id}', daemon=True)
+        process.start()
+        self.workers[worker_id] = (process, commands)
+        self._started[worker_id] = time.time()
+        self.ring.add(worker_id)
+        logger.info(f'工作进程 {worker_id} 已启动，PID：{process.pid}')
+
+    def _check_workers(self):
+        """移除已退出的工作进程并启动新的进程补足数量"""
+        for worker_id, (process, _) in list(self.workers.items()):
+            if not process.is_alive():
+                logger.error(f'工作进程 {worker_id} 已退出（退出码 {process.exitcode}），重新分配其主播')
+                del self.workers[worker_id]
+                self.ring.remove(worker_id)
+                self.sent.pop(worker_id, None)
+                self.states.pop(worker_id, None)
+                bus.forget(worker_id)
+                # 启动后很快退出时逐渐延长重启间隔，避免反复重启
+                if time.time() - self._started.pop(worker_id) < self.CRASH_WINDOW:
+                    self._crashes += 1
+                    self._respawn_at = time.time() + min(2 ** self._crashes, 60)
+                else:
+                    self._crashes = 0
+        if time.time() >= self._respawn_at:
+            while len(self.workers) < self.size:
+                self._spawn()
+
+    def _read_states(self):
+        """接收工作进程上报的状态（在单独线程中运行）"""
+        while True:
+            state = self.state_queue.get()
+            state['time'] = time.time()
+            self.states[state['worker']] = state
+            # 主播状态合并到本进程的事件总线，由Web服务推送
+            bus.merge(state['events'], state['worker'])
+
+    def _recording_owner(self) -> Dict[RoomKey, int]:
+        """正在录制的主播及其所在的工作进程"""
+        owners = {}
+        for worker_id, state in list(self.states.items()):
+            if worker_id in self.workers:
+                for info in state['recording'].values():
+                    owners[(info['platform'], info['user_id'])] = worker_id
+        return owners
+
+    def _distribute(self):
+        """按哈希环分配主播，正在录制的主播保留在原进程，分配变化时通知工作进程"""
+        if self.global_config is None or not self.workers:
+            return
+        owners = self._recording_owner()
+        assignment = {}
+        groups: Dict[int, list] = {worker_id: [] for worker_id in self.workers}
+        for key, user in self.users.items():
+            worker_id = owners.get(key, self.ring.get(key))
+            assignment[key] = worker_id
+            groups[worker_id].append(user)
+        self.assignment = assignment
+        for worker_id, users in groups.items():
+            paused = sorted((user['platform'], user['id']) for user in users
+                            if (user['platform'], user['id']) in self.paused)
+            message = [self.global_config, users, paused]
+            if self.sent.get(worker_id) != message:
+                self.workers[worker_id][1].put({'type': 'apply', 'global': self.global_config, 'users': users,
+                                                'paused': paused})
+                self.sent[worker_id] = message
+
+    def control(self, action: str, keys: Iterable[RoomKey]) -> Dict[RoomKey, Optional[int]]:
+        """
+        批量启动、停止或暂停录制器，转发给主播所在的工作进程，结果见 RecorderRegistry.control
+
+        停止的录制数按最近一次上报的录制状态计算。
+        """
+        if action not in recorders.ACTIONS:
+            raise ValueError(f'不支持的操作: {action}')
+        recording = {}
+        if action == 'stop':
+            for info in self.recording_info().values():
+                key = (info['platform'], info['user_id'])
+                recording[key] = recording.get(key, 0) + 1
+        results: Dict[RoomKey, Optional[int]] = {}
+        groups: Dict[int, List[RoomKey]] = {}
+        for key in keys:
+            worker_id = self.assignment.get(key)
+            if worker_id is None or worker_id not in self.workers:
+                results[key] = None
+                continue
+            groups.setdefault(worker_id, []).append(key)
+            if action == 'start':
+                self.paused.discard(key)
+            else:
+                self.paused.add(key)
+            results[key] = recording.get(key, 0) if action == 'stop' else 1
+        for worker_id, group in groups.items():
+            self.workers[worker_id][1].put({'type': 'control', 'action': action, 'keys': group})
+        return results
+
+    def _fresh_states(self) -> List[Tuple[int, dict]]:
+        """各工作进程未过期的最近一次上报的状态"""
+        deadline = time.time() - self.STATE_TIMEOUT
+        return [(worker_id, state) for worker_id, state in list(self.states.items()) if state['time'] >= deadline]
+
+    def recording_info(self) -> Dict[str, dict]:
+        """汇总所有工作进程的录制状态"""
+        info = {}
+        for worker_id, state in self._fresh_states():
+            for url, item in state['recording'].items():
+                info[url] = {**item, 'worker': worker_id}
+        return info
+
+    def capacity_stats(self) -> dict:
+        """汇总各工作进程的录制容量，录制上限 max_recordings 对每个工作进程单独生效"""
+        total = {'max_recordings': 0, 'active_recordings': 0, 'free_slots': 0, 'rejected': 0}
+        workers = {}
+        for worker_id, state in self._fresh_states():
+            workers[str(worker_id)] = state['capacity']
+            for name in total:
+                total[name] += state['capacity'][name]
+        return {**total, 'workers': workers}
+
+    def rate_limit_stats(self) -> Dict[str, dict]:
+        """汇总各工作进程的请求限速统计，限速对每个工作进程单独生效"""
+        hosts: Dict[str, dict] = {}
+        for _, state in self._fresh_states():
+            for host, stats in state['rate_limit'].items():
+                item = hosts.setdefault(host, {'requests': 0, 'rejected': 0, 'queued': 0, 'in_flight': 0,
+                                               'wait_total': 0.0, 'wait_max': 0.0})
+                for name in ('requests', 'rejected', 'queued', 'in_flight'):
+                    item[name] += stats[name]
+                item['wait_total'] += stats['wait_avg'] * stats['requests']
+                item['wait_max'] = max(item['wait_max'], stats['wait_max'])
+        for item in hosts.values():
+            wait_total = item.pop('wait_total')
+            item['wait_avg'] = round(wait_total / item['requests'], 3) if item['requests'] else 0
+        return hosts
+
+    def postprocess_workers(self) -> int:
+        """各工作进程的后处理并发数之和，postprocess_workers 对每个工作进程单独生效"""
+        return sum(state['postprocess_workers'] for _, state in self._fresh_states())
+
+    def storage_status(self) -> dict:
+        """汇总各工作进程的磁盘空间状态，准入和清理记录按时间合并"""
+        status = {'options': {}, 'disks': [], 'quotas': [], 'decisions': [], 'evictions': [], 'evicted_bytes': 0}
+        disks, quotas = {}, {}
+        for _, state in self._fresh_states():
+            storage_state = state['storage']
+            status['options'] = storage_state['options']
+            disks.update((disk['directory'], disk) for disk in storage_state['disks'])
+            quotas.update(((quota['platform'], quota['streamer']), quota) for quota in storage_state['quotas'])
+            status['decisions'] += storage_state['decisions']
+            status['evictions'] += storage_state['evictions']
+            status['evicted_bytes'] += storage_state['evicted_bytes']
+        status['disks'] = list(disks.values())
+        status['quotas'] = list(quotas.values())
+        status['decisions'].sort(key=lambda item: item['time'], reverse=True)
+        status['evictions'].sort(key=lambda item: item['time'], reverse=True)
+        return status
+
+    def metrics_families(self) -> list:
+        """控制进程自身的指标：各工作进程的存活状态"""
+        samples = [('live_recorder_worker_up', {'worker': str(worker_id)}, int(process.is_alive()))
+                   for worker_id, (process, _) in list(self.workers.items())]
+        return [{'name': 'live_recorder_worker_up', 'type': 'gauge', 'help': '工作进程是否存活', 'samples': samples}]
+
+    def worker_metrics(self) -> list:
+        """各工作进程最近一次上报的指标，[({'worker': 工作进程ID}, 指标族列表)]"""
+        return [({'worker': str(worker_id)}, state['metrics']) for worker_id, state in self._fresh_states()]
+
+
+def worker_main(worker_id: int, commands: multiprocessing.Queue, states: multiprocessing.Queue):
+    """工作进程入口"""
+    from .utils import setup_logger
+    setup_logger()
+    # 终端的 Ctrl+C 会发送给整个进程组，由控制进程统一通知工作进程关闭录制后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f'工作进程 {worker_id} 运行中，PID：{os.getpid()}')
+    try:
+        asyncio.run(_worker_loop(worker_id, commands, states))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(worker_id: int, commands: multiprocessing.Queue, states: multiprocessing.Queue):
+    """工作进程主循环：执行控制进程的命令并定期上报状态"""
+    reconciler = ConfigReconciler(None, recordings, recorders)
+    loop = asyncio.get_running_loop()
+
+    async def report():
+        while True:
+            info = {item.url: item.info() for item in recordings.snapshot()}
+            # 磁盘空间状态需要查询录制文件索引，在线程池中执行
+            storage_state = await loop.run_in_executor(None, storage.status)
+            states.put({'worker': worker_id, 'pid': os.getpid(), 'recording': info,
+                        'recorders': len(reconciler.recorders), 'metrics': metrics.collect(),
+                        'events': bus.export(), 'capacity': capacity.stats(), 'rate_limit': rate_limiter.stats(),
+                        'postprocess_workers': postprocess.workers, 'storage': storage_state})
+            await asyncio.sleep(ClusterSupervisor.REPORT_INTERVAL)
+
+    reporter = asyncio.create_task(report())
+    try:
+        while True:
+            try:
+                command = await loop.run_in_executor(None, commands.get, True, 1)
+            except queue.Empty:
+                continue
+            if command['type'] == 'apply':
+                # 迁移到本进程的暂停主播在创建录制器时暂停
+                recorders.paused = {tuple(key) for key in command['paused']}
+                reconciler.apply(command['global'], command['users'])
+            elif command['type'] == 'control':
+                recorders.control(command['action'], [tuple(key) for key in command['keys']])
+            elif command['type'] == 'exit':
+                break
+    finally:
+        reporter.cancel()
+        recordings.close_all()
@@ -1,6 +1,7 @@
 """配置管理模块 - 统一的配置管理"""
 
 import json
+import os
 from pathlib import Path
 from typing import Dict, List, Any
 
@@ -40,18 +41,44 @@ class Config:
         """获取全局配置"""
         return {
             'proxy': self.config.get('proxy'),
-            'output': self.config.get('output', 'output')
+            'output': self.config.get('output', 'output'),
+            'batch_poll': self.config.get('batch_poll', True),
+            'adaptive_poll': self.config.get('adaptive_poll', True),
+            'rate_limit': self.config.get('rate_limit', {}),
+            'max_recordings': self.config.get('max_recordings', 64),
+            'postprocess_workers': self.config.get('postprocess_workers', 2),
+            'postprocess_nice': self.config.get('postprocess_nice', 10),
+            'postprocess_ionice': self.config.get('postprocess_ionice', [2, 7]),
+            'engine': self.config.get('engine', 'streamlink'),
+            'platform_engine': self.config.get('platform_engine', {}),
+            'live_remux': self.config.get('live_remux', False),
+            'segment_minutes': self.config.get('segment_minutes', 0),
+            'segment_gb': self.config.get('segment_gb', 0),
+            'file_writer': self.config.get('file_writer', {}),
+            'storage': self.config.get('storage', {})
         }
     
     def get_users(self) -> List[Dict]:
         """获取用户列表"""
         return self.config.get('user', [])
     
+    def reload(self) -> bool:
+        """重新读取配置文件，读取失败时保留当前配置并返回False"""
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                self.config = json.load(f)
+            return True
+        except Exception as e:
+            print(f"重新加载配置失败 {self.config_file}: {e}")
+            return False
+    
     def save(self, config: Dict[str, Any]) -> bool:
-        """保存配置"""
+        """保存配置，先写入临时文件再替换，避免读取到写了一半的配置"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
+            temp_file = self.config_file.with_name(f'{self.config_file.name}.tmp')
+            with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.config_file)
             self.config = config
             return True
         except Exception as e:
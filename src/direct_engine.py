@@ -0,0 +1,235 @@
+"""零拷贝HTTP-FLV录制引擎"""
+
+import socket
+import ssl
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from streamlink.stream.hls import HLSStream
+from streamlink.stream.http import HTTPStream
+
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+def supports(stream, proxy: Optional[str] = None) -> bool:
+    """直接录制是否支持该直播流：不使用代理的 HTTP-FLV 等普通HTTP直播流"""
+    return isinstance(stream, HTTPStream) and not isinstance(stream, HLSStream) and not proxy \
+        and urlsplit(stream.url).scheme in ('http', 'https')
+
+
+class HttpStreamReader:
+    """
+    HTTP/1.1 直播流读取
+
+    直接在套接字上发送请求，响应体通过 recv_into 读入调用方提供的缓冲区，不经过 requests、
+    streamlink 的环形缓冲区和 StreamRunner 的读取循环。支持重定向、Content-Length、chunked 和以关闭连接结束的响应。
+    close 可在任意线程调用以中断读取。
+    """
+
+    MAX_REDIRECTS = 5
+    MAX_HEADER = 64 * 1024
+    LINE_READ = 256  # 读取头部时每次读取的字节数，较小以减少读入 pending 后需要复制的响应体数据
+
+    def __init__(self, url: str, headers: Optional[Dict[str, str]] = None, verify: bool = True,
+                 timeout: float = 60):
+        """
+        Args:
+            url: 直播流URL
+            headers: 请求头
+            verify: 是否验证SSL证书
+            timeout: 连接和读取超时（秒）
+        """
+        self.url = url
+        self.headers = headers or {}
+        self.verify = verify
+        self.timeout = timeout
+        self.sock: Optional[socket.socket] = None
+        self.pending = bytearray()  # 解析响应头和 chunk 头时多读的数据
+        self.chunked = False
+        self.remaining: Optional[int] = None  # Content-Length 剩余字节数
+        self.chunk_left = 0
+        self.finished = False
+        self.closed = False
+        self._line_buffer = memoryview(bytearray(self.LINE_READ))
+
+    def open(self):
+        """发送请求并读取响应头，跟随重定向"""
+        url = self.url
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, headers = self._request(url)
+            if status in REDIRECTS and 'location' in headers:
+                url = urljoin(url, headers['location'])
+                self._close_socket()
+                continue
+            if status != 200:
+                raise IOError(f'Unable to open URL: {url} (HTTP {status})')
+            self.url = url
+            self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+            if not self.chunked and 'content-length' in headers:
+                self.remaining = int(headers['content-length'])
+            return
+        raise IOError(f'Unable to open URL: {self.url} (too many redirects)')
+
+    def _request(self, url: str) -> Tuple[int, Dict[str, str]]:
+        parts = urlsplit(url)
+        https = parts.scheme == 'https'
+        host, port = parts.hostname, parts.port or (443 if https else 80)
+        try:
+            sock = socket.create_connection((host, port), timeout=self.timeout)
+        except socket.timeout:
+            raise IOError(f'Connect timeout ({self.timeout}s): {host}')
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if https:
+            context = ssl.create_default_context()
+            if not self.verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            sock = context.wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        if self.closed:
+            raise IOError('Stream closed')
+        target = parts.path or '/'
+        if parts.query:
+            target += f'?{parts.query}'
+        headers = {'Host': parts.netloc, 'Accept': '*/*', 'Accept-Encoding': 'identity', **self.headers,
+                   'Connection': 'close'}
+        request = f'GET {target} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+        sock.sendall(request.encode('latin-1'))
+        self.pending.clear()
+        status_line = self._readline()
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise IOError(f'Invalid HTTP response: {status_line[:100]!r}')
+        response_headers = {}
+        while line := self._readline():
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers
+
+    def _recv(self, view: memoryview) -> int:
+        # close 可能在其他线程调用，只使用 socket 对象而不依赖 self.sock 的值
+        sock = self.sock
+        try:
+            return sock.recv_into(view)
+        except socket.timeout:
+            raise IOError(f'Read timeout ({self.timeout}s)')
+        except OSError:
+            if self.closed:
+                return 0
+            raise
+
+    def _readline(self) -> bytes:
+        """读取一行（响应头、chunk 头），多读的数据留在 pending 中"""
+        while (end := self.pending.find(b'\r\n')) < 0:
+            if len(self.pending) > self.MAX_HEADER:
+                raise IOError('HTTP header too long')
+            n = self._recv(self._line_buffer)
+            if not n:
+                if self.closed:
+                    # 被 close 停止
+                    return b''
+                raise IOError('Connection closed while reading HTTP header')
+            self.pending += self._line_buffer[:n]
+        line = bytes(self.pending[:end])
+        del self.pending[:end + 2]
+        return line
+
+    def _read_body(self, view: memoryview) -> int:
+        """读取响应体到 view，优先使用解析头部时多读的数据"""
+        if self.pending:
+            n = min(len(view), len(self.pending))
+            view[:n] = self.pending[:n]
+            del self.pending[:n]
+            return n
+        return self._recv(view)
+
+    def readinto(self, view: memoryview) -> int:
+        """
+        读取响应体到 view，返回读取的字节数，响应结束时返回0
+
+        chunked 响应每次最多读到当前 chunk 末尾，chunk 头之外的数据直接读入 view。
+        """
+        if self.finished or self.closed:
+            return 0
+        if not self.chunked:
+            if self.remaining is not None:
+                if not self.remaining:
+                    self.finished = True
+                    return 0
+                view = view[:self.remaining]
+            n = self._read_body(view)
+            if self.remaining is not None:
+                self.remaining -= n
+            if not n:
+                self.finished = True
+            return n
+        if not self.chunk_left:
+            size = int(self._readline().split(b';')[0].strip() or b'0', 16)
+            if not size:
+                self.finished = True
+                return 0
+            self.chunk_left = size
+        n = self._read_body(view[:self.chunk_left])
+        if not n:
+            self.finished = True
+            return 0
+        self.chunk_left -= n
+        if not self.chunk_left:
+            # chunk 末尾的 CRLF
+            self._readline()
+        return n
+
+    def _close_socket(self):
+        # 保留 socket 对象，读取线程此时仍可能在 recv_into 中，关闭后的读取按 OSError 处理
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def close(self):
+        self.closed = True
+        self._close_socket()
+
+
+def capture(reader: HttpStreamReader, output, buffer_size: int = 1024 * 1024, min_write: int = 256 * 1024,
+            max_delay: float = 1) -> int:
+    """
+    从 reader 读取直播流写入 output 直到结束
+
+    数据通过 memoryview 直接读入预分配的缓冲区，累积到 min_write 或距上次写入超过 max_delay 秒后
+    把缓冲区的切片交给 output，整个过程不复制数据。第一块数据立即写入，用于统计首字节耗时。
+    output.write 返回后缓冲区即被复用，output 不能保留 data 的引用
+    （DirectFileOutput、BufferedFileOutput、写入统计等均在 write 中完成写入或复制）。
+
+    Args:
+        reader: 已打开的 HttpStreamReader
+        output: 已打开的录制输出
+        buffer_size: 缓冲区大小
+        min_write: 累积到该大小后写入
+        max_delay: 最长累积时间（秒），低码率直播流不会因累积而被视为读取停顿
+
+    Returns:
+        写入的字节数
+    """
+    view = memoryview(bytearray(max(buffer_size, min_write)))
+    total = 0
+    last_write = 0.0
+    while True:
+        filled = 0
+        while n := reader.readinto(view[filled:]):
+            filled += n
+            if filled >= min_write or time.monotonic() - last_write >= max_delay:
+                break
+        if not filled:
+            break
+        output.write(view[:filled])
+        total += filled
+        last_write = time.monotonic()
+    if not total:
+        raise IOError('No data returned from stream')
+    return total
@@ -0,0 +1,223 @@
+"""录制器事件总线"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from .metrics import Family, metrics
+
+# 录制器发布的事件
+EVENTS = {
+    'polled': '完成一次直播状态检测',
+    'live': '检测到开播',
+    'recording': '开始录制',
+    'progress': '录制写入进度（推送前从写入统计采样）',
+    'stopped': '录制结束',
+    'error': '检测或录制错误',
+    'removed': '主播已从配置中删除',
+    'paused': '暂停检测',
+    'resumed': '恢复检测',
+}
+# 事件对应的主播状态，未列出的事件不改变状态
+STATUS = {'live': 'live', 'recording': 'recording', 'stopped': 'offline'}
+
+
+class Subscriber:
+    """一个WebSocket客户端的待发送消息，只在Web服务的事件循环中使用"""
+
+    def __init__(self, bus: 'EventBus'):
+        self.bus = bus
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, message: Optional[str]):
+        """加入一条已序列化的消息，None 表示发送完整快照"""
+        if self.queue.qsize() >= self.bus.QUEUE_SIZE:
+            # 客户端接收太慢，丢弃积压的增量，改为发送快照
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = None
+        self.queue.put_nowait(message)
+
+    def resync(self, since: Optional[int], epoch: Optional[int] = None):
+        """补发序号 since 之后的增量，无法补发（或序号来自重启前的总线）时发送快照"""
+        missed = self.bus.since(since) if since is not None and epoch == self.bus.epoch else None
+        for message in [None] if missed is None else missed:
+            self.put(message)
+
+    async def get(self) -> str:
+        message = await self.queue.get()
+        return self.bus.snapshot() if message is None else message
+
+
+class EventBus:
+    """
+    录制器事件总线
+
+    录制器在检测、开播、开始录制、录制结束和出错时发布事件，总线据此维护每个主播的当前状态
+    （键为 平台_房间ID，与前端一致）。写入进度不由录制器逐次发布，推送前从写入统计中采样。
+    状态变化不立即推送：推送任务每 FLUSH_INTERVAL 秒把期间变化的主播合并为一条带序号的增量，
+    只序列化一次后发送给所有WebSocket客户端，同一主播多次变化只发送最终状态，没有变化时不发送。
+    最近 HISTORY 条增量保留在内存中，客户端重连或发现序号不连续时补发缺失的增量，超出范围时发送完整快照。
+    publish 可在任意线程调用。
+    """
+
+    FLUSH_INTERVAL = 0.5  # 推送间隔（秒）
+    HISTORY = 256  # 保留的增量数
+    QUEUE_SIZE = 64  # 每个客户端最多积压的消息数，超出时改为发送快照
+
+    def __init__(self):
+        self.epoch = int(time.time() * 1000)  # 总线创建时间，进程重启后序号重新开始，客户端据此判断序号是否有效
+        self.states: Dict[str, dict] = {}  # {平台_房间ID: 状态}
+        self.seq = 0  # 最新增量的序号
+        self.history: Deque[Tuple[int, str]] = deque(maxlen=self.HISTORY)  # (序号, 序列化后的增量)
+        self.counts: Dict[str, int] = {}  # 各事件的发布次数
+        self.subscribers: Set[Subscriber] = set()
+        self._dirty: Set[str] = set()
+        self._sources: Dict[Hashable, Set[str]] = {}  # 合并的状态来源（工作进程）及其主播
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(platform: str, user_id: str) -> str:
+        return f'{platform}_{user_id}'
+
+    def publish(self, event: str, platform: str, user_id: str, **fields):
+        """
+        发布事件并更新主播状态
+
+        Args:
+            event: 事件，见 EVENTS
+            platform: 平台
+            user_id: 房间ID
+            **fields: 更新到状态中的字段（如 name、title、filename、error）
+        """
+        key = self.key(platform, user_id)
+        with self._lock:
+            self.counts[event] = self.counts.get(event, 0) + 1
+            if event == 'removed':
+                self._remove(key)
+                return
+            state = self.states.get(key)
+            if state is None:
+                state = self.states[key] = {'platform': platform, 'user_id': user_id, 'status': 'offline'}
+            state.update(fields, event=event, updated=time.time())
+            if event in STATUS:
+                state['status'] = STATUS[event]
+            self._dirty.add(key)
+
+    def _remove(self, key: str):
+        """删除主播状态，需持有锁"""
+        if self.states.pop(key, None) is not None:
+            self._dirty.add(key)
+
+    def sample(self):
+        """从写入统计采样正在进行的录制的写入字节数和码率，有变化时发布 progress 事件"""
+        for meter in list(metrics.recordings.values()):
+            state = self.states.get(self.key(meter.platform, meter.user_id))
+            if state is not None and state['status'] == 'recording' and state.get('bytes') != meter.bytes:
+                self.publish('progress', meter.platform, meter.user_id, bytes=meter.bytes,
+                             bitrate=round(meter.throughput() * 8))
+
+    def export(self) -> Dict[str, dict]:
+        """当前所有主播的状态（多进程模式下工作进程上报给控制进程）"""
+        self.sample()
+        with self._lock:
+            return {key: dict(state) for key, state in self.states.items()}
+
+    def merge(self, states: Dict[str, dict], source: Hashable):
+        """
+        合并工作进程上报的主播状态，有变化的主播加入下一条增量
+
+        Args:
+            states: 工作进程的 export 结果
+            source: 状态来源（工作进程ID），该来源之前上报、本次不再上报且不属于其他来源的主播视为已删除
+        """
+        with self._lock:
+            for key, state in states.items():
+                if self.states.get(key) != state:
+                    self.states[key] = state
+                    self._dirty.add(key)
+            previous = self._sources.get(source, set())
+            self._sources[source] = set(states)
+            others = set().union(*(keys for other, keys in self._sources.items() if other != source))
+            for key in previous - set(states) - others:
+                self._remove(key)
+
+    def forget(self, source: Hashable):
+        """删除已退出的工作进程上报的主播状态"""
+        with self._lock:
+            keys = self._sources.pop(source, set())
+            others = set().union(*self._sources.values())
+            for key in keys - others:
+                self._remove(key)
+
+    def flush(self):
+        """把期间变化的主播合并为一条增量发送给所有客户端，需在Web服务的事件循环中调用"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self.seq += 1
+            changes = {key: self.states.get(key) for key in self._dirty}
+            self._dirty.clear()
+            message = json.dumps({'type': 'delta', 'seq': self.seq, 'changes': changes}, ensure_ascii=False)
+            self.history.append((self.seq, message))
+        for subscriber in list(self.subscribers):
+            subscriber.put(message)
+
+    def since(self, seq: int) -> Optional[List[str]]:
+        """序号 seq 之后的增量，已不在历史中时返回None"""
+        with self._lock:
+            if seq == self.seq:
+                return []
+            if seq > self.seq or not self.history or self.history[0][0] > seq + 1:
+                return None
+            return [message for number, message in self.history if number > seq]
+
+    def snapshot(self) -> str:
+        """所有主播状态的完整快照"""
+        with self._lock:
+            return json.dumps({'type': 'snapshot', 'epoch': self.epoch, 'seq': self.seq, 'states': self.states},
+                              ensure_ascii=False)
+
+    def subscribe(self, since: Optional[int] = None, epoch: Optional[int] = None) -> Subscriber:
+        """
+        添加WebSocket客户端，需在Web服务的事件循环中调用，首次调用时启动推送任务
+
+        Args:
+            since: 客户端已收到的最后一条增量的序号，为None或无法补发时先发送快照
+            epoch: 客户端收到的快照中的 epoch，与本总线不同时先发送快照
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        subscriber = Subscriber(self)
+        self.subscribers.add(subscriber)
+        subscriber.resync(since, epoch)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _run(self):
+        """推送任务"""
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            self.sample()
+            self.flush()
+
+    def metric_families(self) -> List[Family]:
+        """事件总线指标"""
+        return [
+            {'name': 'live_recorder_events_total', 'type': 'counter', 'help': '录制器发布的事件数',
+             'samples': [('live_recorder_events_total', {'event': event}, count)
+                         for event, count in list(self.counts.items())]},
+            {'name': 'live_recorder_status_subscribers', 'type': 'gauge', 'help': '订阅录制状态的WebSocket客户端数',
+             'samples': [('live_recorder_status_subscribers', {}, len(self.subscribers))]},
+        ]
+
+
+# 全局事件总线
+bus = EventBus()
+metrics.gauges.append(bus.metric_families)
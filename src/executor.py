@@ -0,0 +1,80 @@
+"""录制线程池"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class CapacityExhausted(Exception):
+    """录制线程已全部占用"""
+
+
+class RecordingCapacity:
+    """
+    录制容量管理
+
+    录制使用独立的线程池，大小由全局配置 max_recordings 决定，名额用完时立即拒绝新的录制，
+    不会在默认线程池中排队而错过开播。ffmpeg 等后处理任务由后处理队列（postprocess.py）执行，
+    不占用录制名额。
+    """
+
+    DEFAULT_RECORDINGS = 64
+
+    def __init__(self):
+        self.max_recordings = self.DEFAULT_RECORDINGS
+        self.record_pool: Optional[ThreadPoolExecutor] = None
+        self.active = 0  # 正在录制的线程数
+        self.rejected = 0  # 因容量不足被拒绝的录制数
+        self._lock = threading.Lock()
+
+    def configure(self, config: dict):
+        """按全局配置设置线程池大小，大小变化时新任务使用新的线程池，已有任务不受影响"""
+        max_recordings = config.get('max_recordings') or self.DEFAULT_RECORDINGS
+        if max_recordings != self.max_recordings and self.record_pool:
+            self.record_pool.shutdown(wait=False)
+            self.record_pool = None
+        self.max_recordings = max_recordings
+
+    def _get_record_pool(self) -> ThreadPoolExecutor:
+        if self.record_pool is None:
+            self.record_pool = ThreadPoolExecutor(self.max_recordings, thread_name_prefix='record')
+        return self.record_pool
+
+    async def run_record(self, func: Callable, *args):
+        """
+        在录制线程池中执行录制并等待结束
+
+        Raises:
+            CapacityExhausted: 录制名额已用完
+        """
+        with self._lock:
+            if self.active >= self.max_recordings:
+                self.rejected += 1
+                raise CapacityExhausted(f'录制容量已满：{self.active}/{self.max_recordings}')
+            self.active += 1
+        try:
+            future = self._get_record_pool().submit(func, *args)
+        except BaseException:
+            self._release()
+            raise
+        # 录制线程结束时（或任务在开始前被取消时）才释放名额：等待的协程被取消时录制线程仍在运行
+        future.add_done_callback(lambda _: self._release())
+        await asyncio.wrap_future(future)
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+    def stats(self) -> dict:
+        """容量统计"""
+        return {
+            'max_recordings': self.max_recordings,
+            'active_recordings': self.active,
+            'free_slots': max(self.max_recordings - self.active, 0),
+            'rejected': self.rejected
+        }
+
+
+# 全局录制容量
+capacity = RecordingCapacity()
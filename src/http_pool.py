@@ -0,0 +1,164 @@
+"""共享HTTP客户端池"""
+
+import asyncio
+import time
+from collections import deque
+from http.cookiejar import CookieJar
+from typing import Deque, Dict, Optional, Tuple
+
+import anyio
+import httpx
+from httpx_socks import AsyncProxyTransport
+from loguru import logger
+
+# 客户端键：(代理, 是否验证SSL, 是否启用HTTP/2)
+ClientKey = Tuple[Optional[str], bool, bool]
+
+
+class _NoCookieJar(CookieJar):
+    """拒绝保存任何cookie的CookieJar"""
+
+    def set_cookie(self, cookie):
+        pass
+
+    def extract_cookies(self, response, request):
+        pass
+
+
+class HttpClientPool:
+    """
+    所有录制器共享的HTTP客户端池
+
+    按 (代理, SSL验证, HTTP版本) 复用 httpx.AsyncClient，请求头和cookies由调用方逐个请求传入。
+    连接断开时在池内重试，连续失败时替换底层客户端，调用方无需重建客户端。
+    """
+
+    # 请求出现以下错误时在新连接上重试一次
+    RETRY_ERRORS = (httpx.ProtocolError, httpx.NetworkError, anyio.EndOfStream)
+    # 同一客户端连续失败次数达到该值时替换客户端
+    MAX_FAILURES = 3
+
+    def __init__(self):
+        self.clients: Dict[ClientKey, httpx.AsyncClient] = {}
+        self.failures: Dict[ClientKey, int] = {}
+        self.requests = 0  # 请求总数
+        self.connects = 0  # 新建TCP连接数
+        self.handshakes: Deque[float] = deque()  # 最近一分钟的TLS握手时间
+        self.replaced = 0  # 被替换的客户端数
+
+    def get_client(self, proxy: Optional[str] = None, verify: bool = True, http2: bool = True) -> httpx.AsyncClient:
+        """获取或创建指定参数的共享客户端"""
+        key = (proxy, verify, http2)
+        if key not in self.clients:
+            self.clients[key] = self._create_client(*key)
+        return self.clients[key]
+
+    @staticmethod
+    def _create_client(proxy: Optional[str], verify: bool, http2: bool) -> httpx.AsyncClient:
+        """创建HTTP客户端"""
+        limits = httpx.Limits(max_keepalive_connections=100, keepalive_expiry=60)
+        client_kwargs = {
+            'http2': http2,
+            'verify': verify,
+            'limits': limits,
+            # 共享客户端不保存cookies，避免不同录制器之间互相影响
+            'cookies': httpx.Cookies(_NoCookieJar())
+        }
+        # 检查是否有设置代理
+        if proxy:
+            if 'socks' in proxy:
+                client_kwargs['transport'] = AsyncProxyTransport.from_url(
+                    proxy, verify=verify, http2=http2, limits=limits)
+            else:
+                client_kwargs['proxy'] = proxy
+        return httpx.AsyncClient(**client_kwargs)
+
+    async def request(self, method: str, url: str, proxy: Optional[str] = None, verify: bool = True,
+                      http2: bool = True, **kwargs) -> httpx.Response:
+        """
+        通过共享客户端发送请求
+
+        Args:
+            method: 请求方法
+            url: 请求URL
+            proxy: 代理地址
+            verify: 是否验证SSL
+            http2: 是否启用HTTP/2
+            **kwargs: 传给 httpx.AsyncClient.request 的参数，包括headers、timeout等
+
+        Returns:
+            响应对象
+        """
+        key = (proxy, verify, http2)
+        kwargs.setdefault('extensions', {})['trace'] = self._trace
+        for attempt in range(2):
+            client = self.get_client(*key)
+            self.requests += 1
+            try:
+                response = await client.request(method, url, **kwargs)
+            except self.RETRY_ERRORS:
+                self._on_failure(key, client)
+                if attempt:
+                    raise
+                continue
+            self.failures[key] = 0
+            return response
+
+    def stream(self, method: str, url: str, proxy: Optional[str] = None, verify: bool = True,
+               http2: bool = True, **kwargs):
+        """
+        通过共享客户端发送流式请求，用于下载直播流
+
+        Returns:
+            httpx 的异步上下文管理器，进入后得到响应对象
+        """
+        kwargs.setdefault('extensions', {})['trace'] = self._trace
+        self.requests += 1
+        return self.get_client(proxy, verify, http2).stream(method, url, **kwargs)
+
+    def _on_failure(self, key: ClientKey, client: httpx.AsyncClient):
+        """记录连接失败，连续失败过多时替换客户端"""
+        self.failures[key] = self.failures.get(key, 0) + 1
+        if self.failures[key] >= self.MAX_FAILURES and self.clients.get(key) is client:
+            logger.warning(f'HTTP客户端连续{self.failures[key]}次连接失败，重新创建：{key[0] or "直连"}')
+            self.clients[key] = self._create_client(*key)
+            self.failures[key] = 0
+            self.replaced += 1
+            asyncio.ensure_future(client.aclose())
+
+    async def _trace(self, event: str, info: dict):
+        """httpcore 连接事件回调，统计新建连接和TLS握手"""
+        if event == 'connection.connect_tcp.complete':
+            self.connects += 1
+        elif event == 'connection.start_tls.complete':
+            self.handshakes.append(time.monotonic())
+
+    def stats(self) -> dict:
+        """连接池统计"""
+        deadline = time.monotonic() - 60
+        while self.handshakes and self.handshakes[0] < deadline:
+            self.handshakes.popleft()
+        open_connections = 0
+        for client in self.clients.values():
+            for transport in (client._transport, *client._mounts.values()):
+                pool = getattr(transport, '_pool', None)
+                open_connections += len(getattr(pool, 'connections', ()))
+        return {
+            'clients': len(self.clients),
+            'open_connections': open_connections,
+            'requests': self.requests,
+            'connects': self.connects,
+            'reuse_ratio': round(1 - self.connects / self.requests, 4) if self.requests else 0,
+            'handshakes_per_minute': len(self.handshakes),
+            'replaced_clients': self.replaced
+        }
+
+    async def close(self):
+        """关闭所有客户端"""
+        clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+# 全局共享的客户端池
+http_pool = HttpClientPool()
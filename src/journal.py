@@ -0,0 +1,236 @@
+"""录制日志（崩溃恢复）"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional, Set
+
+from loguru import logger
+
+from .catalog import catalog
+from .postprocess import _pid_alive, postprocess
+from .utils.repair import repair_file
+
+
+class FlvTracker:
+    """跟踪FLV标签边界，只解析标签头，不缓存数据"""
+
+    def __init__(self):
+        self.offset = 0  # 已写入的字节数
+        self.boundary = 0  # 最后一个完整标签的结束位置
+        self.next: Optional[int] = None  # 下一个标签的开始位置，None表示尚未读完文件头
+        self.head = bytearray()
+        self.lost = False
+
+    def feed(self, data: bytes):
+        end = self.offset + len(data)
+        while not self.lost:
+            header_size = 9 if self.next is None else 11
+            # 下一个需要的头部字节在本块中的位置
+            i = (self.next or 0) + len(self.head) - self.offset
+            if i >= len(data):
+                break
+            self.head += data[i:i + header_size - len(self.head)]
+            if len(self.head) < header_size:
+                break
+            if self.next is None:
+                start = int.from_bytes(self.head[5:9], 'big') + 4
+            elif self.head[0] & 0x1f not in (8, 9, 18):
+                # 不是FLV标签，不再跟踪
+                self.lost = True
+                break
+            else:
+                start = self.next + 15 + int.from_bytes(self.head[1:4], 'big')
+            if self.next is not None and self.next <= end:
+                self.boundary = self.next
+            self.head.clear()
+            self.next = start
+        if self.next is not None and self.next <= end:
+            self.boundary = self.next
+        self.offset = end
+
+
+class TsTracker:
+    """TS包边界"""
+
+    def __init__(self):
+        self.offset = 0
+        self.boundary = 0
+
+    def feed(self, data: bytes):
+        self.offset += len(data)
+        self.boundary = self.offset - self.offset % 188
+
+
+TRACKERS = {'flv': FlvTracker, 'ts': TsTracker}
+
+
+class JournaledOutput:
+    """包装录制输出，打开时登记到录制日志，写入时定期记录已写入的字节数和完整边界，正常关闭时删除记录"""
+
+    def __init__(self, output, path: Path, format: str, postprocess_job: Optional[dict] = None):
+        self.output = output
+        self.path = path
+        self.format = format
+        self.postprocess_job = postprocess_job
+        tracker = TRACKERS.get(format)
+        self.tracker = tracker() if tracker else None
+        self.checkpoints = deque(maxlen=RecordingJournal.CHECKPOINTS)
+        self.last_checkpoint = 0.0
+
+    @property
+    def opened(self) -> bool:
+        return self.output.opened
+
+    def open(self):
+        self.output.open()
+        journal.begin(self.path, self.format, self.postprocess_job)
+        self.last_checkpoint = time.monotonic()
+
+    def write(self, data: bytes):
+        self.output.write(data)
+        if self.tracker:
+            self.tracker.feed(data)
+            now = time.monotonic()
+            if now - self.last_checkpoint >= RecordingJournal.CHECKPOINT_INTERVAL:
+                self.last_checkpoint = now
+                self.checkpoints.append(self.tracker.boundary)
+                journal.checkpoint(self.path, self.tracker.offset, list(self.checkpoints))
+
+    def close(self):
+        try:
+            self.output.close()
+        finally:
+            journal.end(self.path)
+
+
+class RecordingJournal:
+    """
+    录制日志
+
+    记录正在写入的录制文件、已写入的字节数和最近的完整边界（FLV标签、TS包），以及录制正常结束后应提交的后处理任务。
+    进程被强制结束时 output.close() 不会执行，文件末尾可能是不完整的标签，且不会提交后处理；
+    下次启动时对录制进程已退出的文件：从最后一个不超过文件大小的检查点开始检查并截断到最后一个完整的边界，
+    原地修正FLV文件头和 onMetaData，再补交后处理任务。
+    写入数据可能还在缓冲区中（如 buffered 写入方式），因此保留最近的多个检查点。
+    """
+
+    CHECKPOINT_INTERVAL = 5  # 记录检查点的间隔（秒）
+    CHECKPOINTS = 16  # 保留的检查点数
+
+    def __init__(self, db_file: str = 'data/journal.db'):
+        self.db_file = Path(db_file)
+        self.open_files: Set[str] = set()  # 本进程正在写入的文件
+        self.recovered = False
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库，需持有锁"""
+        if self._db is None:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute('PRAGMA journal_mode=WAL')
+            # 检查点写入频繁，只需在进程崩溃时不丢失
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS open_files (
+                    path TEXT PRIMARY KEY,
+                    format TEXT NOT NULL,
+                    pid INTEGER NOT NULL,
+                    opened REAL NOT NULL,
+                    updated REAL,
+                    offset INTEGER NOT NULL DEFAULT 0,
+                    checkpoints TEXT NOT NULL DEFAULT '[]',
+                    postprocess TEXT
+                )''')
+        return self._db
+
+    def track(self, output, path: Path, format: str, postprocess_job: Optional[dict] = None) -> JournaledOutput:
+        """
+        包装录制输出
+
+        Args:
+            output: 录制输出
+            path: 文件路径
+            format: 文件格式
+            postprocess_job: 录制正常结束后应提交的后处理任务 {'kind', 'args', 'flag', 'priority'}，可选
+        """
+        return JournaledOutput(output, path, format, postprocess_job)
+
+    def begin(self, path: Path, format: str, postprocess_job: Optional[dict]):
+        path = os.path.abspath(path)
+        self.open_files.add(path)
+        with self._lock:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO open_files (path, format, pid, opened, postprocess) VALUES (?, ?, ?, ?, ?)',
+                (path, format, os.getpid(), time.time(),
+                 json.dumps(postprocess_job, ensure_ascii=False) if postprocess_job else None))
+
+    def checkpoint(self, path: Path, offset: int, checkpoints: list):
+        with self._lock:
+            self._connect().execute('UPDATE open_files SET offset = ?, checkpoints = ?, updated = ? WHERE path = ?',
+                                    (offset, json.dumps(checkpoints), time.time(), os.path.abspath(path)))
+
+    def end(self, path: Path):
+        path = os.path.abspath(path)
+        with self._lock:
+            self._connect().execute('DELETE FROM open_files WHERE path = ?', (path,))
+        self.open_files.discard(path)
+
+    def recover(self):
+        """在后台线程中修复录制进程已退出时未关闭的文件，每个进程只执行一次"""
+        if self.recovered:
+            return
+        self.recovered = True
+        threading.Thread(target=self._recover, name='journal', daemon=True).start()
+
+    def _recover(self):
+        try:
+            with self._lock:
+                db = self._connect()
+                rows = db.execute('SELECT * FROM open_files').fetchall()
+                claimed = []
+                for row in rows:
+                    if row['path'] in self.open_files or _pid_alive(row['pid']):
+                        continue
+                    # 多进程模式下各工作进程同时恢复，删除成功的进程负责修复
+                    if db.execute('DELETE FROM open_files WHERE path = ? AND pid = ?',
+                                  (row['path'], row['pid'])).rowcount:
+                        claimed.append(row)
+            for row in claimed:
+                self._repair(row)
+        except Exception as error:
+            logger.exception(f'录制日志恢复失败：{error}')
+
+    def _repair(self, row: sqlite3.Row):
+        """修复一个意外中断的录制文件并补交后处理任务"""
+        path = Path(row['path'])
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            logger.warning(f'意外中断的录制文件已不存在：{path}')
+            return
+        start = max((c for c in json.loads(row['checkpoints']) if c <= size), default=0)
+        try:
+            result = repair_file(path, row['format'], start)
+        except OSError as error:
+            logger.error(f'修复意外中断的录制文件失败：{path}\n{error}')
+            return
+        if result is None:
+            logger.warning(f'意外中断的录制文件格式不支持修复（{row["format"]}）：{path}')
+        else:
+            logger.info(f'已修复意外中断的录制文件：{path.name}，截掉 {result["truncated"]} 字节')
+        catalog.update(path)
+        job = json.loads(row['postprocess']) if row['postprocess'] else None
+        if job and path.stat().st_size:
+            postprocess.submit(**job)
+
+
+# 全局录制日志
+journal = RecordingJournal()
@@ -0,0 +1,296 @@
+"""运行指标（Prometheus文本格式）"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from .executor import capacity
+
+# 指标族：{'name', 'type', 'help', 'samples': [(样本名, {标签: 值}, 数值)]}
+Family = dict
+
+
+class Counter:
+    """计数器，按标签值分别计数"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def collect(self) -> Family:
+        with self._lock:
+            items = list(self.values.items())
+        samples = [(self.name, dict(zip(self.labelnames, labels)), value) for labels, value in items]
+        return {'name': self.name, 'type': 'counter', 'help': self.help, 'samples': samples}
+
+
+class Histogram:
+    """直方图，按标签值分别统计各区间的数量"""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[tuple, list] = {}  # {标签值: [各区间数量, 总和, 总数]}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self.values.get(labels)
+            if item is None:
+                item = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            item[0][index] += 1
+            item[1] += value
+            item[2] += 1
+
+    def collect(self) -> Family:
+        samples = []
+        # 复制后在锁外生成样本，各区间数量、总和与总数来自同一时刻
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self.values.items()]
+        for labels, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((f'{self.name}_bucket', {**labels, 'le': le}, cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, count))
+        return {'name': self.name, 'type': 'histogram', 'help': self.help, 'samples': samples}
+
+
+class RecordingMeter:
+    """
+    单个录制的写入统计
+
+    每个录制只有一个写入线程（streamlink的写入线程或事件循环），计数不需要加锁。
+    实现了 streamlink_cli 输出的 open/write/close 接口，可作为 FileOutput 的 record 参数接收写入的数据。
+    写入时只更新计数，每秒最多记录一次 (时间, 字节数) 采样，码率在读取时由最近 WINDOW 秒的采样计算。
+    """
+
+    STALL_SECONDS = 5  # 两次写入间隔超过该时间视为读取停顿
+    WINDOW = 10  # 滚动码率的时间窗口（秒）
+
+    def __init__(self, platform: str, user_id: str):
+        self.platform = platform
+        self.user_id = user_id
+        self.started = time.monotonic()  # 检测到开播的时间
+        self.bytes = 0
+        self.stalls = 0
+        self.segments = 0
+        self.segment_failures = 0
+        self.files = 0  # 录制文件数（分段录制时每个分段一个文件）
+        self.path: Optional[str] = None  # 当前录制文件
+        self.first_write: Optional[float] = None
+        self.last_write: Optional[float] = None
+        self._samples: Deque[Tuple[float, int]] = deque(maxlen=self.WINDOW + 1)  # 每秒一次的 (时间, 写入前字节数)
+        self._next_sample = 0.0
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, data: bytes):
+        now = time.monotonic()
+        if self.last_write is None:
+            self.first_write = now
+            metrics.first_byte_seconds.observe(now - self.started, self.platform)
+        elif now - self.last_write > self.STALL_SECONDS:
+            self.stalls += 1
+        if now >= self._next_sample:
+            self._samples.append((now, self.bytes))
+            self._next_sample = now + 1
+        self.last_write = now
+        self.bytes += len(data)
+
+    def segment(self, ok: bool):
+        """记录一个HLS分片的下载结果"""
+        if ok:
+            self.segments += 1
+        else:
+            self.segment_failures += 1
+
+    def add_file(self, path):
+        """开始写入新的录制文件"""
+        self.path = str(path)
+        self.files += 1
+
+    def throughput(self) -> float:
+        """最近 WINDOW 秒的写入速度（字节/秒），停止写入后逐渐降为0"""
+        samples = list(self._samples)
+        if not samples:
+            return 0.0
+        now = time.monotonic()
+        # 窗口内最早的采样，没有时（超过 WINDOW 秒未写入）使用最后一个采样
+        sample_time, sample_bytes = next(
+            (sample for sample in samples if sample[0] >= now - self.WINDOW), samples[-1])
+        return (self.bytes - sample_bytes) / max(now - sample_time, 1)
+
+    def stats(self) -> dict:
+        """当前统计，用于录制状态接口"""
+        now = time.monotonic()
+        return {
+            'path': self.path,
+            'files': self.files,
+            'bytes': self.bytes,
+            'bitrate': round(self.throughput() * 8),
+            'duration': round(now - self.first_write, 1) if self.first_write is not None else 0,
+            'idle_seconds': round(now - self.last_write, 1) if self.last_write is not None else None,
+            'first_byte_seconds': round(self.first_write - self.started, 2) if self.first_write is not None else None,
+            'stalls': self.stalls,
+            'segments': self.segments,
+            'segment_failures': self.segment_failures,
+        }
+
+
+class Metrics:
+    """
+    录制器运行指标
+
+    计数器和直方图会在录制线程、后处理线程和事件循环中更新，各自持有锁；
+    写入统计（RecordingMeter）只有一个写入线程，不加锁；录制相关的累计值在结束录制时合并，
+    执行器队列等状态在采集时读取，采集结果由 /metrics 以Prometheus文本格式输出。
+    """
+
+    def __init__(self):
+        self.poll_seconds = Histogram(
+            'live_recorder_poll_request_seconds', '直播状态检测请求耗时',
+            (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), ('platform',))
+        self.errors = Counter(
+            'live_recorder_errors_total', '错误次数（按阶段和错误类型）', ('platform', 'stage', 'error'))
+        self.first_byte_seconds = Histogram(
+            'live_recorder_first_byte_seconds', '检测到开播到写入第一个字节的耗时',
+            (0.5, 1, 2, 5, 10, 20, 30, 60), ('platform',))
+        self.ffmpeg_seconds = Histogram(
+            'live_recorder_ffmpeg_seconds', 'ffmpeg封装耗时',
+            (1, 5, 10, 30, 60, 120, 300, 600, 1800), ('format',))
+        self.recordings_total = Counter(
+            'live_recorder_recordings_total', '已结束的录制数', ('platform',))
+        # 已结束录制的累计值，采集时加上正在进行的录制
+        self.finished = {
+            'bytes': Counter('live_recorder_written_bytes_total', '写入的字节数', ('platform',)),
+            'stalls': Counter('live_recorder_read_stalls_total', '读取停顿次数', ('platform',)),
+            'segments': Counter('live_recorder_segments_total', '下载的HLS分片数（异步引擎）', ('platform',)),
+            'segment_failures': Counter(
+                'live_recorder_segment_failures_total', '下载失败的HLS分片数（异步引擎）', ('platform',)),
+        }
+        self.recordings: Dict[str, RecordingMeter] = {}  # {直播URL: 写入统计}
+        self.gauges: List[Callable[[], Family]] = [self._recording_gauges, self._capacity_gauges]
+
+    def begin_recording(self, url: str, platform: str, user_id: str) -> RecordingMeter:
+        """开始统计一个录制"""
+        meter = self.recordings[url] = RecordingMeter(platform, user_id)
+        return meter
+
+    def end_recording(self, url: str):
+        """结束统计，累计值合并到平台计数"""
+        meter = self.recordings.pop(url, None)
+        if meter:
+            self.recordings_total.inc(meter.platform)
+            for field, counter in self.finished.items():
+                counter.inc(meter.platform, amount=getattr(meter, field))
+
+    def collect(self) -> List[Family]:
+        """采集全部指标，其他模块可向 gauges 注册采集时读取的状态"""
+        families = [self.poll_seconds.collect(), self.errors.collect(), self.first_byte_seconds.collect(),
+                    self.ffmpeg_seconds.collect(), self.recordings_total.collect()]
+        meters = list(self.recordings.values())
+        for field, counter in self.finished.items():
+            family = counter.collect()
+            totals = {sample[1]['platform']: sample[2] for sample in family['samples']}
+            for meter in meters:
+                totals[meter.platform] = totals.get(meter.platform, 0) + getattr(meter, field)
+            family['samples'] = [(family['name'], {'platform': platform}, value)
+                                 for platform, value in totals.items()]
+            families.append(family)
+        for gauge in self.gauges:
+            families.extend(gauge())
+        return families
+
+    def _recording_gauges(self) -> List[Family]:
+        """正在进行的录制"""
+        written, throughput, stalls, idle = [], [], [], []
+        now = time.monotonic()
+        for url, meter in list(self.recordings.items()):
+            # 同一主播可能同时录制多个直播（如YouTube），以直播URL区分
+            labels = {'platform': meter.platform, 'user_id': meter.user_id, 'url': url}
+            written.append(('live_recorder_recording_bytes', labels, meter.bytes))
+            throughput.append(('live_recorder_recording_throughput_bytes', labels, meter.throughput()))
+            stalls.append(('live_recorder_recording_stalls', labels, meter.stalls))
+            if meter.last_write is not None:
+                idle.append(('live_recorder_recording_idle_seconds', labels, round(now - meter.last_write, 3)))
+        return [
+            {'name': 'live_recorder_recording_bytes', 'type': 'gauge',
+             'help': '正在进行的录制已写入的字节数', 'samples': written},
+            {'name': 'live_recorder_recording_throughput_bytes', 'type': 'gauge',
+             'help': f'正在进行的录制最近 {RecordingMeter.WINDOW} 秒的写入速度（字节/秒）', 'samples': throughput},
+            {'name': 'live_recorder_recording_stalls', 'type': 'gauge',
+             'help': '正在进行的录制的读取停顿次数', 'samples': stalls},
+            {'name': 'live_recorder_recording_idle_seconds', 'type': 'gauge',
+             'help': '正在进行的录制距上次写入的时间（秒）', 'samples': idle},
+        ]
+
+    @staticmethod
+    def _capacity_gauges() -> List[Family]:
+        """录制线程池"""
+        stats = capacity.stats()
+        names = {
+            'active_recordings': '占用的录制线程数',
+            'max_recordings': '录制线程上限',
+        }
+        families = [{'name': f'live_recorder_executor_{name}', 'type': 'gauge', 'help': help,
+                     'samples': [(f'live_recorder_executor_{name}', {}, stats[name])]}
+                    for name, help in names.items()]
+        families.append({'name': 'live_recorder_executor_rejected_total', 'type': 'counter',
+                         'help': '因录制容量不足被拒绝的录制数',
+                         'samples': [('live_recorder_executor_rejected_total', {}, stats['rejected'])]})
+        return families
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(families: List[Family], extra: List[Tuple[dict, List[Family]]] = ()) -> str:
+    """
+    输出Prometheus文本格式，同名指标族合并输出
+
+    Args:
+        families: 指标族列表
+        extra: 附加标签的指标族，如多进程模式下各工作进程的指标 [({'worker': '0'}, 指标族列表)]
+    """
+    merged: Dict[str, Family] = {}
+    for labels, items in [({}, families), *extra]:
+        for family in items:
+            target = merged.setdefault(family['name'], {**family, 'samples': []})
+            target['samples'].extend((name, {**sample_labels, **labels}, value)
+                                     for name, sample_labels, value in family['samples'])
+    lines = []
+    for family in merged.values():
+        lines.append(f'# HELP {family["name"]} {family["help"]}')
+        lines.append(f'# TYPE {family["name"]} {family["type"]}')
+        for name, labels, value in family['samples']:
+            if labels:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}')
+            else:
+                lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# 全局运行指标
+metrics = Metrics()
@@ -1,6 +1,5 @@
 """Afreeca直播录制"""
 
-import asyncio
 from ..recorder import LiveRecorder
 
 
@@ -18,5 +17,5 @@ class Afreeca(LiveRecorder):
             )).json()
             if response['CHANNEL']['RESULT'] != 0:
                 title = response['CHANNEL']['TITLE']
-                stream = self.get_streamlink().streams(url).get('best')  # HLSStream[mpegts]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                stream = self.select_stream(self.get_streamlink().streams(url))  # HLSStream[mpegts]
+                await self.record(stream, url, title, 'ts')
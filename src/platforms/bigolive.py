@@ -1,6 +1,5 @@
 """Bigolive直播录制"""
 
-import asyncio
 from streamlink.stream import HLSStream
 from ..recorder import LiveRecorder
 
@@ -23,4 +22,4 @@ class Bigolive(LiveRecorder):
                     session=self.get_streamlink(),
                     url=response['data']['hls_src']
                 )  # HLSStream[mpegts]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                await self.record(stream, url, title, 'ts')
@@ -1,22 +1,43 @@
 """哔哩哔哩直播录制"""
 
-import asyncio
 from ..recorder import LiveRecorder
 
 
 class Bilibili(LiveRecorder):
     """哔哩哔哩直播录制器"""
     
+    batch_size = 50
+    
     async def run(self):
         """检测并录制B站直播"""
         url = f'https://live.bilibili.com/{self.id}'
         if url not in self.recording:
-            response = (await self.request(
-                method='GET',
-                url='https://api.live.bilibili.com/room/v1/Room/get_info',
-                params={'room_id': self.id}
-            )).json()
-            if response['data']['live_status'] == 1:
-                title = response['data']['title']
-                stream = self.get_streamlink().streams(url).get('best')  # HTTPStream[flv]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'flv')
+            data = await self.poll_status()
+            if data['live_status'] == 1:
+                title = data['title']
+                stream = self.select_stream(self.get_streamlink().streams(url))  # HTTPStream[flv]
+                await self.record(stream, url, title, 'flv')
+    
+    async def fetch_status(self):
+        """获取单个直播间信息"""
+        response = (await self.request(
+            method='GET',
+            url='https://api.live.bilibili.com/room/v1/Room/get_info',
+            params={'room_id': self.id}
+        )).json()
+        return response['data']
+    
+    @classmethod
+    async def fetch_batch_status(cls, recorder, ids):
+        """批量获取直播间信息，短号和长号均可查询"""
+        response = (await recorder.request(
+            method='GET',
+            url='https://api.live.bilibili.com/xlive/web-room/v1/index/getRoomBaseInfo',
+            params={'room_ids': ids, 'req_biz': 'web_room_componet'}
+        )).json()
+        result = {}
+        for data in (response['data'].get('by_room_ids') or {}).values():
+            result[str(data['room_id'])] = data
+            if data.get('short_id'):
+                result[str(data['short_id'])] = data
+        return result
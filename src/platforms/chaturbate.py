@@ -1,6 +1,5 @@
 """Chaturbate直播录制"""
 
-import asyncio
 from streamlink.stream import HLSStream
 from ..recorder import LiveRecorder
 
@@ -29,4 +28,4 @@ class Chaturbate(LiveRecorder):
                     url=response['url']
                 )
                 stream = list(streams.values())[2]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                await self.record(stream, url, title, 'ts')
@@ -1,6 +1,5 @@
 """抖音直播录制"""
 
-import asyncio
 import json
 from streamlink.stream import HTTPStream
 from ..recorder import LiveRecorder
@@ -13,8 +12,8 @@ class Douyin(LiveRecorder):
         """检测并录制抖音直播"""
         url = f'https://live.douyin.com/{self.id}'
         if url not in self.recording:
-            if not self.client.cookies:
-                await self.client.get(url='https://live.douyin.com/')  # 获取ttwid
+            if not self.session_cookies:
+                await self.request(method='GET', url='https://live.douyin.com/')  # 获取ttwid
             response = (await self.request(
                 method='GET',
                 url='https://live.douyin.com/webcast/room/web/enter/',
@@ -42,4 +41,4 @@ class Douyin(LiveRecorder):
                         self.get_streamlink(),
                         live_url
                     )  # HTTPStream[flv]
-                    await asyncio.to_thread(self.run_record, stream, url, title, 'flv')
+                    await self.record(stream, url, title, 'flv')
@@ -1,8 +1,11 @@
 """斗鱼直播录制"""
 
-import asyncio
+import hashlib
 import time
 import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
 from urllib.parse import parse_qs
 
 import jsengine
@@ -10,11 +13,16 @@ from loguru import logger
 from streamlink.stream import HTTPStream
 
 from ..recorder import LiveRecorder
+from ..scheduler import scheduler
 
 
 class Douyu(LiveRecorder):
     """斗鱼直播录制器"""
     
+    CACHE_DIR = Path('data/cache')
+    _crypto_js: Dict[str, str] = {}  # {crypto-js URL: 内容}
+    _engines: Dict[str, jsengine.JSEngine] = {}  # {房间ID: 已加载加密JS的引擎}
+    
     async def run(self):
         """检测并录制斗鱼直播"""
         url = f'https://www.douyu.com/{self.id}'
@@ -27,6 +35,12 @@ class Douyu(LiveRecorder):
             self.mState = state
             logger.info(
                 f'直播状态[1已开播，2未开播]：{state} 上一次开播时间：{response["data"]["start_time"]}')
+            if start_time := response['data'].get('start_time'):
+                # 开播时间只用于调整检测间隔，格式无法识别时忽略，不影响检测和录制
+                try:
+                    scheduler.observe_start(self.key, datetime.strptime(start_time, '%Y-%m-%d %H:%M').timestamp())
+                except ValueError:
+                    logger.debug(f'{self.flag}无法识别开播时间：{start_time!r}')
             if state == '1':
                 liveUrl = await self.get_live()
                 if liveUrl != '':
@@ -35,26 +49,67 @@ class Douyu(LiveRecorder):
                         self.get_streamlink(),
                         liveUrl
                     )  # HTTPStream[flv]
-                    await asyncio.to_thread(self.run_record, stream, url, title, 'flv')
+                    await self.record(stream, url, title, 'flv')
             else:
                 self.ssl = True
+                # 未开播时预先加载加密JS，开播后可直接签名
+                if self.id not in self._engines:
+                    try:
+                        await self.get_js()
+                    except Exception as error:
+                        logger.warning(f'{self.flag}预加载加密JS失败：{repr(error)}')
     
-    async def get_js(self):
-        """获取斗鱼加密JS"""
-        response = (await self.request(
-            method='POST',
-            url=f'https://www.douyu.com/swf_api/homeH5Enc?rids={self.id}'
-        )).json()
-        js_enc = response['data'][f'room{self.id}']
-        getUrl = self.crypto_js_url
-        crypto_js = (await self.request(
-            method='GET',
-            url=getUrl
-        )).text
-        return jsengine.JSEngine(js_enc + crypto_js)
+    async def get_js(self) -> jsengine.JSEngine:
+        """获取斗鱼加密JS引擎，同一房间复用已加载的引擎"""
+        if self.id not in self._engines:
+            response = (await self.request(
+                method='POST',
+                url=f'https://www.douyu.com/swf_api/homeH5Enc?rids={self.id}'
+            )).json()
+            js_enc = response['data'][f'room{self.id}']
+            crypto_js = await self.get_crypto_js()
+            self._engines[self.id] = jsengine.JSEngine(js_enc + crypto_js)
+        return self._engines[self.id]
+    
+    async def get_crypto_js(self) -> str:
+        """
+        获取crypto-js，缓存在内存和磁盘中
+        
+        每个进程首次使用时带ETag请求一次，未变化（304）或请求失败时使用磁盘缓存
+        """
+        url = self.crypto_js_url
+        if url not in self._crypto_js:
+            path = self.CACHE_DIR / f'crypto-js-{hashlib.md5(url.encode()).hexdigest()}.js'
+            etag_path = path.with_suffix('.etag')
+            headers = {}
+            if path.exists() and etag_path.exists():
+                headers['If-None-Match'] = etag_path.read_text(encoding='utf-8')
+            try:
+                response = await self.request(method='GET', url=url, headers=headers)
+            except ConnectionError:
+                if not path.exists():
+                    raise
+                logger.warning(f'{self.flag}crypto-js下载失败，使用磁盘缓存')
+                response = None
+            if response is None or response.status_code == 304:
+                self._crypto_js[url] = path.read_text(encoding='utf-8')
+            else:
+                response.raise_for_status()
+                self._crypto_js[url] = response.text
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(response.text, encoding='utf-8')
+                if etag := response.headers.get('ETag'):
+                    etag_path.write_text(etag, encoding='utf-8')
+        return self._crypto_js[url]
     
-    async def get_live(self):
-        """获取斗鱼直播流地址"""
+    async def get_live(self, retry: bool = True):
+        """
+        获取斗鱼直播流地址
+        
+        Args:
+            retry: 使用缓存的加密JS获取失败时，是否重新下载加密JS后重试一次
+        """
+        cached = self.id in self._engines
         did = uuid.uuid4().hex
         tt = str(int(time.time()))
         params = {
@@ -73,5 +128,9 @@ class Douyu(LiveRecorder):
         )).json()
         if response['data'] == '' and response['msg'] != '':
             logger.info(f'直播状态：{response["error"]} {response["msg"]}')
+            # 加密JS可能已更新导致签名失效
+            if cached and retry:
+                self._engines.pop(self.id, None)
+                return await self.get_live(retry=False)
             return ''
         return f"{response['data']['rtmp_url']}/{response['data']['rtmp_live']}"
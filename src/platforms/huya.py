@@ -1,6 +1,5 @@
 """虎牙直播录制"""
 
-import asyncio
 import re
 from ..recorder import LiveRecorder
 
@@ -18,5 +17,5 @@ class Huya(LiveRecorder):
             )).text
             if '"isOn":true' in response:
                 title = re.search('"introduction":"(.*?)"', response).group(1)
-                stream = self.get_streamlink().streams(url).get('best')  # HTTPStream[flv]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'flv')
+                stream = self.select_stream(self.get_streamlink().streams(url))  # HTTPStream[flv]
+                await self.record(stream, url, title, 'flv')
@@ -1,6 +1,5 @@
 """NicoNico直播录制"""
 
-import asyncio
 import json
 import re
 from ..recorder import LiveRecorder
@@ -21,5 +20,5 @@ class Niconico(LiveRecorder):
                 title = json.loads(
                     re.search(r'<script type="application/ld\+json">(.*?)</script>', response).group(1)
                 )['name']
-                stream = self.get_streamlink().streams(url).get('best')  # HLSStream[mpegts]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                stream = self.select_stream(self.get_streamlink().streams(url))  # HLSStream[mpegts]
+                await self.record(stream, url, title, 'ts')
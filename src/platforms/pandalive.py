@@ -1,6 +1,5 @@
 """Pandalive直播录制"""
 
-import asyncio
 from ..recorder import LiveRecorder
 
 
@@ -24,5 +23,5 @@ class Pandalive(LiveRecorder):
             )).json()
             if response['result']:
                 title = response['media']['title']
-                stream = self.get_streamlink().streams(url).get('best')  # HLSStream[mpegts]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                stream = self.select_stream(self.get_streamlink().streams(url))  # HLSStream[mpegts]
+                await self.record(stream, url, title, 'ts')
@@ -1,6 +1,5 @@
 """Pixiv Sketch直播录制"""
 
-import asyncio
 import json
 import re
 from streamlink.stream import HLSStream
@@ -28,4 +27,4 @@ class Pixivsketch(LiveRecorder):
                     url=live['owner']['hls_movie']
                 )
                 stream = list(streams.values())[0]  # HLSStream[mpegts]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                await self.record(stream, url, title, 'ts')
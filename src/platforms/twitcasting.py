@@ -1,6 +1,5 @@
 """Twitcasting直播录制"""
 
-import asyncio
 import re
 from ..recorder import LiveRecorder
 
@@ -26,5 +25,5 @@ class Twitcasting(LiveRecorder):
                     url=url
                 )).text
                 title = re.search('<meta name="twitter:title" content="(.*?)">', response).group(1)
-                stream = self.get_streamlink().streams(url).get('best')  # Stream[mp4]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'mp4')
+                stream = self.select_stream(self.get_streamlink().streams(url))  # Stream[mp4]
+                await self.record(stream, url, title, 'mp4')
@@ -1,6 +1,5 @@
 """Twitch直播录制"""
 
-import asyncio
 from streamlink.options import Options
 from ..recorder import LiveRecorder
 
@@ -8,28 +7,41 @@ from ..recorder import LiveRecorder
 class Twitch(LiveRecorder):
     """Twitch直播录制器"""
     
+    # GQL单次请求最多支持35个操作
+    batch_size = 35
+    
     async def run(self):
         """检测并录制Twitch直播"""
         url = f'https://www.twitch.tv/{self.id}'
         if url not in self.recording:
-            response = (await self.request(
-                method='POST',
-                url='https://gql.twitch.tv/gql',
-                headers={'Client-Id': 'kimne78kx3ncx6brgo4mv6wki5h1ko'},
-                json=[{
-                    'operationName': 'StreamMetadata',
-                    'variables': {'channelLogin': self.id},
-                    'extensions': {
-                        'persistedQuery': {
-                            'version': 1,
-                            'sha256Hash': 'a647c2a13599e5991e175155f798ca7f1ecddde73f7f341f39009c14dbf59962'
-                        }
-                    }
-                }]
-            )).json()
-            if response[0]['data']['user']['stream']:
-                title = response[0]['data']['user']['lastBroadcast']['title']
+            user = await self.poll_status()
+            if user['stream']:
+                title = user['lastBroadcast']['title']
                 options = Options()
                 options.set('disable-ads', True)
-                stream = self.get_streamlink().streams(url, options).get('best')  # HLSStream[mpegts]
-                await asyncio.to_thread(self.run_record, stream, url, title, 'ts')
+                stream = self.select_stream(self.get_streamlink().streams(url, options))  # HLSStream[mpegts]
+                await self.record(stream, url, title, 'ts')
+    
+    async def fetch_status(self):
+        """获取单个频道信息"""
+        return (await self.fetch_batch_status(self, [self.id]))[self.id]
+    
+    @classmethod
+    async def fetch_batch_status(cls, recorder, ids):
+        """批量获取频道信息，GQL请求体为操作数组，响应按顺序一一对应"""
+        response = (await recorder.request(
+            method='POST',
+            url='https://gql.twitch.tv/gql',
+            headers={'Client-Id': 'kimne78kx3ncx6brgo4mv6wki5h1ko'},
+            json=[{
+                'operationName': 'StreamMetadata',
+                'variables': {'channelLogin': channel},
+                'extensions': {
+                    'persistedQuery': {
+                        'version': 1,
+                        'sha256Hash': 'a647c2a13599e5991e175155f798ca7f1ecddde73f7f341f39009c14dbf59962'
+                    }
+                }
+            } for channel in ids]
+        )).json()
+        return {channel: item['data']['user'] for channel, item in zip(ids, response)}
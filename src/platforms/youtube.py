@@ -38,6 +38,6 @@ class Youtube(LiveRecorder):
                 url = f"https://www.youtube.com/watch?v={video['videoId']}"
                 title = video['headline']['runs'][0]['text']
                 if url not in self.recording:
-                    stream = self.get_streamlink().streams(url).get('best')  # HLSStream[mpegts]
+                    stream = self.select_stream(self.get_streamlink().streams(url))  # HLSStream[mpegts]
                     # FIXME:多开直播间中断
-                    asyncio.create_task(asyncio.to_thread(self.run_record, stream, url, title, 'ts'))
+                    asyncio.create_task(self.record(stream, url, title, 'ts'))
@@ -0,0 +1,107 @@
+"""批量直播状态检测"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class BatchPoller:
+    """
+    按平台合并直播状态检测请求
+
+    同一平台（且代理、请求头和cookies相同）的录制器在一个时间窗口内发起的状态检测会被合并为一次批量请求，
+    结果再按房间分发给各录制器。平台不支持批量接口时不会创建该对象，录制器仍走单房间检测。
+    """
+
+    # 全部检测器，键为 (平台类名, 代理, 请求头和cookies)
+    _pollers: Dict[Tuple[str, Optional[str], str], 'BatchPoller'] = {}
+
+    def __init__(self, platform_class: type, window: float = 1.0):
+        """
+        初始化检测器
+
+        Args:
+            platform_class: 平台录制器类，需实现 fetch_batch_status
+            window: 合并等待窗口（秒）
+        """
+        self.platform_class = platform_class
+        self.batch_size = platform_class.batch_size
+        self.window = window
+        self.pending: Dict[str, List[Tuple[Any, asyncio.Future]]] = {}
+        self.requests = 0  # 已发送的批量请求数
+        self.rooms = 0  # 已检测的房间次数
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @classmethod
+    def get(cls, recorder) -> Optional['BatchPoller']:
+        """获取录制器所属平台的检测器，平台不支持批量检测时返回None"""
+        platform_class = type(recorder)
+        if platform_class.batch_size <= 0:
+            return None
+        # 批量请求使用其中一个录制器的请求头和cookies，配置不同的房间（如登录不同账号）分开检测
+        credentials = json.dumps([recorder.headers, recorder.cookies], sort_keys=True, default=str)
+        key = (platform_class.__name__, recorder.proxy, credentials)
+        if key not in cls._pollers:
+            cls._pollers[key] = cls(platform_class)
+        return cls._pollers[key]
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, int]]:
+        """各平台批量检测统计"""
+        result = {}
+        for (platform, *_), poller in cls._pollers.items():
+            item = result.setdefault(platform, {'requests': 0, 'rooms': 0})
+            item['requests'] += poller.requests
+            item['rooms'] += poller.rooms
+        return result
+
+    async def query(self, recorder) -> Dict[str, Any]:
+        """
+        提交一次状态检测并等待所在批次的结果
+
+        Args:
+            recorder: 发起检测的录制器
+
+        Returns:
+            本批次 {房间ID: 状态} 字典，未返回的房间不在字典中
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.setdefault(recorder.id, []).append((recorder, future))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        """立即发送当前批次"""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, {}
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: Dict[str, List[Tuple[Any, asyncio.Future]]]):
+        """发送批量请求并分发结果"""
+        ids = list(batch)
+        # 使用批次中的第一个录制器发送请求（同一检测器内代理、请求头和cookies一致）
+        recorder = batch[ids[0]][0][0]
+        try:
+            result = await self.platform_class.fetch_batch_status(recorder, ids)
+        except Exception as error:
+            for waiters in batch.values():
+                for _, future in waiters:
+                    if not future.done():
+                        future.set_exception(error)
+            return
+        self.requests += 1
+        self.rooms += len(ids)
+        logger.info(f'[{self.platform_class.__name__}]批量检测直播状态：{len(ids)}个房间，1次请求')
+        for waiters in batch.values():
+            for _, future in waiters:
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,257 @@
+"""持久化后处理任务队列"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+from .metrics import Family, metrics
+from .utils.file_handler import FileHandler
+
+# 任务类型与执行函数，执行函数需接受 prefix 参数（nice/ionice 命令前缀）
+HANDLERS: Dict[str, Callable] = {
+    'remux': FileHandler.run_ffmpeg,
+}
+
+
+class PostprocessQueue:
+    """
+    后处理任务队列
+
+    任务保存在 SQLite 数据库中，按优先级（高优先）和提交顺序执行，程序重启后继续执行未完成的任务。
+    同时运行的 ffmpeg 进程数由全局配置 postprocess_workers 决定，进程通过 nice/ionice 降低CPU和磁盘优先级，
+    避免多个直播同时结束时的转换占满磁盘和CPU、影响正在进行的录制。
+    多进程模式下各工作进程共享同一数据库，任务记录执行进程的PID，只有进程已退出的任务会被重新排队；
+    主进程不执行任务，只通过数据库查询和重试任务，重新排队的任务由工作进程的执行线程取出。
+    """
+
+    DEFAULT_WORKERS = 2
+    DEFAULT_NICE = 10
+    DEFAULT_IONICE = [2, 7]  # [调度类型, 优先级]，2为best-effort，7为最低优先级
+    KEEP_DONE = 7 * 86400  # 已完成任务的保留时间（秒）
+
+    def __init__(self, db_file: str = 'data/postprocess.db'):
+        self.db_file = Path(db_file)
+        self.workers = self.DEFAULT_WORKERS
+        self.nice = self.DEFAULT_NICE
+        self.ionice = self.DEFAULT_IONICE
+        self.threads: List[threading.Thread] = []
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+
+    def configure(self, config: dict):
+        """按全局配置设置并发数和进程优先级，首次调用时恢复未完成的任务并启动执行线程"""
+        with self._lock:
+            self.workers = config.get('postprocess_workers') or self.DEFAULT_WORKERS
+            self.nice = config.get('postprocess_nice', self.DEFAULT_NICE)
+            self.ionice = config.get('postprocess_ionice', self.DEFAULT_IONICE)
+            if self._db is None:
+                self._open()
+            # 并发数增加时补充执行线程，减少时多余的线程在当前任务结束后退出
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            for _ in range(self.workers - len(self.threads)):
+                thread = threading.Thread(target=self._run, name='postprocess', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            self._wakeup.notify_all()
+
+    def _open(self):
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                args TEXT NOT NULL,
+                flag TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'queued',
+                pid INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, id)')
+        self._recover()
+
+    def _recover(self):
+        """将执行进程已退出的任务重新排队"""
+        rows = self._db.execute("SELECT id, pid FROM jobs WHERE status = 'running'").fetchall()
+        orphaned = [row['id'] for row in rows if not _pid_alive(row['pid'])]
+        for job_id in orphaned:
+            self._db.execute("UPDATE jobs SET status = 'queued', pid = NULL WHERE id = ?", (job_id,))
+        self._db.execute("DELETE FROM jobs WHERE status = 'done' AND finished < ?", (time.time() - self.KEEP_DONE,))
+        pending = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if pending:
+            logger.info(f'恢复未完成的后处理任务：{pending} 个（其中 {len(orphaned)} 个执行中断）')
+
+    def submit(self, kind: str, args: dict, flag: str = '', priority: int = 0) -> int:
+        """
+        提交后处理任务，可在任意线程调用
+
+        Args:
+            kind: 任务类型，见 HANDLERS
+            args: 执行函数的参数
+            flag: 平台和主播标识
+            priority: 优先级，数值大的先执行
+
+        Returns:
+            任务ID
+        """
+        with self._lock:
+            if self._db is None:
+                self._open()
+            cursor = self._db.execute(
+                'INSERT INTO jobs (kind, args, flag, priority, created) VALUES (?, ?, ?, ?, ?)',
+                (kind, json.dumps(args, ensure_ascii=False), flag, priority, time.time()))
+            self._wakeup.notify()
+        logger.info(f'{flag}已提交后处理任务 #{cursor.lastrowid}')
+        return cursor.lastrowid
+
+    def retry(self, job_id: int) -> bool:
+        """重新执行失败的任务"""
+        with self._lock:
+            if self._db is None:
+                self._open()
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', error = NULL WHERE id = ? AND status = 'failed'", (job_id,))
+            self._wakeup.notify()
+        return cursor.rowcount > 0
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """取出优先级最高的排队任务并标记为执行中，需持有锁"""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            job = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if job:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', pid = ?, attempts = attempts + 1, started = ? WHERE id = ?",
+                    (os.getpid(), time.time(), job['id']))
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        return job
+
+    def _run(self):
+        """执行线程"""
+        while True:
+            with self._lock:
+                # 并发数减少时多余的线程退出
+                if self.threads.index(threading.current_thread()) >= self.workers:
+                    self.threads.remove(threading.current_thread())
+                    return
+                job = self._claim()
+                if job is None:
+                    # 多进程模式下其他进程也会提交任务，定期检查数据库
+                    self._wakeup.wait(5)
+                    continue
+                prefix = self._priority_prefix()
+            self._execute(job, prefix)
+
+    def _execute(self, job: sqlite3.Row, prefix: List[str]):
+        """执行任务并记录结果"""
+        logger.info(f'{job["flag"]}开始执行后处理任务 #{job["id"]}')
+        error = None
+        try:
+            HANDLERS[job['kind']](**json.loads(job['args']), prefix=prefix)
+        except Exception as e:
+            error = repr(e)
+            logger.error(f'{job["flag"]}后处理任务 #{job["id"]} 失败：{error}')
+        with self._lock:
+            self._db.execute('UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?',
+                             ('failed' if error else 'done', error, time.time(), job['id']))
+
+    def _priority_prefix(self) -> List[str]:
+        """降低ffmpeg进程优先级的命令前缀，系统不支持时忽略"""
+        prefix = []
+        if self.nice and shutil.which('nice'):
+            prefix += ['nice', '-n', str(self.nice)]
+        if self.ionice and shutil.which('ionice'):
+            prefix += ['ionice', '-c', str(self.ionice[0]), '-n', str(self.ionice[1])]
+        return prefix
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """
+        查询任务
+
+        Args:
+            status: 任务状态（queued/running/done/failed），为None时返回未完成和失败的任务
+            limit: 最多返回的任务数
+        """
+        with self._lock:
+            if self._db is None:
+                self._open()
+            if status:
+                rows = self._db.execute(
+                    'SELECT * FROM jobs WHERE status = ? ORDER BY priority DESC, id LIMIT ?', (status, limit))
+            else:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status != 'done' ORDER BY status, priority DESC, id LIMIT ?", (limit,))
+            return [{**dict(row), 'args': json.loads(row['args'])} for row in rows.fetchall()]
+
+    def pending_files(self) -> Set[str]:
+        """排队中和执行中的任务的源文件（绝对路径），清理磁盘空间时不删除"""
+        with self._lock:
+            if self._db is None:
+                return set()
+            rows = self._db.execute("SELECT args FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        files = set()
+        for row in rows:
+            args = json.loads(row['args'])
+            if 'output_dir' in args and 'filename' in args:
+                files.add(os.path.abspath(os.path.join(args['output_dir'], args['filename'])))
+        return files
+
+    def stats(self) -> dict:
+        """各状态的任务数"""
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        with self._lock:
+            if self._db is None:
+                self._open()
+            for status, count in self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+                counts[status] = count
+        return {'workers': self.workers, **counts}
+
+    def metric_families(self) -> List[Family]:
+        """后处理队列指标"""
+        stats = self.stats()
+        names = {
+            'workers': '后处理并发数',
+            'queued': '排队中的后处理任务数',
+            'running': '执行中的后处理任务数',
+            'failed': '失败的后处理任务数',
+        }
+        return [{'name': f'live_recorder_postprocess_{name}', 'type': 'gauge', 'help': help,
+                 'samples': [(f'live_recorder_postprocess_{name}', {}, stats[name])]}
+                for name, help in names.items()]
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """进程是否仍在运行"""
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# 全局后处理队列
+postprocess = PostprocessQueue()
+metrics.gauges.append(postprocess.metric_families)
@@ -0,0 +1,150 @@
+"""按域名的请求限速"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+
+class RateLimitExceeded(Exception):
+    """排队等待时间超过上限，请求被拒绝"""
+
+
+class TokenBucket:
+    """令牌桶，允许令牌透支以便按请求顺序排队"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """预订一个令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def cancel(self):
+        """归还预订的令牌"""
+        self.tokens += 1
+
+
+class HostLimiter:
+    """单个域名的限速器：令牌桶控制请求速率，信号量控制同时进行的请求数"""
+
+    def __init__(self, rate: float, burst: int, max_in_flight: int):
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.max_in_flight = max_in_flight
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.requests = 0
+        self.rejected = 0
+        self.queued = 0
+        self.in_flight = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'wait_avg': round(self.wait_total / self.requests, 3) if self.requests else 0,
+            'wait_max': round(self.wait_max, 3)
+        }
+
+
+class RateLimiter:
+    """
+    全局请求限速器
+
+    按请求的域名分别限速，所有录制器的请求共享同一限额。
+    配置项（全局配置 rate_limit）：
+    - rate: 每秒请求数，0表示不限制速率
+    - burst: 令牌桶容量，允许的突发请求数
+    - max_in_flight: 同一域名同时进行的最大请求数
+    - max_wait: 最长排队时间（秒），超过时直接拒绝请求
+    - hosts: 按域名后缀覆盖以上配置，如 {"chaturbate.com": {"rate": 1, "burst": 2}}
+    """
+
+    DEFAULTS = {'rate': 5, 'burst': 10, 'max_in_flight': 10, 'max_wait': 60}
+
+    def __init__(self):
+        self.options = dict(self.DEFAULTS)
+        self.host_options: Dict[str, dict] = {}
+        self.limiters: Dict[str, HostLimiter] = {}
+
+    def configure(self, options: Optional[dict]):
+        """更新限速配置，已有的域名限速器会按新配置重建"""
+        options = dict(options or {})
+        self.host_options = options.pop('hosts', None) or {}
+        self.options = {**self.DEFAULTS, **options}
+        self.limiters = {}
+
+    def _get_options(self, host: str) -> dict:
+        """获取域名的限速配置，匹配最长的域名后缀"""
+        matched = ''
+        for suffix in self.host_options:
+            if (host == suffix or host.endswith(f'.{suffix}')) and len(suffix) > len(matched):
+                matched = suffix
+        if matched:
+            return {**self.options, **self.host_options[matched]}
+        return self.options
+
+    def _get_limiter(self, host: str) -> HostLimiter:
+        if host not in self.limiters:
+            options = self._get_options(host)
+            self.limiters[host] = HostLimiter(options['rate'], options['burst'], options['max_in_flight'])
+        return self.limiters[host]
+
+    @asynccontextmanager
+    async def acquire(self, url: str):
+        """
+        等待请求配额，退出上下文时释放并发名额
+
+        Args:
+            url: 请求URL
+
+        Raises:
+            RateLimitExceeded: 预计排队时间超过 max_wait
+        """
+        host = urlsplit(url).hostname or ''
+        limiter = self._get_limiter(host)
+        max_wait = self._get_options(host)['max_wait']
+        if limiter.semaphore is None:
+            limiter.semaphore = asyncio.Semaphore(limiter.max_in_flight)
+        start = time.monotonic()
+        delay = limiter.bucket.reserve() if limiter.bucket else 0
+        if delay > max_wait:
+            limiter.bucket.cancel()
+            limiter.rejected += 1
+            raise RateLimitExceeded(f'{host} 请求排队时间 {delay:.1f}s 超过上限 {max_wait}s')
+        limiter.queued += 1
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            await limiter.semaphore.acquire()
+        finally:
+            limiter.queued -= 1
+        wait = time.monotonic() - start
+        limiter.requests += 1
+        limiter.wait_total += wait
+        limiter.wait_max = max(limiter.wait_max, wait)
+        limiter.in_flight += 1
+        try:
+            yield
+        finally:
+            limiter.in_flight -= 1
+            limiter.semaphore.release()
+
+    def stats(self) -> Dict[str, dict]:
+        """各域名的限速统计"""
+        return {host: limiter.stats() for host, limiter in self.limiters.items()}
+
+
+# 全局限速器
+rate_limiter = RateLimiter()
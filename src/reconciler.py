@@ -0,0 +1,132 @@
+"""配置热更新"""
+
+import asyncio
+from typing import Dict, Optional
+
+from loguru import logger
+
+from .config import Config
+from .events import bus
+from .executor import capacity
+from .journal import journal
+from .platforms import PLATFORMS
+from .postprocess import postprocess
+from .rate_limiter import rate_limiter
+from .registry import RecorderRegistry, RecordingRegistry, RoomKey
+from .storage import storage
+from .recorder import LiveRecorder
+
+
+class ConfigReconciler:
+    """
+    监视配置文件并增量更新录制器
+
+    按修改时间检测配置文件变化，按 (平台, 房间ID) 对比主播列表：
+    只启动新增的录制器、只停止删除的录制器，配置变化的录制器原地更新，
+    未变化的主播及其正在进行的录制不受影响。
+    """
+
+    CHECK_INTERVAL = 2  # 检查配置文件的间隔（秒）
+
+    def __init__(self, config_file: Optional[str], recording: RecordingRegistry,
+                 recorders: Optional[RecorderRegistry] = None):
+        """
+        Args:
+            config_file: 配置文件路径，为None时不监视文件，只通过 apply 更新
+            recording: 正在进行的录制（共享）
+            recorders: 录制器（共享，Web接口通过它启动、停止和暂停录制器）
+        """
+        self.config = Config(config_file) if config_file else None
+        self.recording = recording
+        self.recorders = recorders if recorders is not None else RecorderRegistry(recording)
+        self.users: Dict[RoomKey, dict] = {}
+        self.global_config: Optional[dict] = None
+        self._mtime = None
+
+    async def run(self):
+        """持续监视配置文件，首次运行时启动全部录制器"""
+        while True:
+            self.check()
+            await asyncio.sleep(self.CHECK_INTERVAL)
+
+    def check(self):
+        """配置文件有变化时重新加载并应用"""
+        if self.config is None:
+            return
+        try:
+            stat = self.config.config_file.stat()
+        except FileNotFoundError:
+            return
+        mtime = (stat.st_mtime_ns, stat.st_size)
+        if mtime == self._mtime:
+            return
+        # 读取失败时不记录修改时间，下次检查时重试
+        if not self.config.reload():
+            return
+        self._mtime = mtime
+        self.apply(self.config.get_global_config(), self.config.get_users())
+
+    def apply(self, global_config: dict, user_list: list):
+        """
+        对比新旧配置并增量更新录制器
+
+        Args:
+            global_config: 全局配置
+            user_list: 主播配置列表
+        """
+        users = self.index_users(user_list)
+        global_changed = global_config != self.global_config
+        if global_changed:
+            rate_limiter.configure(global_config['rate_limit'])
+            capacity.configure(global_config)
+            postprocess.configure(global_config)
+            # 修复上次意外退出时未关闭的录制文件
+            journal.recover()
+
+        storage.configure(global_config, user_list)
+
+        removed = [key for key in self.users if key not in users]
+        added = [key for key in users if key not in self.users]
+        updated = [key for key in users if key in self.users and (global_changed or users[key] != self.users[key])]
+        for key in removed:
+            self.stop(key)
+        for key in added:
+            self.start(key, global_config, users[key])
+        for key in updated:
+            self.recorders.get(key).recorder.configure(global_config, users[key])
+        self.users = users
+        self.global_config = global_config
+
+        if self.recorders:
+            logger.info(f'配置已加载：新增 {len(added)} 个，删除 {len(removed)} 个，更新 {len(updated)} 个，'
+                        f'共 {len(self.recorders)} 个录制任务')
+        else:
+            logger.info('当前没有配置主播，等待通过Web界面添加...')
+
+    @staticmethod
+    def index_users(user_list: list) -> Dict[RoomKey, dict]:
+        """按 (平台, 房间ID) 索引主播配置，跳过不支持的平台"""
+        users: Dict[RoomKey, dict] = {}
+        for user in user_list:
+            if user['platform'] not in PLATFORMS:
+                logger.warning(f'不支持的平台: {user["platform"]}')
+                continue
+            key = (user['platform'], user['id'])
+            if key in users:
+                logger.warning(f'重复的主播配置: {key[0]}/{key[1]}，使用最后一项')
+            users[key] = user
+        return users
+
+    def start(self, key: RoomKey, global_config: dict, user: dict):
+        """创建并启动录制器"""
+        recorder: LiveRecorder = PLATFORMS[key[0]](global_config, user, self.recording)
+        self.recorders.add(recorder, asyncio.create_task(recorder.start()))
+        logger.info(f'{recorder.flag}已启动录制任务')
+
+    def stop(self, key: RoomKey):
+        """停止录制器及其正在进行的录制"""
+        entry = self.recorders.remove(key)
+        entry.task.cancel()
+        entry.recorder.close()
+        bus.publish('removed', *key)
+        logger.info(f'{entry.recorder.flag}已停止录制任务')
@@ -1,74 +1,187 @@
 """直播录制基类"""
 
 import asyncio
+import random
+import re
+import threading
+import time
 from http.cookies import SimpleCookie
-from typing import Dict, Tuple, Union
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
 
 import anyio
 import httpx
-import streamlink
-from httpx_socks import AsyncProxyTransport
 from loguru import logger
 from streamlink.stream import StreamIO, HTTPStream, HLSStream
 
+from . import async_engine, direct_engine
+from .catalog import catalog
+from .events import bus
+from .executor import CapacityExhausted, capacity
+from .http_pool import http_pool
+from .journal import journal
+from .metrics import metrics
+from .postprocess import postprocess
+from .registry import RecordingRegistry
+from .poller import BatchPoller
+from .rate_limiter import RateLimitExceeded, rate_limiter
+from .scheduler import scheduler
+from .segmenter import SegmentedOutput
+from .session_pool import session_pool
+from .sessions import sessions
+from .storage import storage
 from .utils.file_handler import FileHandler
+from .utils.remux import LiveRemuxOutput
+from .writer import create_file_output
 
 
 class LiveRecorder:
     """直播录制基类"""
     
-    def __init__(self, config: dict, user: dict, recording: Dict[str, Tuple[StreamIO, any]]):
+    # 单次批量状态检测最多包含的房间数，0表示平台不支持批量检测
+    batch_size = 0
+    
+    def __init__(self, config: dict, user: dict, recording: RecordingRegistry):
         """
         初始化录制器
         
         Args:
             config: 全局配置
             user: 用户配置
-            recording: 正在录制的字典（共享）
+            recording: 正在进行的录制（共享）
         """
         self.id = user['id']
-        platform = user['platform']
-        name = user.get('name', self.id)
-        self.flag = f'[{platform}][{name}]'
+        self.platform = user['platform']
+        self.key = (self.platform, self.id)
+        self.recording = recording  # 共享的正在进行的录制
+        self.urls = set()  # 本录制器正在录制的直播URL
+        self.paused = False  # 暂停时不再检测直播状态
+        self._resumed: Optional[asyncio.Event] = None  # 在事件循环中创建，暂停时清除
+        self.configure(config, user)
+    
+    def configure(self, config: dict, user: dict):
+        """
+        应用配置，配置热更新时也会调用，正在进行的录制不受影响，新配置从下一次检测开始生效
+        
+        Args:
+            config: 全局配置
+            user: 用户配置
+        """
+        platform = self.platform
+        self.name = user.get('name', self.id)
+        self.flag = f'[{platform}][{self.name}]'
         
         self.interval = user.get('interval', 10)
         self.crypto_js_url = user.get('crypto_js_url', '')
         self.headers = user.get('headers', {'User-Agent': 'Chrome'})
         self.cookies = user.get('cookies')
         self.format = user.get('format')
+        self.postprocess_priority = user.get('postprocess_priority', 0)
+        # format与直播格式不同时，录制的同时通过ffmpeg管道封装，不再录制结束后转换
+        self.live_remux = user.get('live_remux', config.get('live_remux', False))
+        # 按时长（分钟）或大小（GB）分段录制，0表示不分段
+        self.segment_minutes = user.get('segment_minutes', config.get('segment_minutes', 0))
+        self.segment_gb = user.get('segment_gb', config.get('segment_gb', 0))
+        # 录制文件的写入方式，见 writer.create_file_output
+        self.file_writer = config.get('file_writer') or {}
         self.proxy = user.get('proxy', config.get('proxy'))
         self.output = user.get('output', config.get('output', 'output'))
-        self.recording = recording  # 共享的录制字典
         
         if not self.crypto_js_url:
             self.crypto_js_url = 'https://cdnjs.cloudflare.com/ajax/libs/crypto-js/4.1.1/crypto-js.min.js'
         
         self._get_cookies()
-        self.client = self._get_client()
+        # 请求间保持的cookies，初始为配置的cookies（发送给所有域名），之后保存响应返回的cookies（按域名发送）；
+        # 热更新时只有本主播的 cookies 配置变化才重置，保留服务器返回的cookies（如抖音的ttwid）
+        if getattr(self, '_cookies_config', None) != user.get('cookies') or not hasattr(self, 'session_cookies'):
+            self.session_cookies = httpx.Cookies(self.cookies or {})
+        self._cookies_config = user.get('cookies')
+        # 支持批量检测的平台合并同平台房间的状态请求
+        self.poller = BatchPoller.get(self) if config.get('batch_poll', True) else None
+        self.adaptive_poll = config.get('adaptive_poll', True)
+        # 录制引擎：用户配置 > 平台配置 > 全局配置，streamlink 或 async
+        self.engine = (user.get('engine') or (config.get('platform_engine') or {}).get(platform)
+                       or config.get('engine', 'streamlink'))
+    
+    def close(self) -> int:
+        """
+        关闭本录制器正在录制的直播流，返回关闭的录制数
+
+        通常在事件循环中调用（配置热更新、Web接口停止录制），而 streamlink 的 HLS 流关闭时
+        会等待下载线程退出，因此在后台线程中关闭，不阻塞事件循环。
+        """
+        items = []
+        for url in list(self.urls):
+            if item := self.recording.get(url):
+                sessions.set_reason(url, 'stopped')
+                items.append(item)
+        if items:
+            threading.Thread(target=self._close_items, args=(items,), name='close').start()
+        return len(items)
+
+    def _close_items(self, items: list):
+        for item in items:
+            try:
+                item.close()
+            except Exception as e:
+                logger.error(f'{self.flag}关闭直播流失败\n{repr(e)}')
+    
+    def pause(self):
+        """暂停检测直播状态，不再开始新的录制，正在进行的录制不受影响"""
+        if self.paused:
+            return
+        self.paused = True
+        if self._resumed:
+            self._resumed.clear()
+        bus.publish('paused', self.platform, self.id, paused=True)
+        logger.info(f'{self.flag}已暂停检测')
+    
+    def resume(self):
+        """恢复检测并立即检测一次"""
+        if self.paused:
+            self.paused = False
+            if self._resumed:
+                self._resumed.set()
+            bus.publish('resumed', self.platform, self.id, paused=False)
+            logger.info(f'{self.flag}已恢复检测')
+        scheduler.wake(self.key)
     
     async def start(self):
         """开始监控直播状态"""
         self.ssl = True
         self.mState = 0
+        self._resumed = asyncio.Event()
+        if not self.paused:
+            self._resumed.set()
+        # 批量检测的房间需要同时发起检测才能合并，不加抖动
+        if self.adaptive_poll and not self.poller:
+            # 错开启动时所有房间的首次检测
+            await scheduler.wait(self.key, random.uniform(0, self.interval))
         while True:
+            await self._resumed.wait()
             try:
                 logger.info(f'{self.flag}正在检测直播状态')
                 logger.info(f'预配置刷新间隔：{self.interval}s')
+                ok = True
                 try:
                     await self.run()   
                 except Exception as run_error:
+                    ok = False
+                    metrics.errors.inc(self.platform, 'poll', type(run_error).__name__)
                     logger.error(f"{self.flag}直播检测内部错误\n{repr(run_error)}")
+                    bus.publish('error', self.platform, self.id, error=repr(run_error), error_time=time.time())
+                bus.publish('polled', self.platform, self.id, name=self.name, poll_ok=ok, last_poll=time.time())
                 state = self.mState
-                timeI = self.interval
-                if state == '1':
-                    timeI = 2
+                if self.adaptive_poll:
+                    timeI = scheduler.next_delay(self.key, self.interval, ok, state == '1', not self.poller)
+                else:
+                    timeI = 2 if state == '1' else self.interval
                 logger.info(f'->直播状态：{state}  实际刷新间隔：{timeI}s')
-                await asyncio.sleep(timeI)
+                await scheduler.wait(self.key, timeI)
             except ConnectionError as error:
+                # 连接重建由共享客户端池处理
                 if '直播检测请求协议错误' not in str(error):
                     logger.error(error)
-                await self.client.aclose()
-                self.client = self._get_client()
             except Exception as error:
                 logger.exception(f'{self.flag}直播检测错误\n{repr(error)}')
     
@@ -76,6 +189,37 @@ class LiveRecorder:
         """子类需要实现的检测逻辑"""
         pass
     
+    async def poll_status(self) -> Any:
+        """
+        检测直播状态，支持批量检测时合并到同平台的批量请求中
+        
+        Returns:
+            平台定义的房间状态
+        """
+        if self.poller:
+            statuses = await self.poller.query(self)
+            if self.id in statuses:
+                return statuses[self.id]
+        return await self.fetch_status()
+    
+    async def fetch_status(self) -> Any:
+        """单独检测本房间的直播状态，支持批量检测的子类需要实现"""
+        raise NotImplementedError
+    
+    @classmethod
+    async def fetch_batch_status(cls, recorder: 'LiveRecorder', ids: List[str]) -> Dict[str, Any]:
+        """
+        批量检测多个房间的直播状态，支持批量检测的子类需要实现
+        
+        Args:
+            recorder: 用于发送请求的录制器
+            ids: 房间ID列表
+            
+        Returns:
+            {房间ID: 房间状态}，状态格式与 fetch_status 一致
+        """
+        raise NotImplementedError
+    
     async def request(self, method: str, url: str, **kwargs):
         """
         发送HTTP请求
@@ -88,9 +232,27 @@ class LiveRecorder:
         Returns:
             响应对象
         """
+        headers = {**self.headers, **(kwargs.pop('headers', None) or {})}
+        # 共享客户端不保存cookies，按请求的域名从本录制器的cookies中选取
+        cookie_request = httpx.Request(method, url)
+        self.session_cookies.set_cookie_header(cookie_request)
+        if 'Cookie' in cookie_request.headers:
+            headers['Cookie'] = cookie_request.headers['Cookie']
+        kwargs.setdefault('timeout', self.interval)
         try:
-            response = await self.client.request(method, url, **kwargs)
+            try:
+                # 所有录制器的请求按域名统一限速
+                async with rate_limiter.acquire(url):
+                    started = time.monotonic()
+                    response = await http_pool.request(method, url, proxy=self.proxy, headers=headers, **kwargs)
+                    metrics.poll_seconds.observe(time.monotonic() - started, self.platform)
+            except Exception as error:
+                metrics.errors.inc(self.platform, 'request', type(error).__name__)
+                raise
+            self.session_cookies.extract_cookies(response)
             return response
+        except RateLimitExceeded as error:
+            raise ConnectionError(f'{self.flag}直播检测请求被限速\n{error}')
         except httpx.ProtocolError as error:
             raise ConnectionError(f'{self.flag}直播检测请求协议错误\n{error}')
         except httpx.HTTPStatusError as error:
@@ -102,23 +264,12 @@ class LiveRecorder:
            logger.error(f'网络异常 重试...')
            raise ConnectionError(f'{self.flag}直播检测请求错误\n{repr(error)}')
     
-    def _get_client(self) -> httpx.AsyncClient:
-        """创建HTTP客户端"""
-        client_kwargs = {
-            'http2': True,
-            'timeout': self.interval,
-            'limits': httpx.Limits(max_keepalive_connections=100, keepalive_expiry=self.interval * 2),
-            'headers': self.headers,
-            'cookies': self.cookies
-        }
-        # 检查是否有设置代理
-        if self.proxy:
-            if 'socks' in self.proxy:
-                client_kwargs['transport'] = AsyncProxyTransport.from_url(self.proxy)
-            else:
-                # httpx 新版本使用 'proxy' (单数) 而不是 'proxies'
-                client_kwargs['proxy'] = self.proxy
-        return httpx.AsyncClient(**client_kwargs)
+    def _request_headers(self, headers: dict = None) -> dict:
+        """下载直播流的请求头：配置的请求头和cookies，不包含检测时服务器返回的cookies"""
+        headers = {**self.headers, **(headers or {})}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        return headers
     
     def _get_cookies(self):
         """解析cookies字符串"""
@@ -128,25 +279,59 @@ class LiveRecorder:
             self.cookies = {k: v.value for k, v in cookies.items()}
     
     def get_streamlink(self):
-        """创建streamlink会话"""
-        session = streamlink.session.Streamlink({
-            'stream-segment-timeout': 60,
-            'hls-segment-queue-threshold': 10
-        })
-        ssl = self.ssl
-        logger.info(f'是否验证SSL：{ssl}')
-        session.set_option('http-ssl-verify', ssl)
-        # 添加streamlink的http相关选项
-        if proxy := self.proxy:
-            # 代理为socks5时，streamlink的代理参数需要改为socks5h，防止部分直播源获取失败
-            if 'socks' in proxy:
-                proxy = proxy.replace('://', 'h://')
-            session.set_option('http-proxy', proxy)
-        if self.headers:
-            session.set_option('http-headers', self.headers)
-        if self.cookies:
-            session.set_option('http-cookies', self.cookies)
-        return session
+        """获取streamlink会话，相同配置的房间复用同一会话"""
+        return session_pool.get(self.platform, self.proxy, self.headers, self.cookies, self.ssl)
+    
+    def select_stream(self, streams: dict):
+        """从streamlink解析的直播流中选择画质，磁盘空间预计超过上限时选择最低画质"""
+        if not streams:
+            return None
+        if 'worst' in streams and storage.check(self.platform, self.name, self.output) == 'degrade':
+            logger.warning(f'{self.flag}磁盘空间不足，降低画质录制')
+            return streams['worst']
+        return streams.get('best')
+    
+    async def record(self, stream: Union[StreamIO, HTTPStream, HLSStream], url: str, title: str, format: str):
+        """
+        执行录制，按配置选择录制引擎
+        
+        streamlink引擎在录制线程池中运行，名额用完时放弃本次录制，下次检测时重试；
+        async引擎直接在事件循环中下载HTTP/HLS直播流，不占用录制线程，不支持的直播流（插件定制的直播流、加密HLS）
+        开始录制前即改用streamlink引擎；
+        direct引擎在录制线程中直接读取HTTP-FLV直播流写入文件，不支持的直播流仍使用streamlink引擎
+        
+        Args:
+            stream: 直播流对象
+            url: 直播URL
+            title: 直播标题
+            format: 文件格式
+        """
+        bus.publish('live', self.platform, self.id, name=self.name, title=title)
+        if storage.check(self.platform, self.name, self.output) == 'refuse':
+            logger.error(f'{self.flag}磁盘空间不足，拒绝录制：{title}')
+            bus.publish('stopped', self.platform, self.id, exit_reason='refused')
+            return
+        # 从检测到开播开始统计，用于计算首字节耗时
+        metrics.begin_recording(url, self.platform, self.id)
+        try:
+            if self.engine == 'async' and stream and async_engine.supports(stream) and await async_engine.probe(
+                    stream, proxy=self.proxy, verify=self.ssl, headers=self._request_headers()):
+                remux = self._live_remux_format(format)
+                filename = self._begin_record(url, title, remux or format)
+                output = self._create_output(url, filename, format, remux)
+                result = await self._write_stream_async(stream, url, filename, output)
+                self._finish_record(result, url, filename, remux or format, isinstance(output, SegmentedOutput))
+                return
+            try:
+                await capacity.run_record(self.run_record, stream, url, title, format)
+            except CapacityExhausted as error:
+                metrics.errors.inc(self.platform, 'record', type(error).__name__)
+                logger.error(f'{self.flag}无法开始录制，{error}')
+                bus.publish('error', self.platform, self.id, error=str(error), error_time=time.time())
+        finally:
+            reason = sessions.finish(url, metrics.recordings.get(url))
+            bus.publish('stopped', self.platform, self.id, exit_reason=reason)
+            metrics.end_recording(url)
     
     def run_record(self, stream: Union[StreamIO, HTTPStream, HLSStream], url: str, title: str, format: str):
         """
@@ -158,24 +343,106 @@ class LiveRecorder:
             title: 直播标题
             format: 文件格式
         """
-        # 获取输出文件名
-        filename = FileHandler.get_filename(self.flag, title, format)
         if stream:
-            logger.info(f'{self.flag}开始录制：{filename}')
-            # 调用streamlink录制直播
-            result = self._write_stream(stream, url, filename)
-            # 处理SSL错误
-            if result == 'ssl_error':
-                self.ssl = False
-            # 录制成功、format配置存在且不等于直播平台默认格式时运行ffmpeg封装
-            if result is True and self.format and self.format != format:
-                FileHandler.run_ffmpeg(self.output, filename, format, self.format, self.flag)
-            self.recording.pop(url, None)
-            logger.info(f'{self.flag}停止录制：{filename}')
+            remux = self._live_remux_format(format)
+            filename = self._begin_record(url, title, remux or format)
+            direct = self.engine == 'direct' and direct_engine.supports(stream, self.proxy)
+            # 写入的数据同时交给写入统计
+            output = self._create_output(url, filename, format, remux, record=metrics.recordings.get(url),
+                                         direct=direct)
+            # 直接录制或调用streamlink录制直播
+            write_stream = self._write_stream_direct if direct else self._write_stream
+            result = write_stream(stream, url, filename, output)
+            self._finish_record(result, url, filename, remux or format, isinstance(output, SegmentedOutput))
         else:
-            logger.error(f'{self.flag}无可用直播源：{filename}')
+            logger.error(f'{self.flag}无可用直播源：{FileHandler.get_filename(self.flag, title, format)}')
     
-    def _write_stream(self, stream: Union[StreamIO, HTTPStream, HLSStream], url: str, filename: str) -> Union[bool, str]:
+    def _live_remux_format(self, format: str) -> Optional[str]:
+        """边录边封装的目标格式，不需要封装或未开启时返回None"""
+        if self.live_remux and self.format and self.format != format:
+            return self.format
+        return None
+    
+    def _create_output(self, url: str, filename: str, format: str, remux: Optional[str], record=None,
+                       direct: bool = False):
+        """
+        创建录制输出（open/write/close），按配置分段、边录边封装或直接写入文件
+        
+        Args:
+            url: 直播URL
+            filename: 输出文件名
+            format: 直播流格式
+            remux: 边录边封装的目标格式，为None时直接写入直播流
+            record: 同时接收写入数据的对象（如写入统计），可选
+            direct: 是否使用direct引擎录制，未配置 file_writer 时直接写入文件描述符
+        """
+        file_writer = self.file_writer
+        if direct and file_writer.get('type', 'streamlink') == 'streamlink':
+            file_writer = {'type': 'direct'}
+        
+        def create(path: Path, record=None):
+            if remux:
+                output = LiveRemuxOutput(path, remux, record=record)
+            else:
+                output = create_file_output(path, file_writer, record)
+            sessions.add_output(url, path)
+            if meter := metrics.recordings.get(url):
+                meter.add_file(path)
+            # 记录到录制日志，进程意外退出后下次启动时修复文件并补交后处理
+            output = journal.track(output, path, remux or format, self._postprocess_job(path.name, remux or format))
+            # 文件打开和关闭时更新录制文件索引
+            return catalog.track(output, path, self.platform, self.name)
+        
+        path = Path(f'{self.output}/{filename}')
+        if not (self.segment_minutes or self.segment_gb):
+            return create(path, record)
+        # 每个分段写完后立即提交后处理
+        return SegmentedOutput(
+            path, create, self.segment_minutes * 60, int(self.segment_gb * 1024 ** 3),
+            on_part=lambda part: self._postprocess(part.name, remux or format), record=record)
+    
+    def _postprocess_job(self, filename: str, format: str) -> Optional[dict]:
+        """录制文件的后处理任务（postprocess.submit 的参数），format配置存在且不等于录制文件格式时为ffmpeg封装"""
+        if self.format and self.format != format:
+            return {
+                'kind': 'remux',
+                'args': {'output_dir': self.output, 'filename': filename, 'old_format': format,
+                         'new_format': self.format, 'flag': self.flag},
+                'flag': self.flag,
+                'priority': self.postprocess_priority,
+            }
+        return None
+    
+    def _postprocess(self, filename: str, format: str):
+        """提交录制文件的后处理任务"""
+        if job := self._postprocess_job(filename, format):
+            postprocess.submit(**job)
+    
+    def _begin_record(self, url: str, title: str, format: str) -> str:
+        """记录开播、开始录制会话并生成输出文件名"""
+        filename = FileHandler.get_filename(self.flag, title, format)
+        scheduler.observe_start(self.key, time.time())
+        sessions.begin(url, self.platform, self.id, self.name, title, format)
+        bus.publish('recording', self.platform, self.id, title=title, filename=filename, started=time.time(),
+                    bytes=0, bitrate=0)
+        logger.info(f'{self.flag}开始录制：{filename}')
+        return filename
+    
+    def _finish_record(self, result: Union[bool, str], url: str, filename: str, format: str,
+                       segmented: bool = False):
+        """处理录制结果，分段录制的各分段已在写完时提交后处理"""
+        # 处理SSL错误
+        if result == 'ssl_error':
+            self.ssl = False
+        # 录制成功时提交ffmpeg封装任务
+        if result is True and not segmented:
+            self._postprocess(filename, format)
+        self.recording.remove(url)
+        self.urls.discard(url)
+        logger.info(f'{self.flag}停止录制：{filename}')
+    
+    def _write_stream(self, stream: Union[StreamIO, HTTPStream, HLSStream], url: str, filename: str,
+                      output) -> Union[bool, str]:
         """
         将直播流写入文件
         
@@ -183,35 +450,100 @@ class LiveRecorder:
             stream: 直播流对象
             url: 直播URL
             filename: 输出文件名
+            output: 录制输出，见 _create_output
             
         Returns:
             录制结果：True=成功, False=失败, 'ssl_error'=SSL错误
         """
-        import re
-        from pathlib import Path
         from streamlink_cli.main import open_stream
-        from streamlink_cli.output import FileOutput
         from streamlink_cli.streamrunner import StreamRunner
         
         logger.info(f'{self.flag}获取到直播流链接：{filename}\n{stream.url}')
-        output = FileOutput(Path(f'{self.output}/{filename}'))
         try:
             stream_fd, prebuffer = open_stream(stream)
             output.open()
-            self.recording[url] = (stream_fd, output)
+            self.recording.add(url, self.platform, self.id, self.name, stream_fd, output)
+            self.urls.add(url)
             logger.info(f'{self.flag}正在录制：{filename}')
             StreamRunner(stream_fd, output).run(prebuffer)
             return True
         except Exception as error:
-            if 'timeout' in str(error):
-                logger.warning(f'{self.flag}直播录制超时：{filename}\n{error}')
-            elif re.search(r'SSL: CERTIFICATE_VERIFY_FAILED', str(error)):
-                logger.warning(f'{self.flag}SSL错误：{filename}\n{error}')
-                return 'ssl_error'
-            elif re.search(r'(Unable to open URL|No data returned from stream)', str(error)):
-                logger.warning(f'{self.flag}直播流打开错误：{filename}\n{error}')
-            else:
-                logger.exception(f'{self.flag}直播录制错误：{filename}\n{error}')
-            return False
+            return self._record_error(error, filename, url)
+        finally:
+            output.close()
+    
+    def _write_stream_direct(self, stream: HTTPStream, url: str, filename: str, output) -> Union[bool, str]:
+        """
+        使用direct引擎将HTTP-FLV直播流写入文件，返回值与 _write_stream 一致
+        
+        数据读入预分配的缓冲区后直接交给录制输出，不经过 streamlink 的读取线程和缓冲区
+        
+        Args:
+            stream: 直播流对象
+            url: 直播URL
+            filename: 输出文件名
+            output: 录制输出，见 _create_output
+        """
+        logger.info(f'{self.flag}获取到直播流链接（direct引擎）：{filename}\n{stream.url}')
+        headers = {'User-Agent': stream.session.http.headers.get('User-Agent', ''), **self._request_headers()}
+        reader = direct_engine.HttpStreamReader(stream.url, headers=headers, verify=self.ssl)
+        try:
+            reader.open()
+            output.open()
+            self.recording.add(url, self.platform, self.id, self.name, reader, output)
+            self.urls.add(url)
+            logger.info(f'{self.flag}正在录制：{filename}')
+            direct_engine.capture(reader, output)
+            return True
+        except Exception as error:
+            return self._record_error(error, filename, url)
         finally:
+            reader.close()
             output.close()
+    
+    async def _write_stream_async(self, stream: HTTPStream, url: str, filename: str,
+                                  output) -> Union[bool, str]:
+        """
+        使用异步引擎将直播流写入文件，返回值与 _write_stream 一致
+        
+        Args:
+            stream: 直播流对象
+            url: 直播URL
+            filename: 输出文件名
+            output: 录制输出，见 _create_output
+        """
+        logger.info(f'{self.flag}获取到直播流链接（异步引擎）：{filename}\n{stream.url}')
+        writer = async_engine.AsyncFileWriter(
+            Path(f'{self.output}/{filename}'), meter=metrics.recordings.get(url), output=output)
+        handle = async_engine.AsyncStreamHandle()
+        try:
+            await writer.open()
+            self.recording.add(url, self.platform, self.id, self.name, handle, writer)
+            self.urls.add(url)
+            logger.info(f'{self.flag}正在录制：{filename}')
+            await handle.run(async_engine.download(
+                stream, writer, proxy=self.proxy, verify=self.ssl, headers=self._request_headers()))
+            return True
+        except Exception as error:
+            return self._record_error(error, filename, url)
+        finally:
+            await writer.aclose()
+    
+    def _record_error(self, error: Exception, filename: str, url: str) -> Union[bool, str]:
+        """记录录制错误和会话结束原因，返回录制结果"""
+        metrics.errors.inc(self.platform, 'record', type(error).__name__)
+        bus.publish('error', self.platform, self.id, error=str(error)[:500], error_time=time.time())
+        if 'timeout' in str(error):
+            logger.warning(f'{self.flag}直播录制超时：{filename}\n{error}')
+            sessions.set_reason(url, 'timeout')
+        elif re.search(r'SSL: CERTIFICATE_VERIFY_FAILED', str(error)):
+            logger.warning(f'{self.flag}SSL错误：{filename}\n{error}')
+            sessions.set_reason(url, 'ssl_error')
+            return 'ssl_error'
+        elif re.search(r'(Unable to open URL|No data returned from stream)', str(error)):
+            logger.warning(f'{self.flag}直播流打开错误：{filename}\n{error}')
+            sessions.set_reason(url, 'open_error')
+        else:
+            logger.exception(f'{self.flag}直播录制错误：{filename}\n{error}')
+            sessions.set_reason(url, 'error')
+        return False
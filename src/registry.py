@@ -0,0 +1,237 @@
+"""正在进行的录制和录制器"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .metrics import metrics
+
+# 录制器键：(平台, 房间ID)
+RoomKey = Tuple[str, str]
+
+
+class ActiveRecording:
+    """
+    一个正在进行的录制：直播流（或下载句柄）和录制输出，close 可在任意线程调用
+
+    close 只停止读取直播流，录制输出由录制线程（或异步引擎的下载任务）在读取结束后自行关闭：
+    边录边封装等待ffmpeg退出、刷新文件、提交后处理等都在录制线程中进行，不会阻塞调用方（如事件循环）。
+    """
+
+    __slots__ = ('url', 'platform', 'user_id', 'name', 'stream', 'output', 'started')
+
+    def __init__(self, url: str, platform: str, user_id: str, name: str, stream, output):
+        """
+        Args:
+            url: 直播URL
+            platform: 平台
+            user_id: 房间ID
+            name: 主播名称
+            stream: 直播流或下载句柄（close 停止读取）
+            output: 录制输出
+        """
+        self.url = url
+        self.platform = platform
+        self.user_id = user_id
+        self.name = name
+        self.stream = stream
+        self.output = output
+        self.started = time.time()
+
+    def close(self):
+        """停止读取直播流，录制线程随后关闭录制输出并结束录制"""
+        self.stream.close()
+
+    def info(self) -> dict:
+        """录制信息和写入统计（文件、字节数、码率、距上次写入的时间等，见 RecordingMeter.stats）"""
+        meter = metrics.recordings.get(self.url)
+        return {'url': self.url, 'platform': self.platform, 'user_id': self.user_id, 'name': self.name,
+                'started': self.started, **(meter.stats() if meter else {})}
+
+
+class RecordingRegistry:
+    """
+    正在进行的录制
+
+    录制线程（streamlink、direct引擎）、事件循环（async引擎）和Web接口同时读写，所有操作持有锁，
+    遍历时返回快照，不会在遍历过程中被其他线程修改。
+    """
+
+    def __init__(self):
+        self._items: Dict[str, ActiveRecording] = {}  # {直播URL: 录制}
+        self._by_key: Dict[RoomKey, Dict[str, ActiveRecording]] = {}  # {(平台, 房间ID): {直播URL: 录制}}
+        self._lock = threading.Lock()
+
+    def add(self, url: str, platform: str, user_id: str, name: str, stream, output) -> ActiveRecording:
+        """登记开始录制，参数见 ActiveRecording"""
+        item = ActiveRecording(url, platform, user_id, name, stream, output)
+        with self._lock:
+            self._discard(self._items.get(url))
+            self._items[url] = item
+            self._by_key.setdefault((platform, user_id), {})[url] = item
+        return item
+
+    def remove(self, url: str) -> Optional[ActiveRecording]:
+        """录制结束时移除"""
+        with self._lock:
+            item = self._items.pop(url, None)
+            self._discard(item)
+            return item
+
+    def _discard(self, item: Optional[ActiveRecording]):
+        """从主播索引中移除，需持有锁"""
+        if item is None:
+            return
+        key = (item.platform, item.user_id)
+        items = self._by_key.get(key)
+        if items and items.get(item.url) is item:
+            del items[item.url]
+            if not items:
+                del self._by_key[key]
+
+    def get(self, url: str) -> Optional[ActiveRecording]:
+        with self._lock:
+            return self._items.get(url)
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return url in self._items
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def snapshot(self) -> List[ActiveRecording]:
+        """所有正在进行的录制"""
+        with self._lock:
+            return list(self._items.values())
+
+    def find(self, platform: str, user_id: str) -> List[ActiveRecording]:
+        """指定主播正在进行的录制"""
+        with self._lock:
+            return list(self._by_key.get((platform, user_id), {}).values())
+
+    def close_all(self):
+        """停止所有录制（程序退出时）"""
+        for item in self.snapshot():
+            item.close()
+
+
+class RecorderEntry:
+    """一个主播的录制器（LiveRecorder）和检测任务"""
+
+    __slots__ = ('recorder', 'task')
+
+    def __init__(self, recorder, task: asyncio.Task):
+        self.recorder = recorder
+        self.task = task
+
+
+class RecorderRegistry:
+    """
+    按 (平台, 房间ID) 索引的录制器
+
+    保存每个主播的录制器和检测任务，其正在进行的录制（直播流和录制输出）通过 RecordingRegistry 按同一个键查找，
+    启动、停止和暂停都只是字典查找，耗时与主播数量无关。
+    只在录制器所在的事件循环中使用（Web接口与录制器运行在同一个事件循环），不需要加锁。
+    暂停的主播记录在 paused 中，多进程模式下主播迁移到其他工作进程后由控制进程同步，新的录制器创建后即暂停。
+    """
+
+    ACTIONS = ('start', 'stop', 'pause')
+
+    def __init__(self, recordings: RecordingRegistry):
+        """
+        Args:
+            recordings: 正在进行的录制
+        """
+        self.recordings = recordings
+        self.paused: Set[RoomKey] = set()
+        self._entries: Dict[RoomKey, RecorderEntry] = {}
+
+    def add(self, recorder, task: asyncio.Task) -> RecorderEntry:
+        """登记录制器及其检测任务，已暂停的主播的录制器创建后即暂停"""
+        if recorder.key in self.paused:
+            recorder.pause()
+        entry = self._entries[recorder.key] = RecorderEntry(recorder, task)
+        return entry
+
+    def remove(self, key: RoomKey) -> Optional[RecorderEntry]:
+        """主播从配置中删除时移除"""
+        self.paused.discard(key)
+        return self._entries.pop(key, None)
+
+    def get(self, key: RoomKey) -> Optional[RecorderEntry]:
+        return self._entries.get(key)
+
+    def __contains__(self, key: RoomKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def keys(self) -> List[RoomKey]:
+        return list(self._entries)
+
+    def start(self, key: RoomKey) -> bool:
+        """恢复检测并立即检测一次，开播时开始录制，主播不存在时返回False"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        self.paused.discard(key)
+        entry.recorder.resume()
+        return True
+
+    def pause(self, key: RoomKey) -> bool:
+        """暂停检测，不再开始新的录制，正在进行的录制继续，主播不存在时返回False"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        self.paused.add(key)
+        entry.recorder.pause()
+        return True
+
+    def stop(self, key: RoomKey) -> Optional[int]:
+        """暂停检测并停止正在进行的录制，返回停止的录制数，主播不存在时返回None"""
+        if not self.pause(key):
+            return None
+        return self._entries[key].recorder.close()
+
+    def control(self, action: str, keys: Iterable[RoomKey]) -> Dict[RoomKey, Optional[int]]:
+        """
+        批量启动、停止或暂停
+
+        Args:
+            action: start、stop 或 pause
+            keys: 主播键列表
+
+        Returns:
+            {主播键: 结果}，不存在的主播为None，stop 为停止的录制数，其他操作为1
+        """
+        if action not in self.ACTIONS:
+            raise ValueError(f'不支持的操作: {action}')
+        operation = getattr(self, action)
+        results = {}
+        for key in keys:
+            result = operation(key)
+            results[key] = None if result is None or result is False else int(result)
+        return results
+
+    def info(self, key: RoomKey) -> Optional[dict]:
+        """录制器状态：是否暂停和正在进行的录制"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return {'platform': key[0], 'user_id': key[1], 'name': entry.recorder.name,
+                'paused': entry.recorder.paused, 'task_running': not entry.task.done(),
+                'recordings': [item.info() for item in self.recordings.find(*key)]}
+
+    def describe(self) -> List[dict]:
+        """所有录制器的状态"""
+        return [self.info(key) for key in list(self._entries)]
+
+
+# 本进程正在进行的录制
+recordings = RecordingRegistry()
+# 本进程的录制器
+recorders = RecorderRegistry(recordings)
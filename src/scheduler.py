@@ -0,0 +1,202 @@
+"""自适应直播检测调度"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# 录制器键：(平台, 房间ID)
+RoomKey = Tuple[str, str]
+
+
+class PollScheduler:
+    """
+    统一管理所有录制器的检测时间
+
+    所有录制器的下一次检测时间保存在一个最小堆中，由一个定时器按时唤醒。
+    刷新间隔在配置值的基础上自适应调整：
+    - 连续检测失败时指数退避
+    - 在历史开播时间附近加快检测，其余时间放慢检测
+    - 增加随机抖动，避免所有房间在同一时刻发起请求
+    """
+
+    JITTER = 0.1  # 抖动比例
+    MAX_BACKOFF = 300  # 失败退避的最大间隔（秒）
+    MAX_FAILURES = 16  # 计入退避的最大连续失败次数，2 ** 16 倍的间隔已远超 MAX_BACKOFF
+    LIVE_INTERVAL = 2  # 已开播但未获取到直播流时的检测间隔（秒）
+    HOT_WINDOW = 15 * 60  # 历史开播时间前后多少秒内加快检测
+    HOT_FACTOR = 0.5  # 开播时段的间隔系数
+    COLD_FACTOR = 2  # 非开播时段的间隔系数
+    MIN_HISTORY = 3  # 至少记录多少次开播后才放慢非开播时段的检测
+    MAX_HISTORY = 30  # 每个房间保留的开播记录数
+    SAME_LIVE = 2 * 3600  # 两次开播间隔小于该值时视为同一场直播的重连
+
+    def __init__(self, history_file: str = 'data/golive.json'):
+        self.history_file = Path(history_file)
+        self.history: Optional[Dict[str, List[int]]] = None  # {"平台/房间ID": [开播时间戳]}
+        self.failures: Dict[RoomKey, int] = {}
+        self.heap: List[list] = []
+        self.entries: Dict[RoomKey, list] = {}
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = threading.Lock()
+
+    def next_delay(self, key: RoomKey, interval: float, ok: bool = True, live: bool = False,
+                   jitter: bool = True) -> float:
+        """
+        计算下一次检测的等待时间
+
+        Args:
+            key: 录制器键
+            interval: 配置的刷新间隔
+            ok: 本次检测是否成功
+            live: 是否已开播但未开始录制
+            jitter: 是否加入随机抖动
+
+        Returns:
+            等待秒数
+        """
+        with self._lock:
+            if ok:
+                self.failures.pop(key, None)
+            else:
+                self.failures[key] = min(self.failures.get(key, 0) + 1, self.MAX_FAILURES)
+            failures = self.failures.get(key, 0)
+            starts = list(self._get_history(key))
+        if not ok:
+            delay = min(interval * 2 ** failures, max(self.MAX_BACKOFF, interval))
+        elif live:
+            delay = self.LIVE_INTERVAL
+        else:
+            delay = interval
+            if self._is_hot(starts, time.time()):
+                delay = max(interval * self.HOT_FACTOR, self.LIVE_INTERVAL)
+            elif len(starts) >= self.MIN_HISTORY:
+                delay = interval * self.COLD_FACTOR
+        if jitter:
+            delay *= random.uniform(1 - self.JITTER, 1 + self.JITTER)
+        return round(delay, 2)
+
+    def _is_hot(self, starts: List[int], now: float) -> bool:
+        """当前时间是否处于任一历史开播时间（按一天中的时刻）的前后窗口内"""
+        now_seconds = self._seconds_of_day(now)
+        for start in starts:
+            diff = abs(now_seconds - self._seconds_of_day(start))
+            if min(diff, 86400 - diff) <= self.HOT_WINDOW:
+                return True
+        return False
+
+    @staticmethod
+    def _seconds_of_day(timestamp: float) -> int:
+        """时间戳对应的本地时间是一天中的第几秒"""
+        local = time.localtime(timestamp)
+        return local.tm_hour * 3600 + local.tm_min * 60 + local.tm_sec
+
+    def observe_start(self, key: RoomKey, timestamp: float):
+        """
+        记录一次开播时间
+
+        Args:
+            key: 录制器键
+            timestamp: 开播时间戳
+        """
+        timestamp = int(timestamp)
+        with self._lock:
+            starts = self._get_history(key)
+            if any(abs(timestamp - start) < self.SAME_LIVE for start in starts):
+                return
+            starts.append(timestamp)
+            starts.sort()
+            del starts[:-self.MAX_HISTORY]
+            self._save_history()
+        logger.info(f'[{key[0]}][{key[1]}]记录开播时间：{time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))}')
+
+    def _get_history(self, key: RoomKey) -> List[int]:
+        """获取房间的开播记录，首次调用时从文件加载，需持有锁"""
+        if self.history is None:
+            self.history = {}
+            if self.history_file.exists():
+                try:
+                    self.history = json.loads(self.history_file.read_text(encoding='utf-8'))
+                except Exception as error:
+                    logger.warning(f'加载开播记录失败 {self.history_file}: {error}')
+        return self.history.setdefault(f'{key[0]}/{key[1]}', [])
+
+    def _save_history(self):
+        """保存开播记录"""
+        try:
+            self.history_file.parent.mkdir(parents=True, exist_ok=True)
+            self.history_file.write_text(json.dumps(self.history, ensure_ascii=False), encoding='utf-8')
+        except Exception as error:
+            logger.warning(f'保存开播记录失败 {self.history_file}: {error}')
+
+    async def wait(self, key: RoomKey, delay: float):
+        """
+        等待到下一次检测时间
+
+        Args:
+            key: 录制器键
+            delay: 等待秒数
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = [loop.time() + delay, next(self._seq), key, future]
+        heapq.heappush(self.heap, entry)
+        self.entries[key] = entry
+        self._arm(loop)
+        try:
+            await future
+        finally:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+
+    def wake(self, key: RoomKey) -> bool:
+        """立即唤醒等待中的录制器，返回是否唤醒成功"""
+        entry = self.entries.get(key)
+        if entry and not entry[3].done():
+            entry[3].set_result(None)
+            return True
+        return False
+
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        """按堆顶的检测时间设置定时器"""
+        while self.heap and self.heap[0][3].done():
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return
+        deadline = self.heap[0][0]
+        if self._timer and not self._timer.cancelled() and self._timer.when() <= deadline:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer = loop.call_at(deadline, self._fire, loop)
+
+    def _fire(self, loop: asyncio.AbstractEventLoop):
+        """唤醒所有已到期的录制器"""
+        self._timer = None
+        now = loop.time()
+        while self.heap and self.heap[0][0] <= now:
+            future = heapq.heappop(self.heap)[3]
+            if not future.done():
+                future.set_result(None)
+        self._arm(loop)
+
+    def stats(self) -> dict:
+        """调度统计"""
+        with self._lock:
+            return {
+                'waiting': len(self.entries),
+                'backoff': len(self.failures),
+                'learned_rooms': sum(1 for starts in (self.history or {}).values() if starts)
+            }
+
+
+# 全局调度器
+scheduler = PollScheduler()
@@ -0,0 +1,338 @@
+"""分段录制"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from loguru import logger
+
+from .utils.file_handler import FileHandler
+
+# 切分结果：[(是否从此处开始新的分段, 数据)]
+Pieces = List[Tuple[bool, bytes]]
+
+
+class FlvCutter:
+    """
+    在FLV标签边界切分直播流
+
+    新分段从视频关键帧开始（纯音频流从音频帧开始），开头写入FLV文件头、onMetaData和音视频序列头，
+    时间戳从0开始，每个分段都可以单独播放。
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.header: Optional[bytes] = None  # FLV文件头及 PreviousTagSize0
+        self.metadata: Optional[bytes] = None  # onMetaData 脚本标签
+        self.video_header: Optional[bytes] = None  # 视频序列头标签
+        self.audio_header: Optional[bytes] = None  # 音频序列头标签
+        self.has_video = False
+        self.base = 0  # 当前分段的起始时间戳
+
+    def feed(self, data: bytes, pending: bool) -> Pieces:
+        """
+        Args:
+            data: 新的直播流数据
+            pending: 是否需要在下一个可切分的位置开始新分段
+        """
+        buf = self.buffer
+        buf += data
+        pieces: Pieces = []
+        out = bytearray()
+        new = False
+        pos = 0
+        if self.header is None:
+            if len(buf) < 9 or len(buf) < int.from_bytes(buf[5:9], 'big') + 4:
+                return pieces
+            offset = int.from_bytes(buf[5:9], 'big')
+            self.header = bytes(buf[:offset]) + b'\0\0\0\0'
+            out += buf[:offset + 4]
+            pos = offset + 4
+        while len(buf) - pos >= 11:
+            end = pos + 15 + int.from_bytes(buf[pos + 1:pos + 4], 'big')
+            if len(buf) < end:
+                break
+            tag = bytes(buf[pos:end])
+            tag_type = tag[0] & 0x1f
+            keyframe = self._inspect(tag_type, tag)
+            if pending and keyframe:
+                if out:
+                    pieces.append((new, bytes(out)))
+                new, pending = True, False
+                self.base = self._timestamp(tag)
+                out = bytearray(self.header)
+                for item in (self.metadata, self.video_header, self.audio_header):
+                    if item:
+                        out += self._rebase(item, 0)
+            out += self._rebase(tag, max(self._timestamp(tag) - self.base, 0)) if self.base else tag
+            pos = end
+        del buf[:pos]
+        if out:
+            pieces.append((new, bytes(out)))
+        return pieces
+
+    def _inspect(self, tag_type: int, tag: bytes) -> bool:
+        """缓存序列头，返回该标签是否可以作为分段的开头"""
+        if len(tag) < 17:
+            return False
+        flags, packet = tag[11], tag[12]
+        if tag_type == 18:
+            if self.metadata is None:
+                self.metadata = tag
+        elif tag_type == 9:
+            self.has_video = True
+            if flags & 0x80:
+                # Enhanced RTMP/FLV（HEVC、AV1等）
+                frame_type, packet_type = (flags >> 4) & 0x07, flags & 0x0f
+                if packet_type == 0:
+                    self.video_header = tag
+                return frame_type == 1 and packet_type in (1, 3)
+            if flags & 0x0f in (7, 12) and packet == 0:
+                self.video_header = tag
+                return False
+            return flags >> 4 == 1
+        elif tag_type == 8:
+            if flags >> 4 == 10 and packet == 0:
+                self.audio_header = tag
+                return False
+            return not self.has_video
+        return False
+
+    @staticmethod
+    def _timestamp(tag: bytes) -> int:
+        return tag[4] << 16 | tag[5] << 8 | tag[6] | tag[7] << 24
+
+    @staticmethod
+    def _rebase(tag: bytes, timestamp: int) -> bytes:
+        return tag[:4] + (timestamp & 0xffffff).to_bytes(3, 'big') + bytes([timestamp >> 24 & 0xff]) + tag[8:]
+
+
+class TsCutter:
+    """
+    在MPEG-TS包边界切分直播流
+
+    平时只按188字节对齐，需要切分时才逐包检查：新分段从视频随机访问点（关键帧）所在的PES开始，
+    开头写入最近的PAT和PMT。直播流不标记随机访问点时，等待超过 FALLBACK_SECONDS 后在视频PES开头切分。
+    """
+
+    PACKET = 188
+    FALLBACK_SECONDS = 10
+    VIDEO_TYPES = (0x01, 0x02, 0x10, 0x1b, 0x24, 0x42)
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.pat: Optional[bytes] = None
+        self.pmt: Optional[bytes] = None
+        self.pmt_pid: Optional[int] = None
+        self.cut_pid: Optional[int] = None  # 在该PID的PES开头切分（视频，纯音频流时为第一个音频）
+        self.pending_since: Optional[float] = None
+
+    def feed(self, data: bytes, pending: bool) -> Pieces:
+        buf = self.buffer
+        buf += data
+        size = len(buf) - len(buf) % self.PACKET
+        if not pending:
+            self.pending_since = None
+            if self.cut_pid is not None:
+                # 不需要切分时不逐包检查
+                chunk = bytes(buf[:size])
+                del buf[:size]
+                return [(False, chunk)] if chunk else []
+        elif self.pending_since is None:
+            self.pending_since = time.monotonic()
+        pieces: Pieces = []
+        new = False
+        head = b''
+        start = pos = 0
+        while pos + self.PACKET <= len(buf):
+            if buf[pos] != 0x47:
+                # 失去同步时跳到下一个同步字节
+                pos = self._resync(buf, pos + 1)
+                continue
+            if self._is_cut_point(buf[pos:pos + self.PACKET]) and pending:
+                if pos > start or head:
+                    pieces.append((new, head + bytes(buf[start:pos])))
+                new, head = True, (self.pat or b'') + (self.pmt or b'')
+                start = pos
+                pending = False
+                self.pending_since = None
+            pos += self.PACKET
+        if pos > start or head:
+            pieces.append((new, head + bytes(buf[start:pos])))
+        del buf[:pos]
+        return pieces
+
+    def _is_cut_point(self, packet: bytearray) -> bool:
+        """记录PAT/PMT，返回该包是否可以作为分段的开头"""
+        pid = (packet[1] & 0x1f) << 8 | packet[2]
+        start = packet[1] & 0x40
+        if not start:
+            return False
+        payload = 4
+        adaptation = packet[3] & 0x20
+        if adaptation:
+            payload += 1 + packet[4]
+        if pid == 0:
+            self.pat = bytes(packet)
+            self._parse_pat(packet, payload)
+        elif pid == self.pmt_pid:
+            self.pmt = bytes(packet)
+            self._parse_pmt(packet, payload)
+        elif pid == self.cut_pid:
+            if adaptation and packet[4] and packet[5] & 0x40:
+                return True
+            return self.pending_since is not None and time.monotonic() - self.pending_since > self.FALLBACK_SECONDS
+        return False
+
+    def _parse_pat(self, packet: bytearray, payload: int):
+        section = payload + 1 + packet[payload]
+        end = min(section + 3 + ((packet[section + 1] & 0x0f) << 8 | packet[section + 2]) - 4, self.PACKET)
+        for i in range(section + 8, end - 3, 4):
+            if packet[i] << 8 | packet[i + 1]:
+                self.pmt_pid = (packet[i + 2] & 0x1f) << 8 | packet[i + 3]
+                return
+
+    def _parse_pmt(self, packet: bytearray, payload: int):
+        section = payload + 1 + packet[payload]
+        end = min(section + 3 + ((packet[section + 1] & 0x0f) << 8 | packet[section + 2]) - 4, self.PACKET)
+        i = section + 12 + ((packet[section + 10] & 0x0f) << 8 | packet[section + 11])
+        first = None
+        while i + 5 <= end:
+            stream_type, pid = packet[i], (packet[i + 1] & 0x1f) << 8 | packet[i + 2]
+            if stream_type in self.VIDEO_TYPES:
+                self.cut_pid = pid
+                return
+            first = first if first is not None else pid
+            i += 5 + ((packet[i + 3] & 0x0f) << 8 | packet[i + 4])
+        if first is not None:
+            self.cut_pid = first
+
+    def _resync(self, buf: bytearray, pos: int) -> int:
+        while True:
+            pos = buf.find(b'\x47', pos)
+            if pos < 0 or pos + self.PACKET >= len(buf):
+                return len(buf) if pos < 0 else pos
+            if buf[pos + self.PACKET] == 0x47:
+                return pos
+            pos += 1
+
+
+class PassthroughCutter:
+    """无法识别的格式不切分"""
+
+    def feed(self, data: bytes, pending: bool) -> Pieces:
+        return [(False, data)]
+
+
+class SegmentedOutput:
+    """
+    按时长或大小分段写入直播流
+
+    在FLV标签或TS包边界切分，分段之间不丢失数据，文件名为录制文件名加分段序号（见 FileHandler.get_part_filename），
+    每个分段写完后立即调用 on_part。接口与 streamlink_cli 的 FileOutput 一致（open/write/close），
+    write 和 close 持有同一把锁，close 可在其他线程调用（停止录制）。
+    """
+
+    def __init__(self, path: Path, opener: Callable[[Path], object], max_seconds: float = 0, max_bytes: int = 0,
+                 on_part: Optional[Callable[[Path], None]] = None, record=None):
+        """
+        Args:
+            path: 录制文件路径，分段文件名在此基础上加序号
+            opener: 创建分段输出的函数，返回未打开的输出（open/write/close）
+            max_seconds: 每段最长时长（秒），0表示不限
+            max_bytes: 每段最大字节数，0表示不限
+            on_part: 分段写完后的回调，参数为分段文件路径
+            record: 同时接收写入数据的对象（如写入统计），可选
+        """
+        self.path = path
+        self.opener = opener
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.on_part = on_part
+        self.record = record
+        self.cutter = None
+        self.index = 0
+        self.part = None
+        self.part_path: Optional[Path] = None
+        self.part_started = 0.0
+        self.part_bytes = 0
+        self.opened = False
+        self._head = b''
+        self._lock = threading.Lock()
+
+    def open(self):
+        if self.record:
+            self.record.open()
+        self.opened = True
+
+    def write(self, data: bytes):
+        # close 可能在其他线程调用（停止录制），持有锁写入，关闭后不再打开新的分段
+        with self._lock:
+            if not self.opened:
+                raise OSError('Output is not opened')
+            if self.record:
+                self.record.write(data)
+            if self.cutter is None:
+                data = self._detect(data)
+                if self.cutter is None:
+                    return
+            for new, chunk in self.cutter.feed(data, self._due()):
+                if new:
+                    self._finish_part()
+                self._write_part(chunk)
+
+    def _detect(self, data: bytes) -> bytes:
+        """根据开头的数据识别直播流格式"""
+        data = self._head + data
+        if len(data) < 3:
+            self._head = data
+            return b''
+        if data[:3] == b'FLV':
+            self.cutter = FlvCutter()
+        elif data[0] == 0x47:
+            self.cutter = TsCutter()
+        else:
+            logger.warning(f'无法识别直播流格式，不分段：{self.path}')
+            self.cutter = PassthroughCutter()
+        self._head = b''
+        return data
+
+    def _due(self) -> bool:
+        """当前分段是否达到时长或大小限制"""
+        if self.part is None:
+            return False
+        return (bool(self.max_bytes) and self.part_bytes >= self.max_bytes) or \
+            (bool(self.max_seconds) and time.monotonic() - self.part_started >= self.max_seconds)
+
+    def _write_part(self, chunk: bytes):
+        """写入当前分段，没有时打开新的分段，需持有锁"""
+        if self.part is None:
+            self.index += 1
+            self.part_path = self.path.with_name(FileHandler.get_part_filename(self.path.name, self.index))
+            self.part = self.opener(self.part_path)
+            self.part.open()
+            self.part_started = time.monotonic()
+            self.part_bytes = 0
+            logger.info(f'开始写入分段：{self.part_path.name}')
+        self.part.write(chunk)
+        self.part_bytes += len(chunk)
+
+    def _finish_part(self):
+        """关闭当前分段并调用回调，需持有锁"""
+        part, path = self.part, self.part_path
+        self.part = None
+        if part is None:
+            return
+        part.close()
+        if self.on_part:
+            self.on_part(path)
+
+    def close(self):
+        with self._lock:
+            if not self.opened:
+                return
+            self.opened = False
+            self._finish_part()
+        if self.record:
+            self.record.close()
@@ -0,0 +1,86 @@
+"""Streamlink会话池"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import streamlink
+from loguru import logger
+
+
+class StreamlinkSessionPool:
+    """
+    复用 streamlink 会话
+
+    创建 Streamlink 会话需要加载插件、解析选项并新建 requests 会话，每次开播都重新创建会增加录制启动延迟。
+    会话按 (平台, 代理, 请求头, cookies, SSL验证) 缓存，相同配置的房间共享同一会话。
+    部分插件会修改会话的请求头，因此不同平台不共享会话。
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.sessions: 'OrderedDict[str, streamlink.session.Streamlink]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, platform: str, proxy: Optional[str], headers: Optional[dict], cookies: Optional[dict],
+            ssl: bool) -> streamlink.session.Streamlink:
+        """
+        获取会话，不存在时创建
+
+        Args:
+            platform: 平台名称
+            proxy: 代理地址
+            headers: 请求头
+            cookies: cookies字典
+            ssl: 是否验证SSL
+        """
+        key = json.dumps([platform, proxy, headers, cookies, ssl], sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            if key in self.sessions:
+                self.hits += 1
+                self.sessions.move_to_end(key)
+                return self.sessions[key]
+            self.misses += 1
+        session = self._create(proxy, headers, cookies, ssl)
+        with self._lock:
+            self.sessions[key] = session
+            while len(self.sessions) > self.max_size:
+                self.sessions.popitem(last=False)
+        return session
+
+    @staticmethod
+    def _create(proxy: Optional[str], headers: Optional[dict], cookies: Optional[dict],
+                ssl: bool) -> streamlink.session.Streamlink:
+        """创建streamlink会话"""
+        session = streamlink.session.Streamlink({
+            'stream-segment-timeout': 60,
+            'hls-segment-queue-threshold': 10
+        })
+        logger.info(f'是否验证SSL：{ssl}')
+        session.set_option('http-ssl-verify', ssl)
+        # 添加streamlink的http相关选项
+        if proxy:
+            # 代理为socks5时，streamlink的代理参数需要改为socks5h，防止部分直播源获取失败
+            if 'socks' in proxy:
+                proxy = proxy.replace('://', 'h://')
+            session.set_option('http-proxy', proxy)
+        if headers:
+            session.set_option('http-headers', headers)
+        if cookies:
+            session.set_option('http-cookies', cookies)
+        return session
+
+    def stats(self) -> dict:
+        """会话池统计"""
+        return {
+            'sessions': len(self.sessions),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+# 全局会话池
+session_pool = StreamlinkSessionPool()
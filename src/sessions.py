@@ -0,0 +1,243 @@
+"""录制会话记录"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from .postprocess import _pid_alive
+
+# 录制结束原因
+EXIT_REASONS = {
+    'closed': '直播流结束或被关闭',
+    'stopped': '手动停止或主播已从配置中删除',
+    'timeout': '读取超时',
+    'ssl_error': 'SSL证书错误',
+    'open_error': '直播流打开失败',
+    'error': '其他录制错误',
+    'interrupted': '录制进程异常退出',
+    'refused': '磁盘空间不足，拒绝录制（只出现在录制状态推送中，不产生会话）',
+}
+
+
+class SessionStore:
+    """
+    录制会话记录
+
+    每次录制写入一条会话：平台、房间ID、主播、标题、开始和结束时间、写入字节数、平均码率、读取停顿次数、
+    结束原因和输出文件。数据保存在 SQLite 数据库中，统计、容量规划和保留策略直接查询数据库，不再解析文件名。
+    多进程模式下各工作进程共享同一数据库，未结束的会话记录录制进程的PID，进程已退出的会话标记为 interrupted。
+    """
+
+    SORT_FIELDS = ('started', 'ended', 'duration', 'bytes', 'bitrate')
+    # 汇总的分组字段，day 按开始日期（本地时区）
+    GROUP_FIELDS = {
+        'platform': ('platform',),
+        'user': ('platform', 'user_id'),
+        'day': ("date(started, 'unixepoch', 'localtime') AS day",),
+    }
+
+    def __init__(self, db_file: str = 'data/sessions.db'):
+        self.db_file = Path(db_file)
+        self.active: Dict[str, int] = {}  # {直播URL: 会话ID}
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库，首次打开时结束进程已退出的会话，需持有锁"""
+        if self._db is None:
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_file), timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    platform TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    name TEXT,
+                    title TEXT,
+                    url TEXT,
+                    format TEXT,
+                    started REAL NOT NULL,
+                    ended REAL,
+                    duration REAL,
+                    bytes INTEGER NOT NULL DEFAULT 0,
+                    bitrate REAL,
+                    stalls INTEGER NOT NULL DEFAULT 0,
+                    exit_reason TEXT,
+                    outputs TEXT NOT NULL DEFAULT '[]',
+                    pid INTEGER
+                )''')
+            # 旧版本的 reconnects 列记录的实际是读取停顿次数
+            columns = [row['name'] for row in self._db.execute('PRAGMA table_info(sessions)')]
+            if 'reconnects' in columns:
+                self._db.execute('ALTER TABLE sessions RENAME COLUMN reconnects TO stalls')
+            self._db.execute('CREATE INDEX IF NOT EXISTS sessions_user ON sessions (platform, user_id, started)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS sessions_started ON sessions (started)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS sessions_reason ON sessions (exit_reason, started)')
+            self._recover()
+        return self._db
+
+    def _recover(self):
+        """将录制进程已退出的会话标记为 interrupted"""
+        rows = self._db.execute('SELECT id, pid FROM sessions WHERE ended IS NULL').fetchall()
+        orphaned = [row for row in rows if not _pid_alive(row['pid'])]
+        for row in orphaned:
+            # 结束时间未知，使用开始时间，不计入时长
+            self._db.execute(
+                "UPDATE sessions SET ended = started, duration = 0, exit_reason = 'interrupted', pid = NULL "
+                "WHERE id = ?", (row['id'],))
+        if orphaned:
+            logger.info(f'{len(orphaned)} 个录制会话因进程退出而中断')
+
+    def begin(self, url: str, platform: str, user_id: str, name: str, title: str, format: str) -> int:
+        """开始记录一个录制会话，可在任意线程调用"""
+        with self._lock:
+            cursor = self._connect().execute(
+                'INSERT INTO sessions (platform, user_id, name, title, url, format, started, pid) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (platform, user_id, name, title, url, format, time.time(), os.getpid()))
+        self.active[url] = cursor.lastrowid
+        return cursor.lastrowid
+
+    def add_output(self, url: str, path: Path):
+        """记录会话的输出文件（分段录制时每个分段一个文件）"""
+        session_id = self.active.get(url)
+        if session_id is None:
+            return
+        with self._lock:
+            db = self._connect()
+            outputs = json.loads(db.execute('SELECT outputs FROM sessions WHERE id = ?', (session_id,)).fetchone()[0])
+            outputs.append(str(path))
+            db.execute('UPDATE sessions SET outputs = ? WHERE id = ?',
+                       (json.dumps(outputs, ensure_ascii=False), session_id))
+
+    def set_reason(self, url: str, reason: str):
+        """记录结束原因，同一会话以第一次记录的原因为准"""
+        session_id = self.active.get(url)
+        if session_id is None:
+            return
+        with self._lock:
+            self._connect().execute(
+                'UPDATE sessions SET exit_reason = ? WHERE id = ? AND exit_reason IS NULL', (reason, session_id))
+
+    def finish(self, url: str, meter=None) -> Optional[str]:
+        """
+        结束会话，未记录结束原因时为 closed
+
+        Args:
+            url: 直播URL
+            meter: 录制的写入统计（metrics.RecordingMeter），提供写入字节数和读取停顿次数
+
+        Returns:
+            结束原因，未开始会话时返回None
+        """
+        session_id = self.active.pop(url, None)
+        if session_id is None:
+            return None
+        size = meter.bytes if meter else 0
+        stalls = meter.stalls if meter else 0
+        ended = time.time()
+        with self._lock:
+            db = self._connect()
+            started, reason = db.execute('SELECT started, exit_reason FROM sessions WHERE id = ?',
+                                         (session_id,)).fetchone()
+            duration = max(ended - started, 0)
+            db.execute(
+                "UPDATE sessions SET ended = ?, duration = ?, bytes = ?, bitrate = ?, stalls = ?, "
+                "exit_reason = COALESCE(exit_reason, 'closed'), pid = NULL WHERE id = ?",
+                (ended, duration, size, size * 8 / duration if duration else None, stalls, session_id))
+        return reason or 'closed'
+
+    @staticmethod
+    def _conditions(platform: Optional[str], user_id: Optional[str], reason: Optional[str],
+                    since: Optional[float], until: Optional[float]):
+        conditions, params = [], []
+        for column, value in (('platform', platform), ('user_id', user_id), ('exit_reason', reason)):
+            if value:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            conditions.append('started >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('started < ?')
+            params.append(until)
+        return (f'WHERE {" AND ".join(conditions)}' if conditions else ''), params
+
+    def query(self, platform: Optional[str] = None, user_id: Optional[str] = None, reason: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, sort: str = 'started',
+              order: str = 'desc', page: int = 1, page_size: int = 100) -> dict:
+        """
+        分页查询会话
+
+        Args:
+            platform: 平台
+            user_id: 房间ID
+            reason: 结束原因，见 EXIT_REASONS，录制中的会话为空
+            since: 开始时间不早于该时间戳
+            until: 开始时间早于该时间戳
+            sort: 排序字段，见 SORT_FIELDS
+            order: asc 或 desc
+            page: 页码，从1开始
+            page_size: 每页数量
+
+        Returns:
+            {'sessions': 当前页的会话, 'count': 符合条件的会话数}
+        """
+        where, params = self._conditions(platform, user_id, reason, since, until)
+        sort = sort if sort in self.SORT_FIELDS else 'started'
+        order = 'ASC' if order.lower() == 'asc' else 'DESC'
+        page, page_size = max(page, 1), min(max(page_size, 1), 1000)
+        with self._lock:
+            db = self._connect()
+            count = db.execute(f'SELECT COUNT(*) FROM sessions {where}', params).fetchone()[0]
+            rows = db.execute(f'SELECT * FROM sessions {where} ORDER BY {sort} {order}, id LIMIT ? OFFSET ?',
+                              [*params, page_size, (page - 1) * page_size]).fetchall()
+        sessions = [{**dict(row), 'outputs': json.loads(row['outputs'])} for row in rows]
+        return {'sessions': sessions, 'count': count}
+
+    def summary(self, group_by: str = 'platform', platform: Optional[str] = None, user_id: Optional[str] = None,
+                reason: Optional[str] = None, since: Optional[float] = None,
+                until: Optional[float] = None) -> List[dict]:
+        """
+        按平台、主播或日期汇总会话数、时长、字节数、平均码率和各结束原因的数量
+
+        Args:
+            group_by: platform、user 或 day（按开始日期，本地时区）
+            其他参数同 query
+        """
+        fields = self.GROUP_FIELDS.get(group_by, self.GROUP_FIELDS['platform'])
+        columns = ', '.join(fields)
+        keys = [field.split(' AS ')[-1] for field in fields]
+        group = ', '.join(keys)
+        where, params = self._conditions(platform, user_id, reason, since, until)
+        with self._lock:
+            db = self._connect()
+            rows = db.execute(
+                f'SELECT {columns}, COUNT(*) AS sessions, COALESCE(SUM(duration), 0) AS duration, '
+                f'COALESCE(SUM(bytes), 0) AS bytes, SUM(stalls) AS stalls, '
+                f'SUM(ended IS NULL) AS recording FROM sessions {where} GROUP BY {group} ORDER BY {group}',
+                params).fetchall()
+            reasons = db.execute(
+                f'SELECT {columns}, exit_reason, COUNT(*) AS count FROM sessions {where} '
+                f'GROUP BY {group}, exit_reason', params).fetchall()
+        result = {}
+        for row in rows:
+            item = dict(row)
+            item['bitrate'] = item['bytes'] * 8 / item['duration'] if item['duration'] else None
+            item['exit_reasons'] = {}
+            result[tuple(row[key] for key in keys)] = item
+        for row in reasons:
+            if row['exit_reason']:
+                result[tuple(row[key] for key in keys)]['exit_reasons'][row['exit_reason']] = row['count']
+        return list(result.values())
+
+# 全局录制会话记录
+sessions = SessionStore()
@@ -0,0 +1,262 @@
+"""磁盘空间管理"""
+
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .catalog import catalog
+from .metrics import Family, metrics
+from .postprocess import postprocess
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 不支持 flock，每个进程都执行清理
+    fcntl = None
+
+MB = 1024 ** 2
+GB = 1024 ** 3
+
+
+class StorageManager:
+    """
+    磁盘空间管理
+
+    - 准入控制：开始录制前按剩余空间和正在进行的录制的写入速度预测 projection_minutes 分钟后的使用率，
+      超过 high_water 时改为录制较低画质（平台支持时），剩余空间将低于 min_free_gb 或主播超出配额且不允许清理时拒绝录制
+    - 清理：后台线程按录制文件索引（不遍历目录）从最旧的文件开始删除，直到使用率回到 high_water 以下、
+      总大小和各主播大小回到配额以内；超过 max_age_days 的文件也会删除。正在录制和等待后处理的文件不会删除。
+      清理默认关闭（evict），多进程模式下通过文件锁只由一个进程执行
+    - 拒绝、降低画质和删除记录保存在内存中，通过 /api/storage 查看
+    """
+
+    DEFAULTS = {
+        'min_free_gb': 5,  # 剩余空间下限，预计低于该值时拒绝录制
+        'high_water': 0.9,  # 磁盘使用率上限，预计超过时降低画质，清理到该值以下
+        'projection_minutes': 30,  # 准入控制预测的时长
+        'default_bitrate_mbps': 8,  # 新录制的预计码率
+        'max_total_gb': 0,  # 所有输出目录的录制文件总大小上限，0表示不限
+        'max_age_days': 0,  # 录制文件保留天数，0表示不限
+        'evict': False,  # 是否自动删除旧录制文件
+        'check_interval': 60,  # 后台检查间隔（秒）
+    }
+    EVICT_BATCH = 20  # 每次从索引中取出的文件数
+    HISTORY = 200  # 保留的决策记录数
+    MERGE_SECONDS = 300  # 同一主播在该时间内的相同决策合并为一条记录
+
+    def __init__(self, lock_file: str = 'data/storage.lock'):
+        self.lock_file = lock_file
+        self.options = dict(self.DEFAULTS)
+        self.directories: List[str] = []
+        self.quotas: Dict[Tuple[str, str], float] = {}  # {(平台, 主播): 配额（GB）}
+        self.decisions: Deque[dict] = deque(maxlen=self.HISTORY)  # 拒绝和降低画质
+        self._last_decision: Dict[Tuple[str, str], dict] = {}
+        self.evictions: Deque[dict] = deque(maxlen=self.HISTORY)
+        self.evicted_bytes = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock_fd: Optional[int] = None
+        self._wakeup = threading.Event()
+
+    def configure(self, config: dict, users: list):
+        """
+        按全局配置 storage 和各主播的 quota_gb 设置，首次调用时启动后台线程
+
+        Args:
+            config: 全局配置
+            users: 主播配置列表
+        """
+        self.options = {**self.DEFAULTS, **(config.get('storage') or {})}
+        directories = {os.path.abspath(config.get('output', 'output'))}
+        self.quotas = {}
+        for user in users:
+            directories.add(os.path.abspath(user.get('output', config.get('output', 'output'))))
+            if user.get('quota_gb'):
+                self.quotas[(user['platform'], user.get('name', user['id']))] = user['quota_gb']
+        self.directories = sorted(directories)
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            catalog.add_directory(directory)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='storage', daemon=True)
+            self._thread.start()
+        self._wakeup.set()
+
+    def check(self, platform: str, streamer: str, output: str) -> str:
+        """
+        录制准入检查
+
+        Args:
+            platform: 平台
+            streamer: 主播名称
+            output: 输出目录
+
+        Returns:
+            ok：正常录制；degrade：降低画质录制；refuse：拒绝录制
+        """
+        try:
+            usage = shutil.disk_usage(output)
+        except OSError:
+            return 'ok'
+        options = self.options
+        horizon = options['projection_minutes'] * 60
+        # 正在进行的录制按最近的写入速度，新录制按预计码率
+        rates = [meter.throughput() for meter in list(metrics.recordings.values())]
+        projected = sum(rates) * horizon + options['default_bitrate_mbps'] * MB / 8 * horizon
+        free_after = usage.free - projected
+        if free_after < options['min_free_gb'] * GB:
+            decision = 'refuse'
+            reason = f'预计剩余空间 {max(free_after, 0) / GB:.1f}GB 低于 {options["min_free_gb"]}GB'
+        elif (quota := self.quotas.get((platform, streamer))) and not options['evict'] and \
+                catalog.usage(platform=platform, streamer=streamer) >= quota * GB:
+            decision = 'refuse'
+            reason = f'已超出配额 {quota}GB'
+        elif (usage.total - free_after) / usage.total > options['high_water']:
+            decision = 'degrade'
+            reason = f'预计磁盘使用率 {(usage.total - free_after) / usage.total:.0%} 超过 {options["high_water"]:.0%}'
+        else:
+            return 'ok'
+        # 录制中的主播每次检测都会检查，相同的决策合并记录
+        now = time.time()
+        last = self._last_decision.get((platform, streamer))
+        if last and last['decision'] == decision and now - last['last'] < self.MERGE_SECONDS:
+            last.update(last=now, count=last['count'] + 1, reason=reason)
+        else:
+            self._last_decision[(platform, streamer)] = item = {
+                'time': now, 'last': now, 'count': 1, 'platform': platform, 'streamer': streamer,
+                'output': output, 'decision': decision, 'reason': reason}
+            self.decisions.append(item)
+        # 空间不足时尽快清理
+        self._wakeup.set()
+        return decision
+
+    def _run(self):
+        """后台清理线程"""
+        while True:
+            self._wakeup.wait(self.options['check_interval'])
+            self._wakeup.clear()
+            if not self.options['evict'] or not self._acquire():
+                continue
+            try:
+                self.evict()
+            except Exception as error:
+                logger.exception(f'清理录制文件失败：{error}')
+
+    def _acquire(self) -> bool:
+        """多进程模式下只由持有文件锁的进程清理"""
+        if fcntl is None or self._lock_fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def evict(self):
+        """按保留天数、使用率、总大小和主播配额删除最旧的录制文件"""
+        options = self.options
+        if options['max_age_days']:
+            before = time.time() - options['max_age_days'] * 86400
+            self._evict_while(lambda: True, 'max_age', before=before)
+        # 同一磁盘上的输出目录一起清理
+        devices: Dict[int, List[str]] = {}
+        for directory in self.directories:
+            try:
+                devices.setdefault(os.stat(directory).st_dev, []).append(directory)
+            except OSError:
+                continue
+        for directories in devices.values():
+            def over_high_water(directory=directories[0]):
+                usage = shutil.disk_usage(directory)
+                return usage.used / usage.total > options['high_water'] or usage.free < options['min_free_gb'] * GB
+            self._evict_while(over_high_water, 'high_water', directories=directories)
+        if options['max_total_gb']:
+            self._evict_while(lambda: catalog.usage(self.directories) > options['max_total_gb'] * GB,
+                              'max_total', directories=self.directories)
+        for (platform, streamer), quota in list(self.quotas.items()):
+            self._evict_while(lambda: catalog.usage(platform=platform, streamer=streamer) > quota * GB,
+                              'quota', platform=platform, streamer=streamer)
+
+    def _evict_while(self, condition, reason: str, directories: Optional[List[str]] = None,
+                     platform: Optional[str] = None, streamer: Optional[str] = None, before: Optional[float] = None):
+        """条件成立时从最旧的文件开始删除，每批从索引中取 EVICT_BATCH 个"""
+        protected = postprocess.pending_files()
+        while condition():
+            candidates = [item for item in catalog.oldest(directories, platform, streamer, before, self.EVICT_BATCH)
+                          if item['path'] not in protected]
+            if not candidates:
+                return
+            for item in candidates:
+                try:
+                    os.remove(item['path'])
+                except FileNotFoundError:
+                    pass
+                except OSError as error:
+                    logger.error(f'删除录制文件失败：{item["path"]}\n{error}')
+                    protected.add(item['path'])
+                    continue
+                finally:
+                    catalog.update(item['path'])
+                self.evicted_bytes += item['size']
+                self.evictions.append({'time': time.time(), 'path': item['path'], 'size': item['size'],
+                                       'reason': reason})
+                logger.info(f'空间清理（{reason}）：已删除 {os.path.basename(item["path"])}，'
+                            f'{item["size"] / MB:.1f}MB')
+                if not condition():
+                    return
+
+    def disks(self) -> List[dict]:
+        """各输出目录的磁盘使用情况"""
+        result = []
+        for directory in self.directories:
+            try:
+                usage = shutil.disk_usage(directory)
+            except OSError:
+                continue
+            result.append({'directory': directory, 'total': usage.total, 'used': usage.used, 'free': usage.free,
+                           'usage': round(usage.used / usage.total, 4),
+                           'recordings_size': catalog.usage([directory])})
+        return result
+
+    def status(self) -> dict:
+        return {
+            'options': self.options,
+            'disks': self.disks(),
+            'quotas': [{'platform': platform, 'streamer': streamer, 'quota_gb': quota,
+                        'used': catalog.usage(platform=platform, streamer=streamer)}
+                       for (platform, streamer), quota in self.quotas.items()],
+            'decisions': list(self.decisions)[::-1],
+            'evictions': list(self.evictions)[::-1],
+            'evicted_bytes': self.evicted_bytes,
+        }
+
+    def metric_families(self) -> List[Family]:
+        """磁盘空间指标"""
+        free = [('live_recorder_disk_free_bytes', {'directory': directory}, shutil.disk_usage(directory).free)
+                for directory in self.directories if os.path.isdir(directory)]
+        decisions: Dict[str, int] = {}
+        for item in list(self.decisions):
+            decisions[item['decision']] = decisions.get(item['decision'], 0) + 1
+        return [
+            {'name': 'live_recorder_disk_free_bytes', 'type': 'gauge', 'help': '输出目录所在磁盘的剩余空间',
+             'samples': free},
+            {'name': 'live_recorder_evicted_bytes_total', 'type': 'counter', 'help': '空间清理删除的字节数',
+             'samples': [('live_recorder_evicted_bytes_total', {}, self.evicted_bytes)]},
+            {'name': 'live_recorder_storage_decisions', 'type': 'gauge',
+             'help': f'最近 {self.HISTORY} 条准入记录中拒绝和降低画质的次数',
+             'samples': [('live_recorder_storage_decisions', {'decision': decision}, count)
+                         for decision, count in decisions.items()]},
+        ]
+
+
+# 全局磁盘空间管理
+storage = StorageManager()
+metrics.gauges.append(storage.metric_families)
@@ -2,5 +2,6 @@
 
 from .logger import setup_logger
 from .file_handler import FileHandler
+from .remux import LiveRemuxOutput
 
-__all__ = ['setup_logger', 'FileHandler']
+__all__ = ['setup_logger', 'FileHandler', 'LiveRemuxOutput']
@@ -1,10 +1,15 @@
 """文件处理工具"""
 
 import os
+import subprocess
 import time
+from typing import Sequence
+
 import ffmpeg
 from loguru import logger
 
+from ..metrics import metrics
+
 
 class FileHandler:
     """文件处理类"""
@@ -41,7 +46,23 @@ class FileHandler:
         return filename
     
     @staticmethod
-    def run_ffmpeg(output_dir: str, filename: str, old_format: str, new_format: str, flag: str):
+    def get_part_filename(filename: str, index: int) -> str:
+        """
+        生成分段录制的文件名
+        
+        Args:
+            filename: 录制文件名（get_filename 生成）
+            index: 分段序号，从1开始
+            
+        Returns:
+            在扩展名前加上分段序号的文件名，如 [时间][平台][主播]标题_part001.flv
+        """
+        name, format = filename.rsplit('.', 1)
+        return f'{name}_part{index:03d}.{format}'
+    
+    @staticmethod
+    def run_ffmpeg(output_dir: str, filename: str, old_format: str, new_format: str, flag: str,
+                   prefix: Sequence[str] = ()):
         """
         使用ffmpeg转换文件格式
         
@@ -51,13 +72,20 @@ class FileHandler:
             old_format: 原格式
             new_format: 新格式
             flag: 平台和主播标识
+            prefix: 命令前缀，如降低进程优先级的nice/ionice
         """
+        if not os.path.exists(f'{output_dir}/{filename}'):
+            raise FileNotFoundError(f'原文件不存在：{output_dir}/{filename}')
         logger.info(f'{flag}开始ffmpeg封装：{filename}')
         new_filename = filename.replace(f'.{old_format}', f'.{new_format}')
-        ffmpeg.input(f'{output_dir}/{filename}').output(
+        started = time.monotonic()
+        # 中断后重新执行时覆盖未完成的输出文件
+        args = ffmpeg.input(f'{output_dir}/{filename}').output(
             f'{output_dir}/{new_filename}',
             codec='copy',
             map_metadata='-1',
             movflags='faststart'
-        ).global_args('-hide_banner').run()
+        ).global_args('-hide_banner').overwrite_output().compile()
+        subprocess.run([*prefix, *args], stdin=subprocess.DEVNULL, check=True)
+        metrics.ffmpeg_seconds.observe(time.monotonic() - started, new_format)
         os.remove(f'{output_dir}/{filename}')
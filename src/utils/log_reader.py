@@ -0,0 +1,188 @@
+"""日志读取"""
+
+import asyncio
+import os
+import re
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+LOG_DIR = Path('logs')
+LEVELS = {'TRACE': 5, 'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+# 日志行开头：[时间][级别]，格式见 setup_logger；不以此开头的行属于上一条日志（如异常堆栈）
+HEADER_PATTERN = re.compile(r'^\[[^\]]*\]\[([A-Z]+)\]')
+
+
+def latest_log_file(log_dir: Path = LOG_DIR) -> Optional[Path]:
+    """最新的日志文件"""
+    if not log_dir.exists():
+        return None
+    log_files = sorted(log_dir.glob('log_*.log'), key=os.path.getmtime, reverse=True)
+    return log_files[0] if log_files else None
+
+
+class LogFilter:
+    """按级别、平台、主播和关键词筛选日志，异常堆栈等后续行跟随所属日志"""
+
+    def __init__(self, level: Optional[str] = None, platform: Optional[str] = None,
+                 streamer: Optional[str] = None, keyword: Optional[str] = None):
+        """
+        Args:
+            level: 最低日志级别，如 WARNING
+            platform: 平台，匹配录制器日志中的 [平台] 标记
+            streamer: 主播名称，匹配 [平台][主播] 标记中的主播
+            keyword: 日志包含的关键词
+        """
+        self.level = LEVELS.get(level.upper(), 0) if level else 0
+        if platform and streamer:
+            self.flag = f'[{platform}][{streamer}]'
+        elif platform:
+            self.flag = f'[{platform}]'
+        elif streamer:
+            self.flag = f'][{streamer}]'
+        else:
+            self.flag = None
+        self.keyword = keyword or None
+        self.matched = True  # 上一条日志是否符合条件，用于顺序读取时的后续行
+
+    def __bool__(self) -> bool:
+        return bool(self.level or self.flag or self.keyword)
+
+    def match_header(self, line: str) -> bool:
+        """日志的第一行是否符合条件"""
+        if self.level:
+            match = HEADER_PATTERN.match(line)
+            if match and LEVELS.get(match.group(1), 0) < self.level:
+                return False
+        if self.flag and self.flag not in line:
+            return False
+        return not self.keyword or self.keyword in line
+
+    def feed(self, line: str) -> bool:
+        """顺序读取时判断一行是否符合条件"""
+        if HEADER_PATTERN.match(line):
+            self.matched = self.match_header(line)
+        return self.matched
+
+
+def _decode(line: bytes) -> str:
+    return line.decode('utf-8', errors='replace').rstrip('\r')
+
+
+def tail_lines(path: Path, lines: int, log_filter: Optional[LogFilter] = None,
+               max_bytes: int = 64 * 1024 * 1024, block_size: int = 64 * 1024,
+               end: Optional[int] = None) -> List[str]:
+    """
+    读取文件末尾的 lines 行
+
+    从文件末尾向前按块读取，读取量与返回的行数成正比，与文件大小无关。有筛选条件时返回最后 lines 个符合条件的行，
+    按条截取（返回的第一行总是日志的第一行），最多向前读取 max_bytes 字节。
+
+    Args:
+        path: 日志文件
+        lines: 行数
+        log_filter: 筛选条件，可选
+        max_bytes: 有筛选条件时最多读取的字节数
+        block_size: 每次读取的块大小
+        end: 从该位置向前读取，默认为文件末尾
+    """
+    if lines <= 0:
+        return []
+    filtering = bool(log_filter)
+    result: List[str] = []  # 倒序
+    pending: List[str] = []  # 尚未找到所属日志第一行的后续行（倒序）
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END) if end is None else end
+        position = end
+        carry = b''
+        skip_last = True  # 文件末尾换行符之后的空串或尚未写完的行
+        while position > 0 and len(result) < lines:
+            if filtering and end - position >= max_bytes:
+                break
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            parts = (f.read(size) + carry).split(b'\n')
+            # 第一段可能不完整，未读到文件开头时留到下一块
+            carry = parts.pop(0) if position > 0 else b''
+            for raw in reversed(parts):
+                if skip_last:
+                    skip_last = False
+                    continue
+                if _collect(_decode(raw), log_filter if filtering else None, result, pending) >= lines:
+                    break
+    result.reverse()
+    if len(result) <= lines:
+        return result
+    if not filtering:
+        return result[-lines:]
+    # 按条截取，不返回缺少第一行的异常堆栈等后续行
+    trimmed = result[-lines:]
+    for index, line in enumerate(trimmed):
+        if HEADER_PATTERN.match(line):
+            return trimmed[index:]
+    # 最后一条日志超过 lines 行时返回其第一行和最后 lines - 1 行
+    header = next(line for line in reversed(result[:-lines]) if HEADER_PATTERN.match(line))
+    return [header] + trimmed[1 - lines:] if lines > 1 else [header]
+
+
+def _collect(line: str, log_filter: Optional[LogFilter], result: List[str], pending: List[str]) -> int:
+    """倒序读取时处理一行，返回已收集的行数"""
+    if log_filter is None:
+        result.append(line)
+    elif not HEADER_PATTERN.match(line):
+        pending.append(line)
+    else:
+        if log_filter.match_header(line):
+            result.extend(pending)
+            result.append(line)
+        pending.clear()
+    return len(result)
+
+
+async def follow_log(log_filter: Optional[LogFilter] = None, path: Optional[Path] = None, offset: Optional[int] = None,
+                     interval: float = 0.5, log_dir: Path = LOG_DIR,
+                     max_read: int = 1024 * 1024) -> AsyncIterator[List[str]]:
+    """
+    从最新日志文件的当前末尾开始，产出之后写入的日志行（每次产出一批）
+
+    日志按天轮转后自动切换到新文件。多进程模式下所有进程写入同一个日志文件，因此能看到所有工作进程的日志。
+
+    Args:
+        log_filter: 筛选条件，可选
+        path: 日志文件，默认为最新的日志文件
+        offset: 开始读取的位置，默认为文件当前末尾
+        interval: 检查新日志的间隔（秒）
+        log_dir: 日志目录
+        max_read: 每次最多读取的字节数
+    """
+    log_filter = log_filter or LogFilter()
+    path = path or latest_log_file(log_dir)
+    if offset is None:
+        offset = path.stat().st_size if path else 0
+    carry = b''
+    while True:
+        await asyncio.sleep(interval)
+        latest = latest_log_file(log_dir)
+        if latest != path:
+            path, offset, carry = latest, 0, b''
+        if path is None:
+            continue
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            path = None
+            continue
+        if size < offset:
+            # 文件被截断
+            offset, carry = 0, b''
+        if size == offset:
+            continue
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(min(size - offset, max_read))
+        offset += len(data)
+        parts = (carry + data).split(b'\n')
+        carry = parts.pop()
+        batch = [line for line in map(_decode, parts) if log_filter.feed(line)]
+        if batch:
+            yield batch
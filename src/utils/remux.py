@@ -0,0 +1,78 @@
+"""边录边封装"""
+
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+from loguru import logger
+
+
+class LiveRemuxOutput:
+    """
+    将直播流通过管道写入ffmpeg，录制的同时封装为目标格式
+
+    MP4/MOV 输出为分片格式，录制过程中文件即可播放，不产生原始格式的临时文件，也不需要录制结束后再转换。
+    接口与 streamlink_cli 的 FileOutput 一致（open/write/close），close 可在任意线程调用。
+    """
+
+    # 需要分片写入才能边录边播放的格式
+    FRAGMENTED_FORMATS = ('mp4', 'mov', 'm4a')
+    CLOSE_TIMEOUT = 30  # 关闭输入后等待ffmpeg结束的时间（秒）
+
+    def __init__(self, path: Path, format: str, record=None):
+        """
+        Args:
+            path: 输出文件路径
+            format: 目标格式
+            record: 同时接收写入数据的对象（如写入统计），可选
+        """
+        self.path = path
+        self.format = format
+        self.record = record
+        self.process: Optional[subprocess.Popen] = None
+        self.opened = False
+        self._lock = threading.Lock()
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        options = {'codec': 'copy', 'map_metadata': '-1'}
+        if self.format in self.FRAGMENTED_FORMATS:
+            options['movflags'] = 'frag_keyframe+empty_moov+default_base_moof'
+        self.process = ffmpeg.input('pipe:').output(str(self.path), **options).global_args(
+            '-hide_banner', '-loglevel', 'warning').overwrite_output().run_async(pipe_stdin=True)
+        if self.record:
+            self.record.open()
+        self.opened = True
+
+    def write(self, data: bytes):
+        """写入ffmpeg输入，关闭后的写入（如停止录制时读取线程的最后一块数据）被忽略"""
+        with self._lock:
+            if not self.opened:
+                if self.process is None:
+                    raise OSError('Output is not opened')
+                return
+            self.process.stdin.write(data)
+            if self.record:
+                self.record.write(data)
+
+    def close(self):
+        """关闭ffmpeg输入并等待其写完文件"""
+        with self._lock:
+            if not self.opened:
+                return
+            self.opened = False
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+        try:
+            code = self.process.wait(self.CLOSE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            code = self.process.wait()
+        if code:
+            logger.error(f'ffmpeg边录边封装异常退出（{code}）：{self.path}')
+        if self.record:
+            self.record.close()
@@ -0,0 +1,144 @@
+"""录制文件修复"""
+
+import struct
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+FLV_TAG_TYPES = (8, 9, 18)
+TS_PACKET = 188
+MP4_FORMATS = ('mp4', 'mov', 'm4a')
+
+
+def repair_file(path: Path, format: str, start: int = 0) -> Optional[dict]:
+    """
+    将意外中断的录制文件截断到最后一个完整的标签、包或box，不重写整个文件
+
+    Args:
+        path: 录制文件
+        format: 文件格式
+        start: 已知的完整边界（录制日志中的检查点），FLV从此处开始检查，之前的数据视为完整
+
+    Returns:
+        {'size': 修复后的大小, 'truncated': 截掉的字节数, ...}，不支持的格式返回None
+    """
+    if format == 'flv':
+        return repair_flv(path, start)
+    if format == 'ts':
+        return repair_ts(path)
+    if format in MP4_FORMATS:
+        return repair_mp4(path)
+    return None
+
+
+def _truncate(f: BinaryIO, size: int, end: int) -> dict:
+    if end < size:
+        f.truncate(end)
+    return {'size': end, 'truncated': size - end}
+
+
+def repair_flv(path: Path, start: int = 0) -> dict:
+    """
+    截断到最后一个完整的FLV标签，并原地修正文件头的音视频标记和 onMetaData 中的 duration、filesize
+
+    onMetaData 中没有这两项时不修改（添加需要重写整个文件）。
+    """
+    with open(path, 'r+b') as f:
+        size = f.seek(0, 2)
+        f.seek(0)
+        header = f.read(9)
+        if len(header) < 9 or header[:3] != b'FLV':
+            return _truncate(f, size, 0)
+        first = int.from_bytes(header[5:9], 'big') + 4
+        pos = start if first <= start <= size else first
+        while pos + 11 <= size:
+            f.seek(pos)
+            head = f.read(11)
+            data_size = int.from_bytes(head[1:4], 'big')
+            end = pos + 15 + data_size
+            if head[0] & 0x1f not in FLV_TAG_TYPES or end > size:
+                break
+            f.seek(end - 4)
+            if int.from_bytes(f.read(4), 'big') != 11 + data_size:
+                break
+            pos = end
+        result = _truncate(f, size, pos)
+        result['metadata'] = _fix_flv_metadata(f, first, pos)
+        return result
+
+
+def _flv_timestamp(head: bytes) -> int:
+    return head[4] << 16 | head[5] << 8 | head[6] | head[7] << 24
+
+
+def _fix_flv_metadata(f: BinaryIO, first: int, end: int) -> bool:
+    """修正文件头标记和 onMetaData，返回是否修改了 onMetaData"""
+    if end <= first:
+        return False
+    # 最后一个标签的时间戳，通过末尾的 PreviousTagSize 定位
+    f.seek(end - 4)
+    f.seek(end - 4 - int.from_bytes(f.read(4), 'big'))
+    last_timestamp = _flv_timestamp(f.read(11))
+    # 开头的标签：onMetaData、第一个时间戳、是否有音频和视频
+    flags = 0
+    metadata = None
+    first_timestamp = None
+    pos = first
+    for _ in range(32):
+        if pos + 11 > end:
+            break
+        f.seek(pos)
+        head = f.read(11)
+        tag_type, data_size = head[0] & 0x1f, int.from_bytes(head[1:4], 'big')
+        if tag_type == 18 and metadata is None:
+            metadata = (pos + 11, f.read(data_size))
+        elif tag_type in (8, 9):
+            flags |= 0x04 if tag_type == 8 else 0x01
+            if first_timestamp is None:
+                first_timestamp = _flv_timestamp(head)
+        pos += 15 + data_size
+    if flags:
+        f.seek(4)
+        f.write(bytes([flags]))
+    if metadata is None:
+        return False
+    offset, data = metadata
+    values = {b'duration': max(last_timestamp - (first_timestamp or 0), 0) / 1000, b'filesize': float(end)}
+    changed = False
+    for key, value in values.items():
+        index = data.find(len(key).to_bytes(2, 'big') + key + b'\x00')
+        if index >= 0:
+            f.seek(offset + index + len(key) + 3)
+            f.write(struct.pack('>d', value))
+            changed = True
+    return changed
+
+
+def repair_ts(path: Path) -> dict:
+    """截断到最后一个完整的TS包"""
+    with open(path, 'r+b') as f:
+        size = f.seek(0, 2)
+        return _truncate(f, size, size - size % TS_PACKET)
+
+
+def repair_mp4(path: Path) -> dict:
+    """
+    截断边录边封装生成的分片MP4（frag_keyframe+empty_moov）到最后一个完整的分片
+
+    逐个检查顶层box，只读取box头。最后一个完整的moof之后没有完整的mdat时一起截掉。
+    """
+    with open(path, 'r+b') as f:
+        size = f.seek(0, 2)
+        pos = good = 0
+        while pos + 8 <= size:
+            f.seek(pos)
+            box_size, box_type = int.from_bytes(f.read(4), 'big'), f.read(4)
+            if box_size == 1:
+                box_size = int.from_bytes(f.read(8), 'big')
+            elif box_size == 0:
+                box_size = size - pos
+            if box_size < 8 or pos + box_size > size:
+                break
+            pos += box_size
+            if box_type != b'moof':
+                good = pos
+        return _truncate(f, size, good)
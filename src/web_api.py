@@ -1,6 +1,8 @@
 """Web API服务器"""
 
 import asyncio
+import contextlib
+import functools
 import json
 import os
 from datetime import datetime
@@ -9,21 +11,29 @@ from typing import Dict, List, Optional
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse
 from pydantic import BaseModel
 import uvicorn
 
+from .catalog import catalog
 from .config import Config
+from .events import bus
+from .executor import capacity
+from .http_pool import http_pool
+from .metrics import metrics, render
 from .platforms import PLATFORMS
+from .postprocess import postprocess
+from .rate_limiter import rate_limiter
+from .registry import RoomKey, recorders, recordings
+from .sessions import EXIT_REASONS, sessions
+from .storage import storage
+from .utils.log_reader import LogFilter, follow_log, latest_log_file, tail_lines
 
 # 全局变量
 app = FastAPI(title="LiveRecorder Web管理界面", version="1.0.0")
-recording_status: Dict = {}  # 录制状态
-recorder_tasks: Dict = {}  # 录制任务
-ws_connections: List[WebSocket] = []  # WebSocket连接
 
-# 共享的recording字典（将由main_web.py注入）
-_shared_recording: Dict = {}
+# 多进程模式下的控制进程（将由app.py注入）
+_cluster = None
 
 # 配置静态文件服务
 from pathlib import Path as PathLib
@@ -43,62 +53,72 @@ class UserConfig(BaseModel):
     proxy: Optional[str] = None
     headers: Optional[dict] = None
     cookies: Optional[str] = None
+    engine: Optional[str] = None
+    live_remux: Optional[bool] = None
+    postprocess_priority: Optional[int] = 0
+    segment_minutes: Optional[float] = None
+    segment_gb: Optional[float] = None
+    quota_gb: Optional[float] = None
+
+
+class RecorderSelection(BaseModel):
+    """批量操作的主播：keys 为 [平台, 房间ID] 列表，未指定时选择 platform 平台的全部主播，都未指定时选择全部主播"""
+    keys: Optional[List[List[str]]] = None
+    platform: Optional[str] = None
 
 
 class GlobalConfig(BaseModel):
     """全局配置模型"""
     proxy: Optional[str] = None
     output: Optional[str] = "output"
+    batch_poll: Optional[bool] = True
+    adaptive_poll: Optional[bool] = True
+    rate_limit: Optional[dict] = None
+    max_recordings: Optional[int] = 64
+    postprocess_workers: Optional[int] = 2
+    postprocess_nice: Optional[int] = 10
+    postprocess_ionice: Optional[List[int]] = None
+    engine: Optional[str] = "streamlink"
+    platform_engine: Optional[dict] = None
+    live_remux: Optional[bool] = False
+    segment_minutes: Optional[float] = 0
+    segment_gb: Optional[float] = 0
+    file_writer: Optional[dict] = None
+    storage: Optional[dict] = None
+
+
+def set_cluster(cluster):
+    """设置多进程模式的控制进程，录制状态和停止录制由其汇总和转发"""
+    global _cluster
+    _cluster = cluster
 
 
-# WebSocket管理
-class ConnectionManager:
-    """WebSocket连接管理器"""
-    
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-    
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-    
-    async def broadcast(self, message: dict):
-        """广播消息给所有连接的客户端"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-
-
-manager = ConnectionManager()
+def get_recording_count() -> int:
+    """获取当前正在录制的数量"""
+    if _cluster:
+        return len(_cluster.recording_info())
+    return len(recordings)
 
 
-def set_shared_recording(recording_dict: Dict):
-    """设置共享的recording字典"""
-    global _shared_recording
-    _shared_recording = recording_dict
+def get_recorder_keys() -> List[RoomKey]:
+    """所有主播的 (平台, 房间ID)"""
+    if _cluster:
+        return list(_cluster.users)
+    return recorders.keys()
 
 
-def get_recording_count() -> int:
-    """获取当前正在录制的数量"""
-    return len(_shared_recording)
+def control_recorders(action: str, keys: List[RoomKey]) -> Dict[RoomKey, Optional[int]]:
+    """启动、停止或暂停录制器，多进程模式下转发给主播所在的工作进程，结果见 RecorderRegistry.control"""
+    if _cluster:
+        return _cluster.control(action, keys)
+    return recorders.control(action, keys)
 
 
 def get_recording_info() -> Dict:
-    """获取录制详细信息"""
-    info = {}
-    for url, (stream_fd, output) in _shared_recording.items():
-        # 从URL提取平台和用户信息
-        info[url] = {
-            "url": url,
-            "recording": True,
-            "timestamp": datetime.now().isoformat()
-        }
-    return info
+    """获取录制详细信息：主播、当前录制文件和写入统计（字节数、码率、距上次写入的时间、停顿和分片数）"""
+    if _cluster:
+        return {url: {"url": url, "recording": True, **item} for url, item in _cluster.recording_info().items()}
+    return {item.url: {**item.info(), "recording": True} for item in recordings.snapshot()}
 
 
 # API路由
@@ -121,11 +141,22 @@ async def get_status():
     return {
         "recording": recording_info,
         "recording_count": get_recording_count(),
-        "tasks": len(recorder_tasks),
+        "streamers": bus.export(),
+        "tasks": len(get_recorder_keys()),
         "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/api/recordings/{platform}/{user_id}")
+async def get_recording(platform: str, user_id: str):
+    """指定主播正在进行的录制及其写入统计"""
+    items = [item for item in get_recording_info().values()
+             if item["platform"] == platform and item["user_id"] == user_id]
+    if not items:
+        raise HTTPException(status_code=404, detail=f"{platform}/{user_id} 当前没有正在进行的录制")
+    return {"platform": platform, "user_id": user_id, "recordings": items}
+
+
 @app.get("/api/config")
 async def get_config():
     """获取当前配置"""
@@ -145,7 +176,7 @@ async def update_config(config: dict):
     try:
         web_config = Config('web_config.json')
         if web_config.save(config):
-            return {"status": "success", "message": "配置已保存，请重启服务生效"}
+            return {"status": "success", "message": "配置已保存，将自动生效"}
         else:
             raise HTTPException(status_code=500, detail="保存失败")
     except Exception as e:
@@ -161,168 +192,273 @@ async def get_platforms():
     }
 
 
+@app.get("/api/http_pool")
+async def get_http_pool():
+    """获取共享HTTP客户端池统计"""
+    return http_pool.stats()
+
+
+@app.get("/api/rate_limit")
+async def get_rate_limit():
+    """获取各域名的请求限速统计，多进程模式下汇总各工作进程的统计"""
+    if _cluster:
+        return _cluster.rate_limit_stats()
+    return rate_limiter.stats()
+
+
+@app.get("/api/capacity")
+async def get_capacity():
+    """获取录制线程池的占用情况，多进程模式下汇总各工作进程的占用情况"""
+    if _cluster:
+        return _cluster.capacity_stats()
+    return capacity.stats()
+
+
+@app.get("/api/postprocess")
+async def get_postprocess(status: Optional[str] = None, limit: int = 100):
+    """获取后处理任务，默认返回排队中、执行中和失败的任务，多进程模式下各工作进程共享任务数据库"""
+    stats = postprocess.stats()
+    if _cluster:
+        stats["workers"] = _cluster.postprocess_workers()
+    return {"stats": stats, "jobs": postprocess.jobs(status, limit)}
+
+
+@app.post("/api/postprocess/{job_id}/retry")
+async def retry_postprocess(job_id: int):
+    """重新执行失败的后处理任务"""
+    if not postprocess.retry(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在或未失败")
+    return {"success": True, "message": f"任务 #{job_id} 已重新排队"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus格式的运行指标，多进程模式下汇总各工作进程的指标"""
+    if _cluster:
+        return render(_cluster.metrics_families(), _cluster.worker_metrics())
+    return render(metrics.collect())
+
+
 @app.get("/api/files")
-async def get_files(output_dir: str = None):
-    """获取录制文件列表"""
+async def get_files(output_dir: str = None, platform: str = None, streamer: str = None, keyword: str = None,
+                    sort: str = 'modified', order: str = 'desc', page: int = 1, page_size: int = 100):
+    """获取录制文件列表（分页、排序、按平台和主播筛选），数据来自录制文件索引"""
     try:
-        # 如果没有指定输出目录，从配置中获取
-        if not output_dir:
-            config = Config('web_config.json')
-            output_dir = config.get_global_config().get('output', 'output')
-        
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-            return {"files": [], "count": 0, "total_size_mb": 0, "output_dir": output_dir}
-        
-        files = []
-        for file in os.listdir(output_dir):
-            file_path = os.path.join(output_dir, file)
-            if os.path.isfile(file_path):
-                stat = os.stat(file_path)
-                files.append({
-                    "name": file,
-                    "size": stat.st_size,
-                    "size_mb": round(stat.st_size / 1024 / 1024, 2),
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
-                })
-        
-        # 按修改时间倒序排列
-        files.sort(key=lambda x: x['modified'], reverse=True)
-        
+        config = Config('web_config.json')
+        global_output = config.get_global_config().get('output', 'output')
+        # 登记全局和各用户的输出目录，已登记的目录不会重复扫描
+        for directory in [global_output, *(user.get('output') for user in config.get_users())]:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                catalog.add_directory(directory)
+
+        # 未指定目录时查询全局输出目录
+        output_dir = output_dir or global_output
+        os.makedirs(output_dir, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, functools.partial(
+            catalog.query, output_dir, platform, streamer, keyword, sort, order, page, page_size))
         return {
-            "files": files,
-            "count": len(files),
-            "total_size_mb": round(sum(f['size'] for f in files) / 1024 / 1024, 2),
-            "output_dir": output_dir
+            "files": result['files'],
+            "count": result['count'],
+            "total_size_mb": round(result['total_size'] / 1024 / 1024, 2),
+            "output_dir": output_dir,
+            "page": max(page, 1),
+            "page_size": page_size
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sessions")
+async def get_sessions(platform: str = None, user_id: str = None, reason: str = None, since: float = None,
+                       until: float = None, sort: str = 'started', order: str = 'desc', page: int = 1,
+                       page_size: int = 100):
+    """查询录制会话（分页），since/until 为开始时间的Unix时间戳"""
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, functools.partial(
+        sessions.query, platform, user_id, reason, since, until, sort, order, page, page_size))
+    return {**result, "page": max(page, 1), "page_size": page_size}
+
+
+@app.get("/api/sessions/summary")
+async def get_sessions_summary(group_by: str = 'platform', platform: str = None, user_id: str = None,
+                               reason: str = None, since: float = None, until: float = None):
+    """按平台（platform）、主播（user）或日期（day）汇总录制会话"""
+    loop = asyncio.get_running_loop()
+    groups = await loop.run_in_executor(None, functools.partial(
+        sessions.summary, group_by, platform, user_id, reason, since, until))
+    return {"group_by": group_by, "groups": groups, "exit_reasons": EXIT_REASONS}
+
+
+@app.get("/api/storage")
+async def get_storage():
+    """磁盘空间、配额使用情况，以及最近的拒绝录制、降低画质和清理记录，多进程模式下汇总各工作进程的状态"""
+    if _cluster:
+        return _cluster.storage_status()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, storage.status)
+
+
 @app.get("/api/logs")
-async def get_logs(lines: int = 100):
-    """获取最新日志"""
+async def get_logs(lines: int = 100, level: str = None, platform: str = None, streamer: str = None,
+                   keyword: str = None):
+    """获取最新日志的最后几行，可按级别、平台、主播和关键词筛选"""
     try:
-        log_dir = Path("logs")
-        if not log_dir.exists():
-            return {"logs": []}
-        
-        # 获取最新的日志文件
-        log_files = sorted(log_dir.glob("log_*.log"), key=os.path.getmtime, reverse=True)
-        if not log_files:
+        latest_log = latest_log_file()
+        if latest_log is None:
             return {"logs": []}
-        
-        latest_log = log_files[0]
-        with open(latest_log, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-            recent_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-        
+
+        log_filter = LogFilter(level, platform, streamer, keyword)
+        loop = asyncio.get_running_loop()
+        recent_lines = await loop.run_in_executor(None, tail_lines, latest_log, min(lines, 10000), log_filter)
+
         return {
             "logs": [line.strip() for line in recent_lines],
             "file": latest_log.name,
-            "total_lines": len(all_lines)
+            "size": latest_log.stat().st_size
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/recorders")
+async def get_recorders():
+    """所有录制器的状态：是否暂停和正在进行的录制"""
+    if _cluster:
+        recording = get_recording_info()
+        return {"recorders": [
+            {"platform": platform, "user_id": user_id, "name": user.get("name", user_id),
+             "paused": (platform, user_id) in _cluster.paused, "worker": _cluster.assignment.get((platform, user_id)),
+             "recordings": [item for item in recording.values()
+                            if item["platform"] == platform and item["user_id"] == user_id]}
+            for (platform, user_id), user in list(_cluster.users.items())]}
+    return {"recorders": recorders.describe()}
+
+
+@app.post("/api/recorders/{action}")
+async def control_recorders_bulk(action: str, selection: RecorderSelection):
+    """批量启动（start）、停止（stop）或暂停（pause）录制器"""
+    if action not in recorders.ACTIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的操作: {action}")
+    if selection.keys is not None:
+        keys = [tuple(key) for key in selection.keys if len(key) == 2]
+    else:
+        keys = [key for key in get_recorder_keys() if selection.platform in (None, key[0])]
+    results = control_recorders(action, keys)
+    return {
+        "action": action,
+        "count": sum(1 for result in results.values() if result is not None),
+        "stopped_recordings": sum(result or 0 for result in results.values()) if action == "stop" else 0,
+        "not_found": [list(key) for key, result in results.items() if result is None],
+    }
+
+
 @app.post("/api/start_recording/{platform}/{user_id}")
 async def start_recording(platform: str, user_id: str):
-    """手动启动录制"""
-    try:
-        # TODO: 实现手动启动录制逻辑
-        # 目前录制是自动进行的，此接口暂时只返回成功
-        return {"status": "success", "message": f"已启动 {platform}/{user_id} 的录制"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """恢复检测并立即检测一次直播状态，开播时开始录制"""
+    if control_recorders("start", [(platform, user_id)])[(platform, user_id)] is None:
+        raise HTTPException(status_code=404, detail=f"未找到主播 {platform}/{user_id}")
+    return {"status": "success", "message": f"已启动 {platform}/{user_id} 的录制，正在检测直播状态"}
+
+
+@app.post("/api/pause_recording/{platform}/{user_id}")
+async def pause_recording(platform: str, user_id: str):
+    """暂停检测，不再开始新的录制，正在进行的录制继续"""
+    if control_recorders("pause", [(platform, user_id)])[(platform, user_id)] is None:
+        raise HTTPException(status_code=404, detail=f"未找到主播 {platform}/{user_id}")
+    return {"status": "success", "message": f"已暂停 {platform}/{user_id} 的检测"}
 
 
 @app.post("/api/stop_recording/{platform}/{user_id}")
 async def stop_recording(platform: str, user_id: str):
-    """手动停止录制"""
-    try:
-        from loguru import logger
-        
-        # 查找并关闭对应的录制流
-        stopped_count = 0
-        urls_to_remove = []
-        
-        # 遍历所有正在录制的流
-        for url, (stream_fd, output) in list(_shared_recording.items()):
-            # 检查URL是否匹配平台和用户ID
-            if f"/{user_id}" in url or f"={user_id}" in url or url.endswith(user_id):
-                try:
-                    logger.info(f"正在停止录制: {url}")
-                    # 关闭流
-                    if hasattr(stream_fd, 'close'):
-                        stream_fd.close()
-                    # 关闭输出
-                    if hasattr(output, 'close'):
-                        output.close()
-                    urls_to_remove.append(url)
-                    stopped_count += 1
-                except Exception as e:
-                    logger.error(f"关闭流时出错: {e}")
-        
-        # 从字典中移除已停止的录制
-        for url in urls_to_remove:
-            _shared_recording.pop(url, None)
-            logger.info(f"已从录制列表中移除: {url}")
-        
-        if stopped_count > 0:
-            return {
-                "status": "success", 
-                "message": f"已停止 {stopped_count} 个 {platform}/{user_id} 的录制流"
-            }
-        else:
-            return {
-                "status": "info",
-                "message": f"{platform}/{user_id} 当前没有正在录制的流"
-            }
-    except Exception as e:
-        logger.exception(f"停止录制失败: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    """停止正在进行的录制并暂停检测，直到手动启动"""
+    stopped_count = control_recorders("stop", [(platform, user_id)])[(platform, user_id)]
+    if stopped_count is None:
+        raise HTTPException(status_code=404, detail=f"未找到主播 {platform}/{user_id}")
+    if stopped_count > 0:
+        return {
+            "status": "success",
+            "message": f"已停止 {stopped_count} 个 {platform}/{user_id} 的录制流"
+        }
+    return {
+        "status": "info",
+        "message": f"{platform}/{user_id} 当前没有正在录制的流，已暂停检测"
+    }
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket端点，用于实时更新"""
-    await manager.connect(websocket)
-    try:
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[int] = None):
+    """
+    录制状态推送，状态来自录制器事件总线
+
+    连接后先发送完整快照（{"type": "snapshot", "epoch", "seq", "states"}）；重连时传入快照的 epoch 和已收到的最后一条增量的
+    序号 since，只补发之后的增量。之后推送合并后的增量（{"type": "delta", "seq", "changes": {平台_房间ID: 状态，删除的主播为null}}）。
+    客户端发现序号不连续时发送 {"type": "resync", "epoch", "since"} 重新同步，其他消息（如心跳）忽略。
+    """
+    await websocket.accept()
+    subscriber = bus.subscribe(since, epoch)
+
+    async def push():
         while True:
-            # 接收客户端消息（保持连接）
-            data = await websocket.receive_text()
-            
-            # 发送当前状态
-            await websocket.send_json({
-                "type": "status_update",
-                "data": {
-                    "recording": recording_status,
-                    "timestamp": datetime.now().isoformat()
-                }
-            })
-    except WebSocketDisconnect:
-        manager.disconnect(websocket)
-
-
-# 状态更新函数（供主程序调用）
-async def update_recording_status(platform: str, user_id: str, status: str, info: dict = None):
-    """更新录制状态并广播"""
-    key = f"{platform}_{user_id}"
-    recording_status[key] = {
-        "platform": platform,
-        "user_id": user_id,
-        "status": status,
-        "info": info or {},
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # 广播更新
-    await manager.broadcast({
-        "type": "status_update",
-        "data": recording_status
-    })
+            await websocket.send_text(await subscriber.get())
+
+    pusher = asyncio.ensure_future(push())
+    try:
+        while (message := await websocket.receive())['type'] != 'websocket.disconnect':
+            try:
+                data = json.loads(message.get('text') or '')
+            except ValueError:
+                continue
+            if isinstance(data, dict) and data.get('type') == 'resync':
+                since = data.get('since')
+                subscriber.resync(since if isinstance(since, int) else None, data.get('epoch'))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        pusher.cancel()
+        bus.unsubscribe(subscriber)
+
+
+@app.websocket("/ws/logs")
+async def log_stream(websocket: WebSocket, lines: int = 100, level: str = None, platform: str = None,
+                     streamer: str = None, keyword: str = None):
+    """实时日志，先发送最后几行，之后推送新写入的日志，筛选在服务端完成"""
+    await websocket.accept()
+    try:
+        # 以同一位置为界发送最后几行和之后的新日志，不重复也不遗漏
+        latest_log = latest_log_file()
+        offset = latest_log.stat().st_size if latest_log else 0
+        if latest_log is not None:
+            loop = asyncio.get_running_loop()
+            recent_lines = await loop.run_in_executor(None, functools.partial(
+                tail_lines, latest_log, min(lines, 10000), LogFilter(level, platform, streamer, keyword), end=offset))
+            await websocket.send_json({"type": "logs", "reset": True, "logs": recent_lines})
+
+        async def push():
+            async for batch in follow_log(LogFilter(level, platform, streamer, keyword), latest_log, offset):
+                await websocket.send_json({"type": "logs", "logs": batch})
+
+        pusher = asyncio.ensure_future(push())
+        try:
+            # 客户端断开后停止推送，客户端发送的消息（如心跳）忽略
+            while (await websocket.receive())['type'] != 'websocket.disconnect':
+                pass
+        finally:
+            pusher.cancel()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+class EmbeddedServer(uvicorn.Server):
+    """与录制器运行在同一个事件循环中的Web服务，退出信号由调用方处理（先停止录制器再退出）"""
+
+    def install_signal_handlers(self):
+        pass
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
 
 
 def run_web_server(host: str = "0.0.0.0", port: int = 8000):
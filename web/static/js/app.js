@@ -6,6 +6,11 @@ createApp({
             currentTab: 'status',
             wsConnected: false,
             ws: null,
+            logWs: null,
+            heartbeat: null,
+            statusEpoch: null,
+            statusSeq: null,
+            resyncing: false,
             config: {
                 global: {
                     proxy: null,
@@ -44,48 +49,76 @@ createApp({
         this.loadConfig();
         this.loadPlatforms();
         this.loadFiles();
-        this.loadLogs();
         this.connectWebSocket();
+        this.connectLogStream();
         
-        // 定时刷新数据
+        // 定时刷新数据（日志由服务端推送）
         setInterval(() => {
             this.loadFiles();
-            this.loadLogs();
         }, 10000); // 每10秒刷新一次
     },
     methods: {
-        // WebSocket连接
+        // 录制状态推送：连接后收到完整快照，之后只收到变化的主播（增量），不再轮询
         connectWebSocket() {
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-            const wsUrl = `${protocol}//${window.location.host}/ws`;
+            // 重连时带上已收到的最后一条增量的序号，服务端只补发缺失的增量
+            const since = this.statusSeq === null ? '' : `?epoch=${this.statusEpoch}&since=${this.statusSeq}`;
+            const wsUrl = `${protocol}//${window.location.host}/ws${since}`;
             
             this.ws = new WebSocket(wsUrl);
             
             this.ws.onopen = () => {
                 this.wsConnected = true;
+                this.resyncing = false;
                 console.log('WebSocket connected');
-                // 发送心跳并更新状态
-                setInterval(() => {
+                // 发送心跳
+                clearInterval(this.heartbeat);
+                this.heartbeat = setInterval(() => {
                     if (this.ws.readyState === WebSocket.OPEN) {
                         this.ws.send('ping');
                     }
                 }, 30000);
-                
-                // 定期从API获取状态
-                this.loadStatus();
-                setInterval(() => this.loadStatus(), 5000);
             };
             
             this.ws.onmessage = (event) => {
                 const data = JSON.parse(event.data);
-                if (data.type === 'status_update') {
-                    this.recordingStatus = data.data.recording || data.data;
-                    this.updateStats();
+                if (data.type === 'snapshot') {
+                    this.recordingStatus = data.states;
+                    this.statusEpoch = data.epoch;
+                    this.statusSeq = data.seq;
+                    this.resyncing = false;
+                } else if (data.type === 'delta') {
+                    if (this.statusSeq !== null && data.seq <= this.statusSeq) {
+                        return;
+                    }
+                    if (this.statusSeq === null || data.seq !== this.statusSeq + 1) {
+                        // 序号不连续，请求补发缺失的增量
+                        if (!this.resyncing) {
+                            this.resyncing = true;
+                            this.ws.send(JSON.stringify({type: 'resync', epoch: this.statusEpoch, since: this.statusSeq}));
+                        }
+                        return;
+                    }
+                    const status = { ...this.recordingStatus };
+                    for (const [key, state] of Object.entries(data.changes)) {
+                        if (state === null) {
+                            delete status[key];
+                        } else {
+                            status[key] = state;
+                        }
+                    }
+                    this.recordingStatus = status;
+                    this.statusSeq = data.seq;
+                    this.resyncing = false;
+                } else {
+                    return;
                 }
+                this.updateStats();
             };
             
             this.ws.onclose = () => {
                 this.wsConnected = false;
+                clearInterval(this.heartbeat);
                 console.log('WebSocket disconnected, reconnecting...');
                 // 5秒后重连
                 setTimeout(() => this.connectWebSocket(), 5000);
@@ -96,16 +129,36 @@ createApp({
             };
         },
         
-        // 加载录制状态
-        async loadStatus() {
-            try {
-                const response = await axios.get('/api/status');
-                if (response.data.recording_count !== undefined) {
-                    this.stats.recording = response.data.recording_count;
+        // 实时日志：连接后先收到最后100行，之后服务端推送新日志
+        connectLogStream() {
+            const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+            this.logWs = new WebSocket(`${protocol}//${window.location.host}/ws/logs?lines=100`);
+            
+            this.logWs.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+                if (data.type !== 'logs') {
+                    return;
                 }
-                this.recordingStatus = response.data.recording || {};
-            } catch (error) {
-                console.error('加载状态失败:', error);
+                const logs = data.reset ? data.logs : this.logs.concat(data.logs);
+                this.logs = logs.slice(-1000);
+                this.scrollLogs();
+            };
+            
+            this.logWs.onclose = () => {
+                // 5秒后重连
+                setTimeout(() => this.connectLogStream(), 5000);
+            };
+        },
+        
+        // 日志自动滚动到底部
+        scrollLogs() {
+            if (this.autoScroll) {
+                this.$nextTick(() => {
+                    const container = this.$refs.logContainer;
+                    if (container) {
+                        container.scrollTop = container.scrollHeight;
+                    }
+                });
             }
         },
         
@@ -132,7 +185,7 @@ createApp({
                     user: this.config.users
                 };
                 await axios.post('/api/config', configData);
-                this.showNotification('配置保存成功！需要重启程序生效', 'success');
+                this.showNotification('配置保存成功，将自动生效', 'success');
             } catch (error) {
                 console.error('保存配置失败:', error);
                 this.showNotification('保存配置失败', 'error');
@@ -169,16 +222,7 @@ createApp({
                     params: { lines: 100 }
                 });
                 this.logs = response.data.logs || [];
-                
-                // 自动滚动到底部
-                if (this.autoScroll) {
-                    this.$nextTick(() => {
-                        const container = this.$refs.logContainer;
-                        if (container) {
-                            container.scrollTop = container.scrollHeight;
-                        }
-                    });
-                }
+                this.scrollLogs();
             } catch (error) {
                 console.error('加载日志失败:', error);
             }
@@ -236,37 +280,22 @@ createApp({
             }
         },
         
-        // 开始录制
+        // 开始录制：恢复检测并立即检测一次，状态由WebSocket推送
         async startRecording(user) {
             try {
                 const response = await axios.post(`/api/start_recording/${user.platform}/${user.id}`);
-                this.showNotification(`正在启动 ${user.name} 的录制...`, 'success');
-                
-                // 更新状态
-                const key = `${user.platform}_${user.id}`;
-                this.recordingStatus[key] = {
-                    platform: user.platform,
-                    user_id: user.id,
-                    status: 'recording',
-                    timestamp: new Date().toISOString()
-                };
+                this.showNotification(response.data.message, 'success');
             } catch (error) {
                 console.error('启动录制失败:', error);
                 this.showNotification('启动录制失败', 'error');
             }
         },
         
-        // 停止录制
+        // 停止录制：停止正在进行的录制并暂停检测
         async stopRecording(user) {
             try {
                 const response = await axios.post(`/api/stop_recording/${user.platform}/${user.id}`);
-                this.showNotification(`已停止 ${user.name} 的录制`, 'success');
-                
-                // 更新状态
-                const key = `${user.platform}_${user.id}`;
-                if (this.recordingStatus[key]) {
-                    this.recordingStatus[key].status = 'stopped';
-                }
+                this.showNotification(response.data.message, 'success');
             } catch (error) {
                 console.error('停止录制失败:', error);
                 this.showNotification('停止录制失败', 'error');
@@ -289,13 +318,29 @@ createApp({
             
             if (status && status.status === 'recording') {
                 return 'status-recording recording-pulse';
-            } else if (status && status.status === 'online') {
+            } else if (status && status.status === 'live') {
                 return 'status-online';
             } else {
                 return 'status-offline';
             }
         },
         
+        // 录制中的写入进度
+        recordingProgress(user) {
+            const status = this.recordingStatus[`${user.platform}_${user.id}`];
+            if (!status || status.status !== 'recording' || status.bytes === undefined) {
+                return null;
+            }
+            const size = `${(status.bytes / 1024 / 1024).toFixed(1)} MB`;
+            return status.bitrate ? `${size} · ${(status.bitrate / 1e6).toFixed(1)} Mbps` : size;
+        },
+        
+        // 判断是否已暂停检测
+        isPaused(user) {
+            const status = this.recordingStatus[`${user.platform}_${user.id}`];
+            return Boolean(status && status.paused);
+        },
+        
         // 判断是否正在录制
         isRecording(user) {
             const key = `${user.platform}_${user.id}`;